@@ -46,14 +46,32 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'core.middleware.AdminMiddleware',
+    'core.middleware.ShardMiddleware',
+    'core.middleware.ProfilerMiddleware',
+]
+
+# Session based middleware, applied by core.middleware.AdminMiddleware to
+# requests under ADMIN_URL_PREFIX only. API routes authenticate with tokens
+# and never touch sessions, CSRF cookies or messages.
+
+ADMIN_URL_PREFIX = 'admin/'
+
+ADMIN_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Admin changelists of tables estimated to hold at least this many rows
+# show the planner's estimate instead of running COUNT(*), see core.admin.
+
+ADMIN_ESTIMATED_COUNT_MIN = 100000
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -89,6 +107,19 @@ DATABASES = {
 }
 
 
+# Databases holding users' tags, ingredients and recipes, see core.sharding.
+# Users, tokens and the shard directory stay on 'default'. When empty all
+# data lives on 'default'. Each process remembers a user's shard for
+# SHARD_DIRECTORY_TIMEOUT seconds. The admin is not shard aware, with shards
+# it only shows and edits the users' data left on 'default'.
+
+DATABASE_SHARDS = []
+
+SHARD_DIRECTORY_TIMEOUT = 60
+
+DATABASE_ROUTERS = ['core.sharding.ShardRouter']
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
@@ -128,3 +159,155 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 AUTH_USER_MODEL = 'core.User'
+
+
+# Response compression
+# Bodies smaller than COMPRESSION_MIN_SIZE bytes are sent uncompressed.
+# Compressed bodies are cached by digest so repeated responses are only
+# compressed once per coding.
+
+COMPRESSION_MIN_SIZE = 200
+
+COMPRESSION_ENCODINGS = ('br', 'zstd', 'gzip')
+
+COMPRESSION_LEVELS = {'gzip': 6, 'br': 5, 'zstd': 3}
+
+COMPRESSION_CACHE_ALIAS = 'default'
+
+COMPRESSION_CACHE_TIMEOUT = 300
+
+
+# Django REST framework
+# Throttling uses sliding window counters from core.throttling, kept in
+# process by default or shared through THROTTLE_CACHE_ALIAS with
+# core.throttling.CacheCounterStore.
+
+REST_FRAMEWORK = {
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.ReadRateThrottle',
+        'core.throttling.WriteRateThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'read': '1200/min',
+        'write': '300/min',
+        'login': '20/min',
+    },
+}
+
+THROTTLE_COUNTER_STORE = 'core.throttling.LocalCounterStore'
+
+THROTTLE_CACHE_ALIAS = 'default'
+
+
+# Largest number of recipes fetched at once with ?ids= on the recipe list
+
+RECIPE_MULTI_GET_MAX = 100
+
+
+# Similar recipes, see recipe.index. Scores are the weighted mean of the
+# Jaccard similarity of ingredient and tag sets.
+
+SIMILAR_RECIPES_WEIGHTS = {'ingredient_weight': 0.7, 'tag_weight': 0.3}
+
+SIMILAR_RECIPES_MAX = 50
+
+RECIPE_INDEX_CACHE_SIZE = 128
+
+PANTRY_RESULTS_MAX = 100
+
+
+# Recipe statistics, see recipe.stats. Results are kept in the default
+# cache under the user's data version, the timeout only clears out
+# superseded entries.
+
+RECIPE_STATS_TIME_BUCKETS = (15, 30, 60, 120)
+
+RECIPE_STATS_TOP = 10
+
+RECIPE_STATS_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+# Delta sync, see recipe.views.SyncView
+
+SYNC_PAGE_SIZE = 100
+
+SYNC_MAX_PAGE_SIZE = 1000
+
+
+# API tokens, see core.authentication. Tokens expire TOKEN_MAX_AGE seconds
+# after they are issued or TOKEN_IDLE_TIMEOUT seconds after their last use,
+# which is recorded at most once every TOKEN_LAST_USED_RESOLUTION seconds.
+# With TOKEN_ROTATE every login issues a new token that replaces the user's
+# others, instead of returning the user's current one. Expired tokens are
+# deleted by purge_tokens.
+
+TOKEN_MAX_AGE = 60 * 60 * 24 * 30
+
+TOKEN_IDLE_TIMEOUT = 60 * 60 * 24 * 7
+
+TOKEN_LAST_USED_RESOLUTION = 60
+
+TOKEN_ROTATE = False
+
+# Signed tokens, see core.authentication.SignedTokenAuthentication. They
+# are checked without a query and expire after SIGNED_TOKEN_MAX_AGE
+# seconds. Revocations made by other processes, deactivations included,
+# take effect within SIGNED_TOKEN_REVOCATION_REFRESH seconds.
+
+SIGNED_TOKEN_MAX_AGE = 60 * 15
+
+SIGNED_TOKEN_REVOCATION_REFRESH = 30
+
+
+# Rows removed per DELETE when an account is deleted, see
+# core.account_deletion
+
+ACCOUNT_DELETION_BATCH_SIZE = 1000
+
+
+# Batch endpoint, see core.views.BatchView
+
+BATCH_MAX_REQUESTS = 20
+
+BATCH_MAX_WORKERS = 4
+
+
+# Per-request profiling for staff, see core.middleware.ProfilerMiddleware.
+# Profiles are kept for PROFILER_CACHE_TIMEOUT seconds.
+
+PROFILER_DEFAULT_MODE = 'cprofile'
+
+PROFILER_SAMPLE_INTERVAL = 0.005
+
+PROFILER_CACHE_TIMEOUT = 60 * 60
+
+
+# JSON access log, see core.access_log. Records are written by a background
+# thread, up to ACCESS_LOG_BATCH_SIZE at a time. When ACCESS_LOG_BUFFER_SIZE
+# records are waiting new ones are dropped instead of delaying requests.
+# The file is rotated at ACCESS_LOG_MAX_BYTES, keeping ACCESS_LOG_BACKUP_COUNT
+# old files; with no backups it is never rotated. Unset ACCESS_LOG_FILE to
+# turn logging off.
+
+ACCESS_LOG_FILE = os.environ.get('ACCESS_LOG_FILE')
+
+ACCESS_LOG_MAX_BYTES = 50 * 1024 * 1024
+
+ACCESS_LOG_BACKUP_COUNT = 5
+
+ACCESS_LOG_BUFFER_SIZE = 10000
+
+ACCESS_LOG_BATCH_SIZE = 500
+
+
+# Recipe popularity, see recipe.popularity. Views are buffered and written
+# by a background thread every POPULARITY_FLUSH_INTERVAL seconds,
+# POPULARITY_FLUSH_BATCH_SIZE recipes per UPDATE. Set
+# POPULARITY_CACHE_ALIAS to sum the views of all workers in that cache
+# before writing.
+
+POPULARITY_FLUSH_INTERVAL = 30
+
+POPULARITY_FLUSH_BATCH_SIZE = 500
+
+POPULARITY_CACHE_ALIAS = None
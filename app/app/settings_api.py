@@ -0,0 +1,69 @@
+"""
+Settings profile for workers that serve the token authenticated API.
+
+Select it with DJANGO_SETTINGS_MODULE=app.settings_api. DEBUG is off so
+executed queries are not kept in memory, only JSON is rendered and
+database connections are reused between requests. The admin, sessions,
+messages and static files apps are left out so these workers never import
+them; run the admin from a process using app.settings.
+"""
+import copy
+import os
+
+from app.settings import *  # noqa: F401,F403
+
+DEBUG = False
+
+INSTALLED_APPS = [
+    app for app in INSTALLED_APPS  # noqa: F405
+    if app not in (
+        'django.contrib.admin',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django.contrib.staticfiles',
+    )
+]
+
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE  # noqa: F405
+    if middleware != 'core.middleware.AdminMiddleware'
+]
+
+TEMPLATES = copy.deepcopy(TEMPLATES)  # noqa: F405
+
+TEMPLATES[0]['OPTIONS']['context_processors'] = [
+    'django.template.context_processors.debug',
+    'django.template.context_processors.request',
+    'django.contrib.auth.context_processors.auth',
+]
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)  # noqa: F405
+
+ALLOWED_HOSTS = [
+    host for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host
+]
+
+DATABASES = copy.deepcopy(DATABASES)  # noqa: F405
+
+DATABASES['default']['CONN_MAX_AGE'] = int(
+    os.environ.get('DB_CONN_MAX_AGE', 60)
+)
+
+REST_FRAMEWORK = dict(
+    REST_FRAMEWORK,  # noqa: F405
+    DEFAULT_RENDERER_CLASSES=(
+        'rest_framework.renderers.JSONRenderer',
+    ),
+)
+
+# Throttle counters are shared by every worker through memcached, which
+# increments atomically. core.checks refuses a process-local cache here.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', '127.0.0.1:11211'),
+    }
+}
+
+THROTTLE_COUNTER_STORE = 'core.throttling.CacheCounterStore'
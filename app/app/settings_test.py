@@ -0,0 +1,20 @@
+"""
+Settings profile for running the test suite.
+
+Select it with DJANGO_SETTINGS_MODULE=app.settings_test, no database server
+is needed. Tests run against in-memory SQLite, passwords are hashed with
+MD5 since no real credentials are involved, and test classes are spread
+over one process per CPU unless --parallel says otherwise.
+"""
+from app.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+TEST_RUNNER = 'core.tests.runner.ParallelDiscoverRunner'
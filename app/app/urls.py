@@ -13,11 +13,22 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.apps import apps
+from django.conf import settings
 from django.urls import path, include
 
+from core.views import BatchView, ProfileView
+
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    path('api/batch/', BatchView.as_view(), name='batch'),
+    path('api/profile/<str:profile_id>/', ProfileView.as_view(),
+         name='profile'),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
 ]
+
+# API only workers leave the admin out of INSTALLED_APPS and never import it
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path(settings.ADMIN_URL_PREFIX, admin.site.urls))
@@ -0,0 +1,204 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections
+from django.utils import timezone
+
+
+class AccessLogWriter:
+    """Write JSON lines from a background thread
+
+    Request threads only put records on a bounded queue. When it is full
+    the record is dropped and counted instead of making the request wait.
+    The writer thread takes up to batch_size records at a time, writes
+    them with one call and rotates the file once it reaches max_bytes,
+    keeping backup_count old files like logging's RotatingFileHandler.
+    As there, the file is never rotated when backup_count is 0.
+    Drops since the last batch are reported with a `dropped` record. A
+    batch that cannot be written is counted in write_errors and the
+    thread carries on with the next one.
+    """
+
+    def __init__(self, path, max_bytes=0, backup_count=0, buffer_size=10000,
+                 batch_size=500):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.queue = queue.Queue(buffer_size)
+        self.dropped = 0
+        self.write_errors = 0
+        self._reported = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, daemon=True,
+                                                name='access-log')
+                self._thread.start()
+
+    def log(self, record):
+        """Queue a record without blocking, return False if it was dropped
+        """
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        return True
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self._lock:
+                dropped = self.dropped - self._reported
+                self._reported = self.dropped
+            records = batch
+            if dropped:
+                records = batch + [{'time': timezone.now().isoformat(),
+                                    'dropped': dropped}]
+            try:
+                self.write(records)
+            except Exception:
+                with self._lock:
+                    self.write_errors += 1
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def write(self, records):
+        lines = ''.join(
+            json.dumps(record, separators=(',', ':'), default=str) + '\n'
+            for record in records
+        )
+        with open(self.path, 'a') as stream:
+            stream.write(lines)
+            size = stream.tell()
+        if self.max_bytes and self.backup_count > 0 \
+                and size >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        """Shift path.1 .. path.N up by one and move path to path.1"""
+        for index in range(self.backup_count - 1, 0, -1):
+            source = '%s.%d' % (self.path, index)
+            if os.path.exists(source):
+                os.replace(source, '%s.%d' % (self.path, index + 1))
+        os.replace(self.path, self.path + '.1')
+
+    def flush(self, timeout=5):
+        """Wait up to timeout seconds until every queued record is written
+
+        Returns False when records are left, right away if the writer
+        thread is not running.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return False
+        deadline = time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_access_log():
+    """Return the writer for ACCESS_LOG_FILE, None when logging is off"""
+    global _writer
+    if not settings.ACCESS_LOG_FILE:
+        return None
+    with _writer_lock:
+        if _writer is None:
+            _writer = AccessLogWriter(
+                settings.ACCESS_LOG_FILE,
+                max_bytes=settings.ACCESS_LOG_MAX_BYTES,
+                backup_count=settings.ACCESS_LOG_BACKUP_COUNT,
+                buffer_size=settings.ACCESS_LOG_BUFFER_SIZE,
+                batch_size=settings.ACCESS_LOG_BATCH_SIZE,
+            )
+            _writer.start()
+            atexit.register(_writer.flush)
+    return _writer
+
+
+def reset_access_log(**kwargs):
+    global _writer
+    if kwargs.get('setting', 'ACCESS_LOG_').startswith('ACCESS_LOG_'):
+        with _writer_lock:
+            if _writer is not None:
+                _writer.flush()
+            _writer = None
+
+
+setting_changed.connect(reset_access_log)
+
+
+class QueryCounter:
+    """Database execute wrapper counting the queries it sees"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class AccessLogMixin:
+    """Log each API call of a view to the access log
+
+    Records the user, view, status, duration and number of queries. Views
+    that authenticate a user without a request user, like the token
+    endpoints, set `log_user_id` so the record shows whom it was for.
+    """
+    log_user_id = None
+
+    def dispatch(self, request, *args, **kwargs):
+        writer = get_access_log()
+        if writer is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = super().dispatch(request, *args, **kwargs)
+
+        user = getattr(request, 'user', None)
+        user_id = user.pk if user is not None and user.is_authenticated \
+            else self.log_user_id
+        writer.log({
+            'time': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'view': '%s.%s' % (type(self).__name__,
+                               getattr(self, 'action', None) or
+                               request.method.lower()),
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+            'queries': counter.count,
+            'user': user_id,
+        })
+        return response
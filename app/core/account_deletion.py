@@ -0,0 +1,88 @@
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, router, transaction
+
+from core.authentication import revoke_tokens
+from core.sharding import for_user
+from core.models import AccountDeletion, AuthToken, ChangeLog, \
+    ChangeSequence, Ingredient, Recipe, RecipeReadModel, Tag
+
+
+def account_querysets(user_id):
+    """Return querysets of the user's rows, children before parents"""
+    return [
+        ChangeLog.objects.filter(user_id=user_id),
+        ChangeSequence.objects.filter(user_id=user_id),
+        AuthToken.objects.filter(user_id=user_id),
+        RecipeReadModel.objects.filter(user_id=user_id),
+        Recipe.tags.through.objects.filter(recipe__user_id=user_id),
+        Recipe.ingredients.through.objects.filter(recipe__user_id=user_id),
+        Recipe.objects.filter(user_id=user_id),
+        Tag.objects.filter(user_id=user_id),
+        Ingredient.objects.filter(user_id=user_id),
+    ]
+
+
+def delete_in_batches(queryset, batch_size):
+    """Delete the rows of queryset by primary key, batch_size at a time
+
+    Each batch is one SELECT of primary keys and one DELETE committed on
+    its own, so memory and lock time do not grow with the number of rows.
+    Returns the number of rows deleted.
+    """
+    model = queryset.model
+    using = router.db_for_write(model)
+    total = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return total
+        # Skips the collector and signals, the dependent rows were already
+        # removed and the user's derived data goes with the account.
+        total += model._base_manager.using(using).filter(
+            pk__in=pks
+        )._raw_delete(using)
+
+
+def request_account_deletion(user):
+    """Lock the account out and queue its deletion"""
+    with transaction.atomic():
+        get_user_model().objects.filter(pk=user.pk).deactivate()
+        AccountDeletion.objects.get_or_create(user=user)
+        revoke_tokens(user)
+
+
+def delete_account(user_id, batch_size=None):
+    """Delete a queued account, resuming where an earlier run stopped
+
+    Returns the number of rows deleted, the user row included.
+    """
+    batch_size = batch_size or settings.ACCOUNT_DELETION_BATCH_SIZE
+    total = 0
+    with for_user(user_id):
+        for queryset in account_querysets(user_id):
+            total += delete_in_batches(queryset, batch_size)
+    # Only groups, permissions and admin log entries are left to collect
+    total += get_user_model().objects.filter(pk=user_id).delete()[0]
+    return total
+
+
+def _delete_in_background(user_id):
+    try:
+        delete_account(user_id)
+    finally:
+        close_old_connections()
+
+
+def start_account_deletion(user):
+    """Queue the deletion of user's account and run it in a thread
+
+    The thread starts once the request's transaction commits. Deletions
+    interrupted by a restart are finished by the delete_accounts command.
+    """
+    request_account_deletion(user)
+    transaction.on_commit(lambda: threading.Thread(
+        target=_delete_in_background, args=(user.pk,), daemon=True
+    ).start())
@@ -1,13 +1,62 @@
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
 
 from core import models
 
 
+def estimated_count(queryset):
+    """Return the planner's row estimate for an unfiltered table, or None
+
+    Only PostgreSQL keeps an estimate, refreshed by VACUUM and ANALYZE.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that skips COUNT(*) over large unfiltered tables
+
+    Tables with fewer than ADMIN_ESTIMATED_COUNT_MIN estimated rows, and
+    filtered or searched changelists, are still counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and \
+                estimate >= settings.ADMIN_ESTIMATED_COUNT_MIN:
+            return estimate
+        return super().count
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Changelist settings shared by the admins of the large tables"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    ordering = ('-id',)
+
+
 class UserAdmin(BaseUserAdmin):
     ordering = ['id']
     list_display = ['email', 'name']
+    search_fields = ['^email']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         (_('Personal Info'), {'fields': ('name',)}),
@@ -32,7 +81,25 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+class TagAdmin(ScalableAdmin):
+    list_display = ['name', 'user']
+    search_fields = ['^name']
+
+
+class IngredientAdmin(ScalableAdmin):
+    list_display = ['name', 'user']
+    search_fields = ['^name']
+
+
+class RecipeAdmin(ScalableAdmin):
+    list_display = ['title', 'user', 'time_minutes', 'price']
+    search_fields = ['^title']
+    autocomplete_fields = ['tags', 'ingredients']
+    # Counted by recipe.popularity, saving the form would drop new views
+    readonly_fields = ['popularity']
+
+
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
-admin.site.register(models.Recipe)
+admin.site.register(models.Tag, TagAdmin)
+admin.site.register(models.Ingredient, IngredientAdmin)
+admin.site.register(models.Recipe, RecipeAdmin)
@@ -0,0 +1,255 @@
+import base64
+import hashlib
+import hmac
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signals import setting_changed
+from django.db import router, transaction
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.encoding import force_bytes
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import (BaseAuthentication,
+                                           TokenAuthentication,
+                                           get_authorization_header)
+
+from core.models import AuthToken
+
+
+class ExpiringTokenAuthentication(TokenAuthentication):
+    """Token authentication with expiring core.models.AuthToken keys
+
+    The token and its user are loaded in one query, expiry is checked on
+    the loaded row and last_used is only updated when it is stale.
+    """
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        try:
+            token = AuthToken.objects.select_related('user').get(key=key)
+        except AuthToken.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+
+        now = timezone.now()
+        if token.is_expired(now):
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+
+        resolution = settings.TOKEN_LAST_USED_RESOLUTION
+        if token.last_used is None or \
+                (now - token.last_used).total_seconds() >= resolution:
+            AuthToken.objects.filter(pk=token.pk).update(last_used=now)
+            token.last_used = now
+
+        return token.user, token
+
+
+def revoke_tokens(user):
+    """Invalidate every stored and signed token of user"""
+    user.revoke_tokens()
+    token_versions.set(user.pk, user.token_version)
+
+
+def issue_token(user):
+    """Return a token for user, reusing a valid one unless TOKEN_ROTATE
+
+    With TOKEN_ROTATE the new token replaces the user's other tokens.
+    """
+    if not settings.TOKEN_ROTATE:
+        token = user.auth_tokens.filter(
+            AuthToken.valid_filter()
+        ).order_by('-created').first()
+        if token is not None:
+            return token
+        return AuthToken.objects.create(user=user)
+    with transaction.atomic(using=router.db_for_write(AuthToken)):
+        user.auth_tokens.all().delete()
+        return AuthToken.objects.create(user=user)
+
+
+def _signature(payload):
+    key = hashlib.sha256(
+        b'core.authentication.signed-token' + force_bytes(settings.SECRET_KEY)
+    ).digest()
+    digest = hmac.new(key, payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+
+def sign_token(user, now=None):
+    """Return a signed token for user and the time it expires
+
+    The token is '<user id>.<token version>.<expiry>.<signature>', the
+    signature is an HMAC-SHA256 of the rest keyed from SECRET_KEY.
+    """
+    expires = int(now or time.time()) + settings.SIGNED_TOKEN_MAX_AGE
+    payload = '%d.%d.%d' % (user.pk, user.token_version, expires)
+    return '%s.%s' % (payload, _signature(payload)), expires
+
+
+def unsign_token(token, now=None):
+    """Return (user id, token version) from a valid signed token, or None"""
+    payload, _, signature = token.rpartition('.')
+    if not constant_time_compare(signature, _signature(payload)):
+        return None
+    try:
+        user_id, version, expires = map(int, payload.split('.'))
+    except ValueError:
+        return None
+    if expires < (now or time.time()):
+        return None
+    return user_id, version
+
+
+class TokenVersions:
+    """Current token versions of the users who recently revoked tokens
+
+    A token signed before a revocation expires SIGNED_TOKEN_MAX_AGE
+    seconds after it at the latest, so only users whose version changed
+    within that time are held, in two sorted arrays of user ids and
+    versions. They are loaded in full from the token_version_changed
+    index once per SIGNED_TOKEN_MAX_AGE, and in between only the users
+    changed since the previous load, every SIGNED_TOKEN_REVOCATION_REFRESH
+    seconds. Each load looks one refresh interval further back than
+    needed, for clock skew and late commits.
+
+    One request thread loads while the others keep checking against the
+    arrays they have, which are replaced and never changed in place.
+    Revocations made by this process apply immediately.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.user_ids = array('q')
+            self.versions = array('q')
+            self.since = None
+            self.expires = 0
+            self.full_expires = 0
+
+    def refresh(self):
+        started = timezone.now()
+        interval = settings.SIGNED_TOKEN_REVOCATION_REFRESH
+        full = self.since is None or time.monotonic() >= self.full_expires
+        if full:
+            since = started - timedelta(
+                seconds=settings.SIGNED_TOKEN_MAX_AGE + interval
+            )
+        else:
+            since = self.since
+        rows = get_user_model().objects.filter(
+            token_version_changed__gte=since
+        ).order_by('pk').values_list('pk', 'token_version')
+        self.update(list(rows), replace=full)
+        with self.lock:
+            self.since = started - timedelta(seconds=interval)
+            self.expires = time.monotonic() + interval
+            if full:
+                self.full_expires = time.monotonic() + \
+                    settings.SIGNED_TOKEN_MAX_AGE
+
+    def get(self, user_id):
+        """Return the version a token of user_id needs to be valid"""
+        if time.monotonic() >= self.expires:
+            # Only the first load makes other threads wait for it
+            if self.refresh_lock.acquire(blocking=self.since is None):
+                try:
+                    if time.monotonic() >= self.expires:
+                        self.refresh()
+                finally:
+                    self.refresh_lock.release()
+        with self.lock:
+            user_ids, versions = self.user_ids, self.versions
+        i = bisect_left(user_ids, user_id)
+        if i < len(user_ids) and user_ids[i] == user_id:
+            return versions[i]
+        return 0
+
+    def set(self, user_id, version):
+        self.update([(user_id, version)])
+
+    def update(self, rows, replace=False):
+        """Apply (user id, version) rows to copies of the arrays
+
+        Versions only grow, so a row older than what is held is ignored.
+        With replace the rows are applied to empty arrays instead.
+        """
+        with self.lock:
+            if replace:
+                user_ids, versions = array('q'), array('q')
+            else:
+                user_ids = array('q', self.user_ids)
+                versions = array('q', self.versions)
+            for user_id, version in rows:
+                i = bisect_left(user_ids, user_id)
+                if i < len(user_ids) and user_ids[i] == user_id:
+                    versions[i] = max(versions[i], version)
+                else:
+                    user_ids.insert(i, user_id)
+                    versions.insert(i, version)
+            self.user_ids, self.versions = user_ids, versions
+
+
+token_versions = TokenVersions()
+
+
+def reset_token_versions(**kwargs):
+    if kwargs.get('setting') in ('SECRET_KEY',
+                                 'SIGNED_TOKEN_REVOCATION_REFRESH'):
+        token_versions.reset()
+
+
+setting_changed.connect(reset_token_versions)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Authenticate 'Bearer <token>' headers holding a signed token
+
+    Checking the signature, the expiry and the revocation table needs no
+    query. The user is returned with only its id and token version
+    loaded, other fields are fetched when first used.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        claims = unsign_token(token)
+        if claims is None:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid or expired token.')
+            )
+        user_id, version = claims
+        if version < token_versions.get(user_id):
+            raise exceptions.AuthenticationFailed(_('Token was revoked.'))
+
+        User = get_user_model()
+        user = User.from_db(router.db_for_read(User),
+                            ['id', 'token_version'], [user_id, version])
+        return user, token
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+# Cache backends that every worker process has its own copy of
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+# Shared cache backends whose incr() is a read followed by a write
+NON_ATOMIC_CACHES = {
+    'django.core.cache.backends.db.DatabaseCache',
+    'django.core.cache.backends.filebased.FileBasedCache',
+}
+
+
+@register(Tags.caches)
+def check_throttle_cache(app_configs, **kwargs):
+    """Require a shared, atomic cache for core.throttling.CacheCounterStore
+
+    With a process-local cache each worker would enforce the whole rate
+    on its own, multiplying the limit by the number of workers.
+    """
+    if getattr(settings, 'THROTTLE_COUNTER_STORE', None) != \
+            'core.throttling.CacheCounterStore':
+        return []
+    alias = getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_CACHES or backend in NON_ATOMIC_CACHES:
+        return [Error(
+            'THROTTLE_CACHE_ALIAS %r uses %s.' % (alias, backend),
+            hint='CacheCounterStore needs a cache shared by all workers '
+                 'with an atomic incr(), such as memcached or redis.',
+            id='core.E001',
+        )]
+    return []
@@ -0,0 +1,15 @@
+from core.models import ChangeSequence
+
+
+def get_data_version(user_id):
+    """Return a value that changes whenever the user's recipe data changes
+
+    This is the user's change sequence number, see core.sync. Every change
+    to their tags, ingredients or recipes advances it in the transaction
+    making the change, so each process sees a new version as soon as the
+    change commits. Derived data (indexes, statistics) cached anywhere
+    can be kept until this value moves on.
+    """
+    return ChangeSequence.objects.filter(user_id=user_id).values_list(
+        'value', flat=True
+    ).first() or 0
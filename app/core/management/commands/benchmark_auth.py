@@ -0,0 +1,71 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from core.authentication import ExpiringTokenAuthentication, \
+    SignedTokenAuthentication, issue_token, sign_token
+
+
+class Command(BaseCommand):
+    """Django command to compare stored and signed token authentication
+
+    Runs against a throwaway user in a transaction that is rolled back.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def time_authentication(self, authentication, header, count):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=header)
+        authentication.authenticate(request)
+        start = time.perf_counter()
+        for _ in range(count):
+            authentication.authenticate(request)
+        return (time.perf_counter() - start) / count
+
+    def count_queries(self, authentication, header):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=header)
+        authentication.authenticate(request)
+        with CaptureQueriesContext(connection) as queries:
+            authentication.authenticate(request)
+        return len(queries)
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                'benchmark-auth@localhost', None
+            )
+            cases = [
+                ('stored token', ExpiringTokenAuthentication(),
+                 'Token ' + issue_token(user).key),
+                ('signed token', SignedTokenAuthentication(),
+                 'Bearer ' + sign_token(user)[0]),
+            ]
+            results = []
+            for name, authentication, header in cases:
+                # Count first, the query log is capped once timing runs
+                queries = self.count_queries(authentication, header)
+                best = min(
+                    self.time_authentication(authentication, header, count)
+                    for _ in range(options['repeat'])
+                )
+                results.append((name, best, queries))
+            transaction.set_rollback(True)
+
+        self.stdout.write('best of %d x %d authentications' % (
+            options['repeat'], count
+        ))
+        for name, best, queries in results:
+            self.stdout.write('%s: %.1f us/request, %d queries' % (
+                name, best * 1e6, queries
+            ))
+        stored, signed = results[0][1], results[1][1]
+        self.stdout.write(self.style.SUCCESS(
+            'signed tokens are %.1fx faster' % (stored / signed)
+        ))
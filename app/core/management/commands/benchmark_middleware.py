@@ -0,0 +1,79 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import reverse
+
+
+def full_middleware():
+    """Return the middleware list with the admin stack applied everywhere"""
+    middleware = []
+    for path in settings.MIDDLEWARE:
+        if path == 'core.middleware.AdminMiddleware':
+            middleware.extend(settings.ADMIN_MIDDLEWARE)
+        else:
+            middleware.append(path)
+    return middleware
+
+
+class Handler(BaseHandler):
+    """Request handler built from an explicit middleware list"""
+
+    def __init__(self, middleware):
+        super().__init__()
+        with override_settings(MIDDLEWARE=middleware):
+            self.load_middleware()
+
+
+class Command(BaseCommand):
+    """Django command to measure the per request middleware overhead"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--path', default=None)
+
+    def time_handler(self, handler, path, count):
+        factory = RequestFactory(HTTP_HOST=self.host)
+        handler.get_response(factory.get(path))
+        start = time.perf_counter()
+        for _ in range(count):
+            handler.get_response(factory.get(path))
+        return (time.perf_counter() - start) / count
+
+    def handle(self, *args, **options):
+        path = options['path'] or reverse('recipe:recipe-list')
+        count = options['requests']
+        hosts = [h for h in settings.ALLOWED_HOSTS if '*' not in h]
+        self.host = hosts[0].lstrip('.') if hosts else 'localhost'
+
+        # 4xx responses are logged by django.request, keep that out of timing
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            full_handler = Handler(full_middleware())
+            lean_handler = Handler(settings.MIDDLEWARE)
+            full, lean = [], []
+            for _ in range(options['repeat']):
+                full.append(self.time_handler(full_handler, path, count))
+                lean.append(self.time_handler(lean_handler, path, count))
+        finally:
+            request_logger.setLevel(level)
+        full, lean = min(full), min(lean)
+        saved = full - lean
+
+        self.stdout.write('GET %s, best of %d x %d requests' % (
+            path, options['repeat'], count
+        ))
+        self.stdout.write('full stack: %.1f us/request' % (full * 1e6))
+        self.stdout.write('lean stack: %.1f us/request' % (lean * 1e6))
+        self.stdout.write(self.style.SUCCESS(
+            'saved: %.1f us/request (%.1f%%)' % (
+                saved * 1e6, 100 * saved / full if full else 0
+            )
+        ))
@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.account_deletion import delete_account, request_account_deletion
+from core.models import AccountDeletion
+
+
+class Command(BaseCommand):
+    """Django command to delete user accounts with batched deletes
+
+    Without --user, finishes every queued deletion, including ones
+    interrupted by a restart.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            default=[], help='Queue and delete this user id')
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        for user_id in options['user']:
+            try:
+                user = get_user_model().objects.get(pk=user_id)
+            except get_user_model().DoesNotExist:
+                raise CommandError('User %d does not exist.' % user_id)
+            request_account_deletion(user)
+
+        user_ids = list(AccountDeletion.objects.order_by(
+            'requested'
+        ).values_list('user_id', flat=True))
+        for user_id in user_ids:
+            total = delete_account(user_id, options['batch_size'])
+            self.stdout.write('Deleted user %d, %d rows' % (user_id, total))
+
+        self.stdout.write(self.style.SUCCESS(
+            'Deleted %d accounts' % len(user_ids)
+        ))
@@ -0,0 +1,148 @@
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from core.models import AuthToken
+
+
+class Command(BaseCommand):
+    """Django command to create users in bulk from a CSV file
+
+    The file needs an `email` column and may have `name` and `password`
+    columns, rows without a password get an unusable one. Rows are read
+    and created in batches, passwords are hashed in a process pool and
+    every new user gets an API token. Invalid rows and emails that are
+    already taken, in any letter case, are skipped, as are emails taken
+    by someone else while the batch was prepared.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file to read, '-' for stdin")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Processes hashing passwords, 1 hashes in '
+                                 'this process')
+        parser.add_argument('--tokens', default=None,
+                            help='Write an email,token CSV to this file')
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            source = sys.stdin
+        else:
+            try:
+                source = open(options['path'], newline='')
+            except OSError as exc:
+                raise CommandError(exc)
+
+        tokens_file = tokens_out = None
+        if options['tokens']:
+            tokens_file = open(options['tokens'], 'w', newline='')
+            tokens_out = csv.writer(tokens_file)
+            tokens_out.writerow(['email', 'token'])
+
+        self.workers = options['workers']
+        executor = None
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        created = skipped = 0
+        try:
+            reader = csv.DictReader(source)
+            if 'email' not in (reader.fieldnames or ()):
+                raise CommandError('The CSV file needs an email column.')
+            while True:
+                rows = list(islice(reader, options['batch_size']))
+                if not rows:
+                    break
+                count, tokens = self.provision(rows, executor)
+                created += count
+                skipped += len(rows) - count
+                if tokens_out is not None:
+                    tokens_out.writerows(tokens)
+                self.stdout.write('Created %d users, skipped %d' %
+                                  (created, skipped))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if source is not sys.stdin:
+                source.close()
+            if tokens_file is not None:
+                tokens_file.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            'Provisioned %d users, skipped %d rows' % (created, skipped)
+        ))
+
+    def provision(self, rows, executor):
+        """Create the users of one batch, return the count and tokens"""
+        User = get_user_model()
+        accounts = {}
+        for row in rows:
+            email = User.objects.normalize_email((row['email'] or '').strip())
+            try:
+                validate_email(email)
+            except ValidationError:
+                self.stderr.write('Skipping invalid email %r' % row['email'])
+                continue
+            if email.lower() in accounts:
+                continue
+            accounts[email.lower()] = (email, (row.get('name') or '').strip(),
+                                       row.get('password') or None)
+
+        for email in User.objects.filter_email(*accounts).values_list(
+                'email', flat=True):
+            del accounts[email.lower()]
+        if not accounts:
+            return 0, []
+
+        accounts = list(accounts.values())
+        passwords = [password for _, _, password in accounts]
+        if executor is None:
+            hashes = map(make_password, passwords)
+        else:
+            chunksize = max(1, len(passwords) // (self.workers * 4))
+            hashes = executor.map(make_password, passwords,
+                                  chunksize=chunksize)
+
+        users = [
+            User(email=email, name=name, password=password_hash)
+            for (email, name, _), password_hash in zip(accounts, hashes)
+        ]
+        try:
+            with transaction.atomic():
+                tokens = self.create(users)
+        except IntegrityError:
+            # An email was taken since it was checked, find which one
+            tokens = []
+            for user in users:
+                try:
+                    with transaction.atomic():
+                        tokens += self.create([user])
+                except IntegrityError:
+                    self.stderr.write('Skipping %s, taken meanwhile' %
+                                      user.email)
+        return len(tokens), tokens
+
+    def create(self, users):
+        """Insert users with a token each, return their emails and tokens"""
+        User = get_user_model()
+        User.objects.bulk_create(users)
+        # Primary keys are only set by bulk_create on PostgreSQL
+        ids = dict(User.objects.filter(
+            email__in=[user.email for user in users]
+        ).values_list('email', 'pk'))
+        tokens = [
+            AuthToken(key=AuthToken.generate_key(), user_id=ids[user.email])
+            for user in users
+        ]
+        AuthToken.objects.bulk_create(tokens)
+        return [(user.email, token.key) for user, token in zip(users, tokens)]
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.models import AuthToken
+
+
+class Command(BaseCommand):
+    """Django command to delete expired API tokens
+
+    Tokens are deleted by primary key in batches, each in its own short
+    transaction, so the table is never locked for long.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to pause between batches')
+
+    def handle(self, *args, **options):
+        # One index friendly condition at a time, the negated combined
+        # filter could only be answered with a sequential scan.
+        created_cutoff, idle_cutoff = AuthToken.expiry_cutoffs()
+        conditions = (
+            Q(created__lt=created_cutoff),
+            Q(last_used__lt=idle_cutoff),
+            Q(last_used__isnull=True, created__lt=idle_cutoff),
+        )
+
+        total = 0
+        for condition in conditions:
+            while True:
+                keys = list(AuthToken.objects.filter(condition).values_list(
+                    'pk', flat=True
+                )[:options['batch_size']])
+                if not keys:
+                    break
+                total += AuthToken.objects.filter(pk__in=keys).delete()[0]
+                self.stdout.write('Deleted %d tokens' % total)
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Purged %d expired tokens' % total
+        ))
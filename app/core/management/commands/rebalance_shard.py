@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.sharding import move_user, shard_for
+
+
+class Command(BaseCommand):
+    """Django command to move a user's data to another shard
+
+    The user is deactivated while the data is copied, which revokes their
+    signed tokens, so no token can be used to write to the old shard
+    meanwhile. The copy starts once every process has seen the signed
+    tokens revoked, and the user is reactivated once every process routes
+    them to the new shard.
+    """
+    sleep = time.sleep
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', type=int, help='User id to move')
+        parser.add_argument('shard', help='Database alias to move to')
+
+    def handle(self, *args, **options):
+        if options['shard'] not in settings.DATABASE_SHARDS:
+            raise CommandError('%s is not in DATABASE_SHARDS.' %
+                               options['shard'])
+        User = get_user_model()
+        try:
+            user = User.objects.get(pk=options['user'])
+        except User.DoesNotExist:
+            raise CommandError('User %d does not exist.' % options['user'])
+
+        source = shard_for(user.pk)
+        User.objects.filter(pk=user.pk).deactivate()
+        try:
+            self.sleep(settings.SIGNED_TOKEN_REVOCATION_REFRESH)
+            moved = move_user(user.pk, options['shard'])
+            if moved:
+                self.sleep(settings.SHARD_DIRECTORY_TIMEOUT)
+        finally:
+            User.objects.filter(pk=user.pk).update(is_active=user.is_active)
+
+        if moved:
+            self.stdout.write(self.style.SUCCESS(
+                'Moved user %d from %s to %s' % (user.pk, source,
+                                                 options['shard'])
+            ))
+        else:
+            self.stdout.write('User %d is already on %s' % (
+                user.pk, options['shard']
+            ))
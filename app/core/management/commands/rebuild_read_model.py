@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from core.read_model import refresh_in_batches
+from core.sharding import for_user, shard_aliases, use_shard
+
+
+class Command(BaseCommand):
+    """Django command to rebuild the denormalized recipe read model"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--user', type=int, default=None,
+                            help='Only rebuild the recipes of this user id')
+
+    def handle(self, *args, **options):
+        total = 0
+        if options['user'] is not None:
+            with for_user(options['user']):
+                total = self.rebuild(options['batch_size'], options['user'])
+        else:
+            for alias in shard_aliases():
+                with use_shard(alias):
+                    total += self.rebuild(options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Read model rebuilt for %d recipes' % total
+        ))
+
+    def rebuild(self, batch_size, user_id=None):
+        """Rebuild the read model on the selected shard"""
+        total = 0
+        for total in refresh_in_batches(batch_size, user_id):
+            self.stdout.write('Rebuilt %d recipes' % total)
+        return total
@@ -0,0 +1,106 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+
+# Runs in a fresh interpreter so that nothing is imported yet
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter() - start
+
+from django.core.handlers.wsgi import WSGIHandler
+from wsgiref.util import setup_testing_defaults
+
+environ = {'PATH_INFO': sys.argv[1], 'HTTP_HOST': sys.argv[2]}
+setup_testing_defaults(environ)
+start = time.perf_counter()
+response = WSGIHandler()(environ, lambda status, headers: None)
+response.close()
+first_request = time.perf_counter() - start
+
+print(json.dumps({
+    'setup': setup,
+    'first_request': first_request,
+    'status': response.status_code,
+    'modules': len(sys.modules),
+}))
+'''
+
+
+def parse_importtime(output):
+    """Return (self_us, cumulative_us, module) tuples from -X importtime"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        rows.append((
+            int(fields[0]), int(fields[1]), fields[2][1:].rstrip()
+        ))
+    return rows
+
+
+class Command(BaseCommand):
+    """Django command to measure process start up to the first request"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--path', default=None)
+
+    def run_probe(self, path, importtime=False):
+        env = dict(os.environ)
+        env['DJANGO_SETTINGS_MODULE'] = settings.SETTINGS_MODULE
+        command = [sys.executable]
+        if importtime:
+            command += ['-X', 'importtime']
+        hosts = [h for h in settings.ALLOWED_HOSTS if '*' not in h]
+        host = hosts[0].lstrip('.') if hosts else 'localhost'
+        command += ['-c', PROBE, path, host]
+        result = subprocess.run(
+            command, env=env, cwd=settings.BASE_DIR,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True, check=True,
+        )
+        return json.loads(result.stdout.splitlines()[-1]), result.stderr
+
+    def handle(self, *args, **options):
+        path = options['path'] or reverse('recipe:recipe-list')
+
+        runs = [self.run_probe(path)[0] for _ in range(options['runs'])]
+        _, importtime = self.run_probe(path, importtime=True)
+        rows = parse_importtime(importtime)
+
+        self.stdout.write('Settings: %s' % settings.SETTINGS_MODULE)
+        self.stdout.write('Modules loaded: %d' % runs[-1]['modules'])
+        self.stdout.write('django.setup(): %.1f ms (median of %d)' % (
+            1000 * statistics.median(r['setup'] for r in runs), len(runs)
+        ))
+        self.stdout.write('First GET %s: %.1f ms, status %d' % (
+            path,
+            1000 * statistics.median(r['first_request'] for r in runs),
+            runs[-1]['status'],
+        ))
+        self.stdout.write('Total import time: %.1f ms' % (
+            sum(row[0] for row in rows) / 1000
+        ))
+
+        self.stdout.write('Slowest imports by cumulative time:')
+        self.stdout.write('%10s %10s  %s' % ('self us', 'cumul us', 'module'))
+        top_level = [row for row in rows if not row[2].startswith(' ')]
+        top_level.sort(key=lambda row: row[1], reverse=True)
+        for self_us, cumulative_us, module in top_level[:options['top']]:
+            self.stdout.write('%10d %10d  %s' % (
+                self_us, cumulative_us, module.strip()
+            ))
@@ -0,0 +1,66 @@
+from django.db import connections, router, transaction
+
+from core.models import ChangeLog, Ingredient, Recipe, Tag
+from core.read_model import recipes_using
+from core.sharding import use_shard
+from core.signals import bump_versions, recipes_changed
+from core.sync import record_changes
+
+
+RELATIONS = {
+    Tag: ('tags', ChangeLog.TAG),
+    Ingredient: ('ingredients', ChangeLog.INGREDIENT),
+}
+
+
+def merge_into(target, source_ids):
+    """Move the recipes of the source tags or ingredients to target and
+    delete the sources
+
+    Runs a fixed number of statements however many recipes are affected:
+    links missing on the target are copied with one INSERT ... SELECT,
+    the source links and the sources are removed with one DELETE each,
+    and the affected recipes move to a new version with one UPDATE.
+    """
+    model = type(target)
+    field, kind = RELATIONS[model]
+    through = getattr(Recipe, field).through
+    recipe_column = through._meta.get_field('recipe').column
+    related_column = through._meta.get_field(model._meta.model_name).column
+    table = through._meta.db_table
+    source_ids = sorted(set(source_ids) - {target.pk})
+    if not source_ids:
+        return
+
+    using = router.db_for_write(model, instance=target)
+    placeholders = ', '.join(['%s'] * len(source_ids))
+    with use_shard(using), transaction.atomic(using=using):
+        recipe_ids = recipes_using(field, source_ids)
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {table} ({recipe}, {related}) '
+                'SELECT DISTINCT s.{recipe}, %s FROM {table} s '
+                'WHERE s.{related} IN ({sources}) AND NOT EXISTS ('
+                'SELECT 1 FROM {table} t WHERE t.{recipe} = s.{recipe} '
+                'AND t.{related} = %s)'.format(
+                    table=table, recipe=recipe_column,
+                    related=related_column, sources=placeholders,
+                ),
+                [target.pk] + source_ids + [target.pk],
+            )
+            cursor.execute(
+                'DELETE FROM {table} WHERE {related} IN ({sources})'.format(
+                    table=table, related=related_column,
+                    sources=placeholders,
+                ),
+                source_ids,
+            )
+        # The links are gone, so the sources have nothing left to cascade
+        # to and their delete signals would only repeat the work below.
+        model._base_manager.using(using).filter(
+            pk__in=source_ids
+        )._raw_delete(using)
+
+        record_changes(target.user_id, kind, source_ids, deleted=True)
+        bump_versions(recipe_ids, using)
+        recipes_changed(target.user_id, recipe_ids, using)
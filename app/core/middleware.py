@@ -0,0 +1,294 @@
+import gzip
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.module_loading import import_string
+
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from core import profiling, sharding
+from core.authentication import ExpiringTokenAuthentication, \
+    SignedTokenAuthentication
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _gzip(data, level):
+    return gzip.compress(data, compresslevel=level)
+
+
+def _brotli(data, level):
+    return brotli.compress(data, quality=level)
+
+
+def _zstd(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+CODECS = {'gzip': _gzip}
+if brotli is not None:
+    CODECS['br'] = _brotli
+if zstandard is not None:
+    CODECS['zstd'] = _zstd
+
+DEFAULT_LEVELS = {'gzip': 6, 'br': 5, 'zstd': 3}
+
+
+def parse_accept_encoding(header):
+    """Return a dict mapping each accepted coding to its quality value"""
+    accepted = {}
+    for item in header.split(','):
+        parts = item.strip().split(';')
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def negotiate_encoding(header, preferred):
+    """Pick the best available coding, breaking ties by server preference"""
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for coding in preferred:
+        if coding not in CODECS:
+            continue
+        quality = accepted.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress responses with the best coding the client accepts
+
+    Compressed bodies are stored in the cache keyed by a digest of the raw
+    body, so a response that is served again (for example a cached list)
+    is only compressed once per coding and level.
+    """
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 200)
+        self.preferred = getattr(
+            settings, 'COMPRESSION_ENCODINGS', ('br', 'zstd', 'gzip')
+        )
+        self.levels = dict(DEFAULT_LEVELS)
+        self.levels.update(getattr(settings, 'COMPRESSION_LEVELS', {}))
+        alias = getattr(settings, 'COMPRESSION_CACHE_ALIAS', None)
+        self.cache = caches[alias] if alias else None
+        self.cache_timeout = getattr(
+            settings, 'COMPRESSION_CACHE_TIMEOUT', 300
+        )
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        coding = negotiate_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''), self.preferred
+        )
+        if coding is None:
+            return response
+
+        compressed = self.compress(coding, response.content)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coding
+        return response
+
+    def compress(self, coding, content):
+        """Return the compressed body, reusing a cached copy if present"""
+        level = self.levels[coding]
+        if self.cache is None:
+            return CODECS[coding](content, level)
+
+        digest = hashlib.sha1(content).hexdigest()
+        key = 'compressed:%s:%s:%s' % (coding, level, digest)
+        compressed = self.cache.get(key)
+        if compressed is None:
+            compressed = CODECS[coding](content, level)
+            self.cache.set(key, compressed, self.cache_timeout)
+        return compressed
+
+
+class AdminMiddleware:
+    """Run the ADMIN_MIDDLEWARE stack only for requests under the admin
+
+    Token authenticated API routes never use sessions, CSRF cookies or
+    messages, so they skip that work entirely and only pay for a prefix
+    check. The admin stack is built on the first admin request, so API
+    only workers never import it. View, exception and template response
+    hooks of the wrapped middleware are forwarded for admin requests.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = '/' + getattr(settings, 'ADMIN_URL_PREFIX', 'admin/')
+        self._admin_stack = None
+
+    @property
+    def admin_stack(self):
+        if self._admin_stack is None:
+            self._admin_stack = self.load_admin_middleware()
+        return self._admin_stack
+
+    def load_admin_middleware(self):
+        """Return the admin handler and its view, template and exception
+        hooks"""
+        view_middleware = []
+        template_response_middleware = []
+        exception_middleware = []
+
+        handler = convert_exception_to_response(self.get_response)
+        for middleware_path in reversed(settings.ADMIN_MIDDLEWARE):
+            middleware = import_string(middleware_path)
+            try:
+                mw_instance = middleware(handler)
+            except MiddlewareNotUsed:
+                continue
+
+            if hasattr(mw_instance, 'process_view'):
+                view_middleware.insert(0, mw_instance.process_view)
+            if hasattr(mw_instance, 'process_template_response'):
+                template_response_middleware.append(
+                    mw_instance.process_template_response
+                )
+            if hasattr(mw_instance, 'process_exception'):
+                exception_middleware.append(mw_instance.process_exception)
+            handler = convert_exception_to_response(mw_instance)
+
+        return (handler, view_middleware, template_response_middleware,
+                exception_middleware)
+
+    def is_admin(self, request):
+        return request.path_info.startswith(self.prefix)
+
+    def __call__(self, request):
+        if self.is_admin(request):
+            return self.admin_stack[0](request)
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.is_admin(request):
+            return None
+        for hook in self.admin_stack[1]:
+            response = hook(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+    def process_template_response(self, request, response):
+        if self.is_admin(request):
+            for hook in self.admin_stack[2]:
+                response = hook(request, response)
+        return response
+
+    def process_exception(self, request, exception):
+        if not self.is_admin(request):
+            return None
+        for hook in self.admin_stack[3]:
+            response = hook(request, exception)
+            if response is not None:
+                return response
+        return None
+
+
+class ShardMiddleware:
+    """Route the queries of a request to its authenticated user's shard
+
+    The user is only known once the view has authenticated the request,
+    core.sharding.ShardRouter reads it from the request when a query
+    runs. Admin requests stay on the default database, so with
+    DATABASE_SHARDS set the admin does not see the users' tags,
+    ingredients and recipes on the shards.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.admin_prefix = '/' + getattr(settings, 'ADMIN_URL_PREFIX',
+                                          'admin/')
+
+    def __call__(self, request):
+        if request.path_info.startswith(self.admin_prefix):
+            return self.get_response(request)
+        sharding.activate_request(request)
+        try:
+            return self.get_response(request)
+        finally:
+            sharding.deactivate_request()
+
+
+class ProfilerMiddleware:
+    """Profile requests of staff users that ask for it
+
+    A request sending `X-Profile: cprofile|sample` or `?profile=...` is
+    authenticated up front and, if the user is staff, the rest of the
+    request runs under the profiler. The profile is kept in the cache and
+    its id returned in the X-Profile-Id header, see core.views.ProfileView.
+    Other requests only pay for the header and query string lookups.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = request.META.get('HTTP_X_PROFILE') or \
+            request.GET.get('profile')
+        if not mode:
+            return self.get_response(request)
+        if mode not in profiling.MODES:
+            mode = settings.PROFILER_DEFAULT_MODE
+        if not self.is_staff(request):
+            return self.get_response(request)
+
+        response, profile = profiling.profile_call(mode, self.get_response,
+                                                   request)
+        profile.update(method=request.method, path=request.get_full_path(),
+                       status=response.status_code)
+        response['X-Profile-Id'] = profiling.store_profile(profile)
+        return response
+
+    def is_staff(self, request):
+        """Authenticate request like the API views do, return if staff"""
+        api_request = Request(request, authenticators=(
+            ExpiringTokenAuthentication(), SignedTokenAuthentication()
+        ))
+        try:
+            user = api_request.user
+        except APIException:
+            return False
+        return bool(user and user.is_staff)
@@ -0,0 +1,70 @@
+# Generated by Django 2.1.15 on 2026-10-18 21:37
+
+import json
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_read_model(apps, schema_editor):
+    """Build the read model of the existing recipes before reads use it
+
+    Uses the models as of this migration, 1000 recipes at a time.
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    RecipeReadModel = apps.get_model('core', 'RecipeReadModel')
+    using = schema_editor.connection.alias
+    recipes = Recipe.objects.using(using).order_by('pk').prefetch_related(
+        'tags', 'ingredients'
+    )
+
+    last_pk = 0
+    while True:
+        batch = list(recipes.filter(pk__gt=last_pk)[:1000])
+        if not batch:
+            break
+        RecipeReadModel.objects.using(using).bulk_create([
+            RecipeReadModel(
+                recipe_id=recipe.pk, user_id=recipe.user_id,
+                title=recipe.title, time_minutes=recipe.time_minutes,
+                price=recipe.price, link=recipe.link,
+                ingredients=_pairs(recipe.ingredients.all()),
+                tags=_pairs(recipe.tags.all()),
+            )
+            for recipe in batch
+        ])
+        last_pk = batch[-1].pk
+
+
+def _pairs(objects):
+    return json.dumps(sorted([obj.pk, obj.name] for obj in objects),
+                      separators=(',', ':'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_recipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeReadModel',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='read_model', serialize=False, to='core.Recipe')),
+                ('title', models.CharField(max_length=255)),
+                ('time_minutes', models.IntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('link', models.CharField(blank=True, max_length=255)),
+                ('ingredients', models.TextField(default='[]')),
+                ('tags', models.TextField(default='[]')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipereadmodel',
+            index=models.Index(fields=['user', 'recipe'], name='core_recipe_user_id_39ee15_idx'),
+        ),
+        migrations.RunPython(backfill_read_model, migrations.RunPython.noop),
+    ]
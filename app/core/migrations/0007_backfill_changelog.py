@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+def backfill_changelog(apps, schema_editor):
+    """Log every existing object so a first sync from 0 returns it"""
+    db = schema_editor.connection.alias
+    ChangeLog = apps.get_model('core', 'ChangeLog')
+    ChangeSequence = apps.get_model('core', 'ChangeSequence')
+    sequences = {}
+    batch = []
+    for kind, model_name in (('tag', 'Tag'),
+                             ('ingredient', 'Ingredient'),
+                             ('recipe', 'Recipe')):
+        model = apps.get_model('core', model_name)
+        rows = model.objects.using(db).order_by('pk').values_list('pk', 'user_id')
+        for object_id, user_id in rows.iterator():
+            sequences[user_id] = sequences.get(user_id, 0) + 1
+            batch.append(ChangeLog(user_id=user_id, seq=sequences[user_id],
+                                   kind=kind, object_id=object_id))
+            if len(batch) >= 1000:
+                ChangeLog.objects.using(db).bulk_create(batch)
+                batch = []
+    ChangeLog.objects.using(db).bulk_create(batch)
+    ChangeSequence.objects.using(db).bulk_create([
+        ChangeSequence(user_id=user_id, value=value)
+        for user_id, value in sequences.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_changelog'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_changelog, migrations.RunPython.noop),
+    ]
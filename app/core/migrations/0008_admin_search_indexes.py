@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+# Prefix searches in the admin (search_fields '^field') filter on
+# UPPER(field) LIKE 'TERM%', which PostgreSQL can only answer from an
+# expression index with pattern ops. They are built CONCURRENTLY so the
+# tables stay writable, which cannot run in a transaction.
+SEARCH_INDEXES = (
+    ('core_user', 'email'),
+    ('core_tag', 'name'),
+    ('core_ingredient', 'name'),
+    ('core_recipe', 'title'),
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS %s_%s_upper_like '
+            'ON %s (UPPER(%s::text) text_pattern_ops)'
+            % (table, column, table, column)
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            'DROP INDEX CONCURRENTLY IF EXISTS %s_%s_upper_like'
+            % (table, column)
+        )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0007_backfill_changelog'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,48 @@
+from django.core.management.base import CommandError
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_email_duplicates(apps, schema_editor):
+    """Refuse to build the index over emails differing only in case
+
+    Merging or renaming those accounts is left to the operator, who is
+    shown which ones conflict.
+    """
+    User = apps.get_model('core', 'User')
+    users = User.objects.using(schema_editor.connection.alias)
+    duplicates = users.annotate(
+        email_lower=Lower('email')
+    ).values('email_lower').annotate(
+        count=Count('id')
+    ).filter(count__gt=1).values_list('email_lower', flat=True)
+    duplicates = list(duplicates.order_by('email_lower')[:20])
+    if not duplicates:
+        return
+
+    conflicts = users.annotate(email_lower=Lower('email')).filter(
+        email_lower__in=duplicates
+    ).order_by('email_lower', 'id').values_list('id', 'email')
+    raise CommandError(
+        'Cannot make emails case-insensitively unique, these users share '
+        'an email up to case:\n%s\nMerge or rename them and migrate again.'
+        % '\n'.join('  id %d: %s' % row for row in conflicts)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_email_duplicates,
+                             migrations.RunPython.noop),
+        migrations.RunSQL(
+            ['CREATE UNIQUE INDEX core_user_email_lower_uniq '
+             'ON core_user (LOWER(email))'],
+            ['DROP INDEX IF EXISTS core_user_email_lower_uniq'],
+        ),
+    ]
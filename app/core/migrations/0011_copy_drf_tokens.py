@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def copy_tokens(apps, schema_editor):
+    """Carry DRF tokens over so existing clients stay signed in
+
+    They are treated as issued now, otherwise every token older than
+    TOKEN_MAX_AGE would stop working at once.
+    """
+    db = schema_editor.connection.alias
+    Token = apps.get_model('authtoken', 'Token')
+    AuthToken = apps.get_model('core', 'AuthToken')
+    now = timezone.now()
+    batch = []
+    for key, user_id in Token.objects.using(db).values_list('key', 'user_id') \
+            .iterator():
+        batch.append(AuthToken(key=key, user_id=user_id, created=now))
+        if len(batch) >= 1000:
+            AuthToken.objects.using(db).bulk_create(batch)
+            batch = []
+    AuthToken.objects.using(db).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authtoken', '0002_auto_20160226_1747'),
+        ('core', '0010_authtoken'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_tokens, migrations.RunPython.noop),
+    ]
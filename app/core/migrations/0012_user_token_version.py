@@ -0,0 +1,25 @@
+# Generated by Django 2.1.15 on 2026-10-18 21:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_copy_drf_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='token_version',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        # SQLite adds the column by rebuilding the table, which drops the
+        # expression index from 0009 that Django does not know about.
+        migrations.RunSQL(
+            ['CREATE UNIQUE INDEX IF NOT EXISTS core_user_email_lower_uniq '
+             'ON core_user (LOWER(email))'],
+            migrations.RunSQL.noop,
+        ),
+    ]
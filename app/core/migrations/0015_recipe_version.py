@@ -0,0 +1,23 @@
+# Generated by Django 2.1.15 on 2026-10-18 22:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_sharding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='recipereadmodel',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
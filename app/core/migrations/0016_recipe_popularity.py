@@ -0,0 +1,27 @@
+# Generated by Django 2.1.15 on 2026-10-18 22:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_recipe_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipereadmodel',
+            name='popularity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='recipereadmodel',
+            index=models.Index(fields=['user', '-popularity'], name='core_recipe_user_id_3905d5_idx'),
+        ),
+    ]
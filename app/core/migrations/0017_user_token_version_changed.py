@@ -0,0 +1,32 @@
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def stamp_revoked_users(apps, schema_editor):
+    """Date earlier revocations now, so signed tokens still check them"""
+    User = apps.get_model('core', 'User')
+    User.objects.using(schema_editor.connection.alias).filter(
+        token_version__gt=0
+    ).update(token_version_changed=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_recipe_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='token_version_changed',
+            field=models.DateTimeField(db_index=True, editable=False, null=True),
+        ),
+        # See 0012, SQLite drops the expression index when adding a column
+        migrations.RunSQL(
+            ['CREATE UNIQUE INDEX IF NOT EXISTS core_user_email_lower_uniq '
+             'ON core_user (LOWER(email))'],
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunPython(stamp_revoked_users, migrations.RunPython.noop),
+    ]
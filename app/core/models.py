@@ -1,10 +1,50 @@
-from django.db import models
+import json
+import secrets
+from datetime import timedelta
+
+from django.db import models, router
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager,\
                                         PermissionsMixin
 from django.conf import settings
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+
+class UserQuerySet(models.QuerySet):
+
+    def delete(self):
+        """Delete the users without deriving data from their cascade"""
+        from core.signals import deleting_users
+        with deleting_users(self.values_list('pk', flat=True)):
+            return super().delete()
+
+    def deactivate(self):
+        """Deactivate the active users and revoke their signed tokens
 
+        Signed tokens are checked without loading the user, so they are
+        revoked instead. Returns the number of users deactivated.
+        """
+        return self.filter(is_active=True).update(
+            is_active=False,
+            token_version=models.F('token_version') + 1,
+            token_version_changed=timezone.now(),
+        )
 
-class UserManager(BaseUserManager):
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+
+    def filter_email(self, *emails):
+        """Return the users with any of the emails, ignoring case
+
+        Compares LOWER(email), which is what the unique expression index
+        on the user table covers.
+        """
+        return self.annotate(email_lower=Lower('email')).filter(
+            email_lower__in=[email.lower() for email in emails]
+        )
+
+    def get_by_natural_key(self, username):
+        return self.filter_email(username).get()
 
     def create_user(self, email, password=None, **extra_fields):
         """Creates and saves a new user """
@@ -32,11 +72,37 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    token_version = models.PositiveIntegerField(default=0, db_index=True)
+    # When token_version last moved, so revocations can be loaded by change
+    token_version_changed = models.DateTimeField(null=True, editable=False,
+                                                 db_index=True)
 
     objects = UserManager()
 
     USERNAME_FIELD = 'email'
 
+    def save(self, *args, **kwargs):
+        if self.pk is not None and not self.is_active and \
+                User.objects.filter(pk=self.pk).deactivate():
+            self.refresh_from_db(fields=['token_version',
+                                         'token_version_changed'])
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        from core.signals import deleting_users
+        with deleting_users([self.pk]):
+            return super().delete(*args, **kwargs)
+
+    def revoke_tokens(self):
+        """Invalidate every API token, stored or signed, of this user"""
+        User.objects.filter(pk=self.pk).update(
+            token_version=models.F('token_version') + 1,
+            token_version_changed=timezone.now(),
+        )
+        self.refresh_from_db(fields=['token_version',
+                                     'token_version_changed'])
+        self.auth_tokens.all().delete()
+
 
 class Tag(models.Model):
     """Tag to be used for a recipe"""
@@ -44,6 +110,7 @@ class Tag(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        db_constraint=False,
     )
 
     def __str__(self):
@@ -57,6 +124,7 @@ class Ingredient(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        db_constraint=False,
     )
 
     def __str__(self):
@@ -68,6 +136,7 @@ class Recipe(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        db_constraint=False,
     )
     title = models.CharField(max_length=255)
     time_minutes = models.IntegerField()
@@ -75,6 +144,196 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
+    version = models.PositiveIntegerField(default=1)
+    # Number of times the recipe was opened, see recipe.popularity
+    popularity = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.title
+
+    def claim_version(self, expected_version, update_fields=()):
+        """Write update_fields only if the recipe is still at expected_version
+
+        The version check, the version bump and the changed columns go in
+        one conditional UPDATE, so a concurrent writer that got there first
+        makes this return False without waiting for a lock held by a
+        reader. Sends no signals. Call inside a transaction.
+        """
+        values = {}
+        for name in update_fields:
+            field = self._meta.get_field(name)
+            values[field.attname] = getattr(self, field.attname)
+        claimed = Recipe._base_manager.db_manager(
+            router.db_for_write(Recipe, instance=self)
+        ).filter(pk=self.pk, version=expected_version).update(
+            version=expected_version + 1, **values
+        )
+        if not claimed:
+            return False
+        self.version = expected_version + 1
+        return True
+
+
+class RecipeReadModel(models.Model):
+    """Recipe with its tags and ingredients pre-aggregated for reads
+
+    Kept up to date by the handlers in core.signals, rebuilt with the
+    rebuild_read_model command. Tags and ingredients are stored as JSON
+    lists of [id, name] pairs ordered by id.
+    """
+    recipe = models.OneToOneField(
+        'Recipe',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='read_model',
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+    )
+    title = models.CharField(max_length=255)
+    time_minutes = models.IntegerField()
+    price = models.DecimalField(max_digits=5, decimal_places=2)
+    link = models.CharField(max_length=255, blank=True)
+    ingredients = models.TextField(default='[]')
+    tags = models.TextField(default='[]')
+    version = models.PositiveIntegerField(default=1)
+    popularity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'recipe']),
+                   models.Index(fields=['user', '-popularity'])]
+
+    def __str__(self):
+        return self.title
+
+    def ingredient_list(self):
+        """Return the ingredients as (id, name) pairs"""
+        return json.loads(self.ingredients)
+
+    def tag_list(self):
+        """Return the tags as (id, name) pairs"""
+        return json.loads(self.tags)
+
+
+class ChangeSequence(models.Model):
+    """Last change sequence number handed out to a user"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        primary_key=True,
+        related_name='change_sequence',
+    )
+    value = models.BigIntegerField(default=0)
+
+
+class ChangeLog(models.Model):
+    """Latest change to one of a user's tags, ingredients or recipes
+
+    Only the newest change per object is kept, deletes are kept as
+    tombstones so clients can drop their local copy.
+    """
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    RECIPE = 'recipe'
+    KIND_CHOICES = (
+        (TAG, 'Tag'),
+        (INGREDIENT, 'Ingredient'),
+        (RECIPE, 'Recipe'),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+    )
+    seq = models.BigIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.IntegerField()
+    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('user', 'kind', 'object_id')
+        indexes = [models.Index(fields=['user', 'seq'])]
+
+    def __str__(self):
+        return '%s %s @%s' % (self.kind, self.object_id, self.seq)
+
+
+class AuthToken(models.Model):
+    """API token that expires after TOKEN_MAX_AGE, or once unused for
+    TOKEN_IDLE_TIMEOUT
+
+    last_used is only written when it is older than
+    TOKEN_LAST_USED_RESOLUTION, so busy tokens cost one UPDATE per
+    interval rather than one per request.
+    """
+    key = models.CharField(max_length=40, primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='auth_tokens',
+    )
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+    last_used = models.DateTimeField(null=True, db_index=True)
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = self.generate_key()
+        return super().save(*args, **kwargs)
+
+    @staticmethod
+    def generate_key():
+        return secrets.token_hex(20)
+
+    @classmethod
+    def expiry_cutoffs(cls, now=None):
+        """Return the oldest valid (created, last used) times"""
+        now = now or timezone.now()
+        return (now - timedelta(seconds=settings.TOKEN_MAX_AGE),
+                now - timedelta(seconds=settings.TOKEN_IDLE_TIMEOUT))
+
+    @classmethod
+    def valid_filter(cls, now=None):
+        """Return a Q object matching the tokens that have not expired"""
+        created_cutoff, idle_cutoff = cls.expiry_cutoffs(now)
+        return models.Q(created__gte=created_cutoff) & (
+            models.Q(last_used__gte=idle_cutoff) |
+            models.Q(last_used__isnull=True, created__gte=idle_cutoff)
+        )
+
+    def is_expired(self, now=None):
+        created_cutoff, idle_cutoff = self.expiry_cutoffs(now)
+        return (self.created < created_cutoff or
+                (self.last_used or self.created) < idle_cutoff)
+
+    def __str__(self):
+        return self.key
+
+
+class AccountDeletion(models.Model):
+    """Pending deletion of a user account, see core.account_deletion"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    requested = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class ShardAssignment(models.Model):
+    """Database alias holding a user's data, see core.sharding"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    shard = models.CharField(max_length=100)
+
+    def __str__(self):
+        return '%s: %s' % (self.user_id, self.shard)
@@ -0,0 +1,145 @@
+import cProfile
+import io
+import marshal
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+CPROFILE = 'cprofile'
+SAMPLE = 'sample'
+MODES = (CPROFILE, SAMPLE)
+
+
+def _key(profile_id):
+    return 'profile:%s' % profile_id
+
+
+def frame_label(code):
+    """Return a collapsed stack frame name, 'function (file:line)'"""
+    return '%s (%s:%d)' % (code.co_name, code.co_filename,
+                           code.co_firstlineno)
+
+
+class Sampler:
+    """Record the stack of one thread at a fixed interval
+
+    A daemon thread reads the target's current frame with
+    sys._current_frames(), so the profiled code runs untouched and the
+    cost is set by the interval rather than by the number of calls.
+    """
+
+    def __init__(self, interval, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, daemon=True,
+                                        name='profile-sampler')
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+
+class _LoadedStats:
+    """Stats dict in the shape pstats.Stats accepts in place of a profiler
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def profile_call(mode, func, *args, **kwargs):
+    """Run func under the profiler for mode, return (result, profile)
+
+    The profile is a dict holding the marshalled pstats data for cProfile,
+    or the sampled stack counts.
+    """
+    started = time.perf_counter()
+    if mode == CPROFILE:
+        profiler = cProfile.Profile()
+        try:
+            result = profiler.runcall(func, *args, **kwargs)
+        finally:
+            profiler.create_stats()
+        profile = {'stats': marshal.dumps(profiler.stats)}
+    else:
+        sampler = Sampler(settings.PROFILER_SAMPLE_INTERVAL)
+        sampler.start()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            sampler.stop()
+        profile = {'stacks': dict(sampler.stacks),
+                   'interval': sampler.interval}
+    profile['mode'] = mode
+    profile['duration'] = time.perf_counter() - started
+    return result, profile
+
+
+def store_profile(profile):
+    """Keep a profile for PROFILER_CACHE_TIMEOUT seconds, return its id"""
+    profile_id = uuid.uuid4().hex
+    cache.set(_key(profile_id), profile, settings.PROFILER_CACHE_TIMEOUT)
+    return profile_id
+
+
+def load_profile(profile_id):
+    return cache.get(_key(profile_id))
+
+
+def to_pstats(profile):
+    """Return the profile in the file format of pstats.Stats.dump_stats"""
+    return profile['stats']
+
+
+def to_text(profile, limit=50):
+    """Return the functions with the most cumulative time as text"""
+    out = io.StringIO()
+    stats = pstats.Stats(_LoadedStats(marshal.loads(profile['stats'])),
+                         stream=out)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+
+def to_collapsed(profile):
+    """Return the sampled stacks in the collapsed format of flamegraph.pl
+
+    One line per distinct stack, frames from the outermost call separated
+    by ';' followed by the number of samples.
+    """
+    return ''.join(
+        '%s %d\n' % (';'.join(stack), count)
+        for stack, count in sorted(profile['stacks'].items())
+    )
+
+
+# Output formats available for each mode, the first one is the default
+FORMATS = {
+    CPROFILE: {'pstats': (to_pstats, 'application/octet-stream'),
+               'text': (to_text, 'text/plain')},
+    SAMPLE: {'collapsed': (to_collapsed, 'text/plain')},
+}
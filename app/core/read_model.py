@@ -0,0 +1,105 @@
+import json
+from collections import defaultdict
+
+from django.db import router, transaction
+
+from core.models import Recipe, RecipeReadModel
+
+
+def _related_pairs(through, field, recipe_ids, using):
+    """Return {recipe_id: [[id, name], ...]} for one M2M relation"""
+    pairs = defaultdict(list)
+    rows = through.objects.using(using).filter(
+        recipe_id__in=recipe_ids
+    ).values_list(
+        'recipe_id', field + '_id', field + '__name'
+    ).order_by(field + '_id')
+    for recipe_id, pk, name in rows:
+        pairs[recipe_id].append([pk, name])
+    return pairs
+
+
+def refresh_recipes(recipe_ids, using=None):
+    """Rebuild the read model rows for the given recipes
+
+    Runs a fixed number of queries however many recipes are refreshed.
+    Rows for recipes that no longer exist are removed. Every read model
+    column but the tags, ingredients and popularity is copied from the
+    recipe column of the same name. Popularity is counted into both
+    tables by recipe.popularity, so an existing row keeps its own value
+    and only new rows start from the recipe's.
+    """
+    recipe_ids = list(set(recipe_ids))
+    if not recipe_ids:
+        return
+    if using is None:
+        using = router.db_for_write(RecipeReadModel)
+
+    columns = [field.attname
+               for field in RecipeReadModel._meta.concrete_fields
+               if field.name not in ('recipe', 'ingredients', 'tags',
+                                     'popularity')]
+    recipes = Recipe.objects.using(using).filter(
+        pk__in=recipe_ids
+    ).values_list('pk', 'popularity', *columns)
+    ingredients = _related_pairs(
+        Recipe.ingredients.through, 'ingredient', recipe_ids, using
+    )
+    tags = _related_pairs(Recipe.tags.through, 'tag', recipe_ids, using)
+
+    rows = [
+        RecipeReadModel(
+            recipe_id=row[0],
+            ingredients=json.dumps(ingredients[row[0]],
+                                   separators=(',', ':')),
+            tags=json.dumps(tags[row[0]], separators=(',', ':')),
+            popularity=row[1],
+            **dict(zip(columns, row[2:]))
+        )
+        for row in recipes
+    ]
+    with transaction.atomic(using=using):
+        existing = RecipeReadModel.objects.using(using).filter(
+            recipe_id__in=recipe_ids
+        )
+        popularity = dict(existing.select_for_update().values_list(
+            'recipe_id', 'popularity'
+        ))
+        for row in rows:
+            row.popularity = popularity.get(row.recipe_id, row.popularity)
+        existing.delete()
+        RecipeReadModel.objects.using(using).bulk_create(rows)
+
+
+def refresh_in_batches(batch_size, user_id=None, using=None):
+    """Rebuild the read model of every recipe, batch_size at a time
+
+    Yields the number of recipes rebuilt so far after each batch.
+    """
+    if using is None:
+        using = router.db_for_write(RecipeReadModel)
+    recipes = Recipe.objects.using(using).order_by('pk')
+    if user_id is not None:
+        recipes = recipes.filter(user_id=user_id)
+
+    last_pk = 0
+    total = 0
+    while True:
+        ids = list(recipes.filter(pk__gt=last_pk).values_list(
+            'pk', flat=True
+        )[:batch_size])
+        if not ids:
+            break
+        refresh_recipes(ids, using)
+        last_pk = ids[-1]
+        total += len(ids)
+        yield total
+
+
+def recipes_using(field, pks):
+    """Return the ids of recipes related to the given tags or ingredients"""
+    through = getattr(Recipe, field).through
+    related = {'tags': 'tag_id', 'ingredients': 'ingredient_id'}[field]
+    return list(through.objects.filter(
+        **{related + '__in': pks}
+    ).values_list('recipe_id', flat=True).distinct())
@@ -0,0 +1,327 @@
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, \
+    transaction
+
+
+# Tables partitioned by user. Users, tokens and the shard directory stay on
+# the default database.
+SHARDED_MODELS = {
+    'core.tag',
+    'core.ingredient',
+    'core.recipe',
+    'core.recipe_tags',
+    'core.recipe_ingredients',
+    'core.recipereadmodel',
+    'core.changelog',
+    'core.changesequence',
+}
+
+_local = threading.local()
+
+
+def is_sharded(model):
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def shard_aliases():
+    """Return the database aliases holding user data"""
+    return list(settings.DATABASE_SHARDS) or [DEFAULT_DB_ALIAS]
+
+
+class ShardDirectory:
+    """This process's copy of the ShardAssignment directory
+
+    Each user's shard is remembered for SHARD_DIRECTORY_TIMEOUT seconds
+    and then read again, so a user moved by another process is routed to
+    the old shard for at most that long. rebalance_shard keeps the user
+    deactivated until then.
+    """
+    timer = time.monotonic
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            self.next_prune = 0
+
+    def get(self, user_id):
+        entry = self.entries.get(user_id)
+        if entry is not None and self.timer() < entry[1]:
+            return entry[0]
+        return None
+
+    def set(self, user_id, alias):
+        now = self.timer()
+        timeout = settings.SHARD_DIRECTORY_TIMEOUT
+        with self.lock:
+            if now >= self.next_prune:
+                self.entries = {key: entry
+                                for key, entry in self.entries.items()
+                                if now < entry[1]}
+                self.next_prune = now + timeout
+            self.entries[user_id] = (alias, now + timeout)
+
+    def shard_for(self, user_id):
+        alias = self.get(user_id)
+        if alias is not None:
+            return alias
+
+        from core.models import ShardAssignment
+        alias = ShardAssignment.objects.filter(user_id=user_id).values_list(
+            'shard', flat=True
+        ).first()
+        if alias is None:
+            shards = settings.DATABASE_SHARDS
+            alias = shards[zlib.crc32(str(user_id).encode()) % len(shards)]
+            try:
+                with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                    ShardAssignment.objects.create(user_id=user_id,
+                                                   shard=alias)
+            except IntegrityError:
+                alias = ShardAssignment.objects.values_list(
+                    'shard', flat=True
+                ).get(user_id=user_id)
+        self.set(user_id, alias)
+        return alias
+
+
+directory = ShardDirectory()
+
+
+def reset_directory(**kwargs):
+    if kwargs.get('setting') in ('DATABASE_SHARDS',
+                                 'SHARD_DIRECTORY_TIMEOUT'):
+        directory.clear()
+
+
+setting_changed.connect(reset_directory)
+
+
+def shard_for(user_id):
+    """Return the database alias holding user_id's data
+
+    Users are placed by a stable hash of their id the first time they are
+    looked up, and the placement is recorded in the ShardAssignment
+    directory so adding shards or moving the user never depends on the
+    hash again. Lookups are remembered by this process, see
+    ShardDirectory.
+    """
+    if not settings.DATABASE_SHARDS:
+        return DEFAULT_DB_ALIAS
+    return directory.shard_for(user_id)
+
+
+def assign_shard(user_id, alias):
+    """Record that user_id's data now lives on alias
+
+    Other processes follow within SHARD_DIRECTORY_TIMEOUT seconds.
+    """
+    from core.models import ShardAssignment
+    ShardAssignment.objects.update_or_create(
+        user_id=user_id, defaults={'shard': alias}
+    )
+    directory.set(user_id, alias)
+
+
+@contextmanager
+def use_shard(alias):
+    """Route queries on sharded models without an instance to alias"""
+    stack = _local.__dict__.setdefault('shards', [])
+    stack.append(alias)
+    try:
+        yield alias
+    finally:
+        stack.pop()
+
+
+@contextmanager
+def for_user(user_id):
+    """Route queries on sharded models to user_id's shard
+
+    Needed for work on a user's data outside a request, in commands and
+    background threads.
+    """
+    with use_shard(shard_for(user_id)) as alias:
+        yield alias
+
+
+def activate_request(request):
+    """Route this thread's queries by the user of request"""
+    _local.request = request
+
+
+def deactivate_request():
+    _local.request = None
+
+
+def current_shard():
+    """Return the shard selected for this thread, default if none"""
+    stack = _local.__dict__.get('shards')
+    if stack:
+        return stack[-1]
+    request = getattr(_local, 'request', None)
+    # DRF stores the authenticated user on the Django request
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return shard_for(user.pk)
+    return DEFAULT_DB_ALIAS
+
+
+class ShardRouter:
+    """Send each user's tags, ingredients and recipes to the user's shard
+
+    Instances go to the database they were loaded from, or to the shard of
+    their user when new. Querysets go to the shard selected for the thread:
+    the one set with use_shard() or for_user(), else the shard of the
+    request's authenticated user. Everything else uses the default
+    database. Does nothing unless DATABASE_SHARDS is set.
+    """
+
+    def _db(self, model, instance=None, **hints):
+        if not settings.DATABASE_SHARDS or not is_sharded(model):
+            return None
+        if instance is not None:
+            if is_sharded(type(instance)) and instance._state.db:
+                return instance._state.db
+            if instance._meta.label_lower == settings.AUTH_USER_MODEL.lower():
+                return shard_for(instance.pk)
+            user_id = getattr(instance, 'user_id', None)
+            if user_id is not None:
+                return shard_for(user_id)
+        return current_shard()
+
+    db_for_read = _db
+    db_for_write = _db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not settings.DATABASE_SHARDS:
+            return None
+        if is_sharded(type(obj1)) and is_sharded(type(obj2)):
+            return obj1._state.db == obj2._state.db
+        # Sharded rows point at users on the default database
+        return True
+
+
+def _delete_user_data(user_id, alias):
+    """Delete user_id's rows of the sharded tables on alias"""
+    from core.account_deletion import account_querysets, delete_in_batches
+    with use_shard(alias):
+        for queryset in account_querysets(user_id):
+            if is_sharded(queryset.model):
+                delete_in_batches(queryset,
+                                  settings.ACCOUNT_DELETION_BATCH_SIZE)
+
+
+def move_user(user_id, target):
+    """Copy user_id's data to the target shard and delete the original
+
+    Objects get new ids on the target, where the old ones may be taken.
+    The change log gets a tombstone for every old id and a change for
+    every new one, so synced clients replace their copies.
+
+    Safe to run again after a failure: the copy replaces whatever an
+    earlier run left on the target, and the directory only points to the
+    target once the copy has committed. The rows on every other shard
+    are deleted after that, also when the user is already on target.
+    """
+    from core.models import ChangeLog, ChangeSequence, Ingredient, Recipe, \
+        Tag
+    from core.read_model import refresh_recipes
+    from core.sync import record_changes
+
+    source = shard_for(user_id)
+    if source == target:
+        _delete_leftovers(user_id, target)
+        return False
+
+    with use_shard(source):
+        tags = list(Tag.objects.filter(user_id=user_id).order_by('pk'))
+        ingredients = list(Ingredient.objects.filter(user_id=user_id)
+                           .order_by('pk'))
+        recipes = list(Recipe.objects.filter(user_id=user_id)
+                       .order_by('pk'))
+        links = {
+            field: list(getattr(Recipe, field).through.objects.filter(
+                recipe__user_id=user_id
+            ).values_list('recipe_id', related))
+            for field, related in (('tags', 'tag_id'),
+                                   ('ingredients', 'ingredient_id'))
+        }
+        tombstones = list(ChangeLog.objects.filter(
+            user_id=user_id, deleted=True
+        ))
+        sequence = ChangeSequence.objects.filter(user_id=user_id).first()
+
+    with use_shard(target), transaction.atomic(using=target):
+        _delete_user_data(user_id, target)
+        new_ids = {}
+        for kind, objects in ((ChangeLog.TAG, tags),
+                              (ChangeLog.INGREDIENT, ingredients),
+                              (ChangeLog.RECIPE, recipes)):
+            new_ids[kind] = _insert_copies(objects, target)
+
+        recipe_ids = new_ids[ChangeLog.RECIPE]
+        for field, kind in (('tags', ChangeLog.TAG),
+                            ('ingredients', ChangeLog.INGREDIENT)):
+            through = getattr(Recipe, field).through
+            related = through._meta.get_field(kind).attname
+            through.objects.bulk_create([
+                through(recipe_id=recipe_ids[recipe_id],
+                        **{related: new_ids[kind][related_id]})
+                for recipe_id, related_id in links[field]
+            ])
+        refresh_recipes(recipe_ids.values())
+
+        ChangeLog.objects.bulk_create([
+            ChangeLog(user_id=user_id, seq=entry.seq, kind=entry.kind,
+                      object_id=entry.object_id, deleted=True)
+            for entry in tombstones
+        ])
+        if sequence is not None:
+            ChangeSequence.objects.create(user_id=user_id,
+                                          value=sequence.value)
+        for kind, ids in new_ids.items():
+            record_changes(user_id, kind, ids.keys(), deleted=True)
+            record_changes(user_id, kind, ids.values())
+
+    assign_shard(user_id, target)
+    _delete_leftovers(user_id, target)
+    return True
+
+
+def _delete_leftovers(user_id, alias):
+    """Delete user_id's rows from every shard but alias"""
+    for other in shard_aliases():
+        if other != alias:
+            _delete_user_data(user_id, other)
+
+
+def _insert_copies(objects, using):
+    """Insert copies of objects on using, return {old id: new id}"""
+    if not objects:
+        return {}
+    model = type(objects[0])
+    old_ids = [obj.pk for obj in objects]
+    for obj in objects:
+        obj.pk = None
+        obj._state.db = None
+    manager = model._base_manager.using(using)
+    if connections[using].features.can_return_ids_from_bulk_insert:
+        manager.bulk_create(objects)
+    else:
+        # Without RETURNING each row is inserted on its own to learn its
+        # id, bypassing save() and its signals like bulk_create does.
+        fields = [f for f in model._meta.concrete_fields
+                  if f is not model._meta.pk]
+        for obj in objects:
+            obj.pk = manager._insert([obj], fields=fields, return_id=True)
+    return dict(zip(old_ids, (obj.pk for obj in objects)))
@@ -0,0 +1,138 @@
+from contextlib import contextmanager
+
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, \
+                                     pre_delete
+from django.dispatch import receiver
+
+from core.models import Tag, Ingredient, Recipe, ChangeLog
+from core.read_model import refresh_recipes, recipes_using
+from core.sharding import shard_for, use_shard
+from core.sync import record_changes
+
+
+# The receivers below write derived data to the database the instance was
+# saved to or deleted from, given by the signal's `using`, so they work
+# outside requests and for_user() too.
+
+# Users whose account is being deleted, their rows are going away anyway
+_deleting_users = set()
+
+
+@contextmanager
+def deleting_users(user_ids):
+    """Skip derived data for the users' rows deleted in this block
+
+    Used by User.delete() and user querysets. The ids are removed when the
+    block exits, whether the delete succeeded or not.
+    """
+    user_ids = set(user_ids)
+    _deleting_users.update(user_ids)
+    try:
+        yield
+    finally:
+        _deleting_users.difference_update(user_ids)
+
+
+def recipes_changed(user_id, recipe_ids, using=None):
+    """Refresh the read model and log the change
+
+    Works on the database using, the user's shard by default, whatever
+    shard the thread has selected.
+    """
+    if user_id in _deleting_users or not recipe_ids:
+        return
+    with use_shard(using or shard_for(user_id)):
+        refresh_recipes(recipe_ids)
+        record_changes(user_id, ChangeLog.RECIPE, recipe_ids)
+
+
+def bump_versions(recipe_ids, using):
+    """Move recipes whose tags or ingredients were changed for them to a
+    new version, so writes holding the old ETag are refused"""
+    Recipe._base_manager.using(using).filter(pk__in=recipe_ids).update(
+        version=F('version') + 1
+    )
+
+
+def kind_of(sender):
+    return ChangeLog.TAG if sender is Tag else ChangeLog.INGREDIENT
+
+
+def field_of(sender):
+    return 'tags' if sender is Tag else 'ingredients'
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, using, **kwargs):
+    """Refresh the read model row of a saved recipe"""
+    recipes_changed(instance.user_id, [instance.pk], using)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, using, **kwargs):
+    """Leave a tombstone for a deleted recipe"""
+    if instance.user_id not in _deleting_users:
+        with use_shard(using):
+            record_changes(instance.user_id, ChangeLog.RECIPE, [instance.pk],
+                           deleted=True)
+
+
+def recipe_relation_changed(sender, instance, action, reverse, pk_set,
+                            using, **kwargs):
+    """Refresh the recipes whose tags or ingredients changed"""
+    if action == 'pre_clear' and reverse:
+        # The cleared recipes are unknown once the rows are gone
+        instance._cleared_recipe_ids = list(
+            instance.recipe_set.using(using).values_list('pk', flat=True)
+        )
+    elif action in ('post_add', 'post_remove'):
+        recipes_changed(instance.user_id,
+                        pk_set if reverse else [instance.pk], using)
+    elif action == 'post_clear':
+        if reverse:
+            recipes_changed(
+                instance.user_id,
+                instance.__dict__.pop('_cleared_recipe_ids', []), using
+            )
+        else:
+            recipes_changed(instance.user_id, [instance.pk], using)
+
+
+m2m_changed.connect(recipe_relation_changed, sender=Recipe.tags.through)
+m2m_changed.connect(recipe_relation_changed,
+                    sender=Recipe.ingredients.through)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def attribute_saved(sender, instance, created, using, **kwargs):
+    """Log the change and refresh the recipes showing a renamed object"""
+    with use_shard(using):
+        record_changes(instance.user_id, kind_of(sender), [instance.pk])
+        if not created:
+            refresh_recipes(recipes_using(field_of(sender), [instance.pk]))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def attribute_deleting(sender, instance, using, **kwargs):
+    """Remember the recipes using a tag or ingredient about to be deleted"""
+    if instance.user_id not in _deleting_users:
+        with use_shard(using):
+            instance._recipe_ids = recipes_using(field_of(sender),
+                                                 [instance.pk])
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def attribute_deleted(sender, instance, using, **kwargs):
+    """Leave a tombstone and refresh the recipes that used the object"""
+    if instance.user_id in _deleting_users:
+        return
+    recipe_ids = instance.__dict__.pop('_recipe_ids', [])
+    with use_shard(using):
+        record_changes(instance.user_id, kind_of(sender), [instance.pk],
+                       deleted=True)
+        bump_versions(recipe_ids, using)
+    recipes_changed(instance.user_id, recipe_ids, using)
@@ -0,0 +1,47 @@
+from django.db import IntegrityError, router, transaction
+from django.db.models import F
+
+from core.models import ChangeLog, ChangeSequence
+
+
+def next_sequence(user_id, count=1):
+    """Reserve count sequence numbers for a user and return the last one
+
+    The UPDATE locks the user's counter row until the transaction ends, so
+    a user's changes are numbered in commit order.
+    """
+    updated = ChangeSequence.objects.filter(user_id=user_id).update(
+        value=F('value') + count
+    )
+    if not updated:
+        try:
+            with transaction.atomic(
+                    using=router.db_for_write(ChangeSequence)):
+                ChangeSequence.objects.create(user_id=user_id, value=count)
+            return count
+        except IntegrityError:
+            ChangeSequence.objects.filter(user_id=user_id).update(
+                value=F('value') + count
+            )
+    return ChangeSequence.objects.values_list(
+        'value', flat=True
+    ).get(user_id=user_id)
+
+
+def record_changes(user_id, kind, object_ids, deleted=False):
+    """Log a change, or a tombstone when deleted, for each object"""
+    object_ids = sorted(set(object_ids))
+    if not object_ids:
+        return
+
+    with transaction.atomic(using=router.db_for_write(ChangeLog)):
+        last = next_sequence(user_id, len(object_ids))
+        first = last - len(object_ids) + 1
+        ChangeLog.objects.filter(
+            user_id=user_id, kind=kind, object_id__in=object_ids
+        ).delete()
+        ChangeLog.objects.bulk_create([
+            ChangeLog(user_id=user_id, seq=first + i, kind=kind,
+                      object_id=object_id, deleted=deleted)
+            for i, object_id in enumerate(object_ids)
+        ])
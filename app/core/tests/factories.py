@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+
+from core.models import ChangeLog, Ingredient, Recipe, Tag
+from core.signals import recipes_changed
+from core.sync import record_changes
+
+
+def create_user(email='test@admin.com', password='testpass', **params):
+    """Create and return a user"""
+    return get_user_model().objects.create_user(email, password, **params)
+
+
+def _bulk_create(model, user, objects):
+    """Insert objects in one query and return them with their ids
+
+    bulk_create only sets primary keys on PostgreSQL, elsewhere they are
+    read back as the newest rows of the user.
+    """
+    model.objects.bulk_create(objects)
+    if objects and objects[0].pk is None:
+        created = model.objects.filter(user=user).order_by('-pk')
+        objects = list(reversed(created[:len(objects)]))
+    return objects
+
+
+def create_tags(user, *names):
+    """Create and return tags with the given names in one query"""
+    tags = _bulk_create(Tag, user, [Tag(user=user, name=name)
+                                    for name in names])
+    record_changes(user.pk, ChangeLog.TAG, [tag.pk for tag in tags])
+    return tags
+
+
+def create_ingredients(user, *names):
+    """Create and return ingredients with the given names in one query"""
+    ingredients = _bulk_create(Ingredient, user, [
+        Ingredient(user=user, name=name) for name in names
+    ])
+    record_changes(user.pk, ChangeLog.INGREDIENT,
+                   [ingredient.pk for ingredient in ingredients])
+    return ingredients
+
+
+def create_recipes(user, count=1, tags=(), ingredients=(), **params):
+    """Create and return count recipes sharing tags and ingredients
+
+    Runs a fixed number of queries for any count. The read model and the
+    change log are updated as if the recipes were saved one by one.
+    """
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': 5.00,
+    }
+    defaults.update(params)
+    recipes = _bulk_create(Recipe, user, [
+        Recipe(user=user, **defaults) for _ in range(count)
+    ])
+    Recipe.tags.through.objects.bulk_create([
+        Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag.pk)
+        for recipe in recipes for tag in tags
+    ])
+    Recipe.ingredients.through.objects.bulk_create([
+        Recipe.ingredients.through(recipe_id=recipe.pk,
+                                   ingredient_id=ingredient.pk)
+        for recipe in recipes for ingredient in ingredients
+    ])
+    recipes_changed(user.pk, [recipe.pk for recipe in recipes])
+    return recipes
@@ -0,0 +1,17 @@
+from django.test.runner import DiscoverRunner, default_test_processes
+
+
+class ParallelDiscoverRunner(DiscoverRunner):
+    """Test runner that runs one process per CPU by default
+
+    Pass --parallel=1 to run serially, for example to debug a test.
+    """
+
+    def __init__(self, parallel=0, **kwargs):
+        super().__init__(parallel=parallel or default_test_processes(),
+                         **kwargs)
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.set_defaults(parallel=0)
@@ -0,0 +1,138 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.access_log import AccessLogWriter, get_access_log
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TOKEN_URL = reverse('user:token')
+
+
+def read_records(path):
+    with open(path) as stream:
+        return [json.loads(line) for line in stream]
+
+
+class AccessLogTests(TestCase):
+    """Test the background JSON access log"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'access.log')
+        self.user = get_user_model().objects.create_user('test@test.com',
+                                                         'testpass')
+        self.client = APIClient()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_api_call_logged(self):
+        """Test that an API call is logged with its user and query count"""
+        self.client.force_authenticate(self.user)
+        with self.settings(ACCESS_LOG_FILE=self.path):
+            res = self.client.get(RECIPES_URL)
+            get_access_log().flush()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        record, = read_records(self.path)
+        self.assertEqual(record['view'], 'RecipeViewSet.list')
+        self.assertEqual(record['path'], RECIPES_URL)
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['user'], self.user.pk)
+        self.assertGreater(record['queries'], 0)
+        self.assertIn('duration_ms', record)
+
+    def test_token_request_logged_for_user(self):
+        """Test that token requests record whom the token was issued to"""
+        with self.settings(ACCESS_LOG_FILE=self.path):
+            self.client.post(TOKEN_URL, {'email': 'test@test.com',
+                                         'password': 'testpass'})
+            self.client.post(TOKEN_URL, {'email': 'test@test.com',
+                                         'password': 'wrong'})
+            get_access_log().flush()
+
+        issued, failed = read_records(self.path)
+        self.assertEqual((issued['status'], issued['user']),
+                         (200, self.user.pk))
+        self.assertEqual((failed['status'], failed['user']), (400, None))
+
+    @override_settings(ACCESS_LOG_FILE=None)
+    def test_logging_off(self):
+        """Test that nothing is logged without ACCESS_LOG_FILE"""
+        self.assertIsNone(get_access_log())
+
+    def test_full_buffer_drops_and_counts(self):
+        """Test that records are dropped instead of blocking when full"""
+        writer = AccessLogWriter(self.path, buffer_size=2)
+
+        results = [writer.log({'n': n}) for n in range(5)]
+        writer.start()
+        writer.flush()
+        writer.log({'n': 5})
+        writer.flush()
+
+        self.assertEqual(results, [True, True, False, False, False])
+        self.assertEqual(writer.dropped, 3)
+        records = read_records(self.path)
+        self.assertEqual([r.get('n') for r in records], [0, 1, None, 5])
+        self.assertEqual(records[2]['dropped'], 3)
+
+    def test_rotation(self):
+        """Test that the log is rotated by size keeping backup_count files"""
+        writer = AccessLogWriter(self.path, max_bytes=1, backup_count=2,
+                                 batch_size=1)
+        writer.start()
+
+        for n in range(4):
+            writer.log({'n': n})
+            writer.flush()
+
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(read_records(self.path + '.1'), [{'n': 3}])
+        self.assertEqual(read_records(self.path + '.2'), [{'n': 2}])
+        self.assertFalse(os.path.exists(self.path + '.3'))
+
+    def test_no_rotation_without_backups(self):
+        """Test that the log keeps growing when backup_count is 0"""
+        writer = AccessLogWriter(self.path, max_bytes=1, backup_count=0,
+                                 batch_size=1)
+        writer.start()
+
+        for n in range(3):
+            writer.log({'n': n})
+            writer.flush()
+
+        self.assertEqual(read_records(self.path),
+                         [{'n': 0}, {'n': 1}, {'n': 2}])
+        self.assertFalse(os.path.exists(self.path + '.1'))
+
+    def test_write_error_counted_and_writer_kept(self):
+        """Test that a failed write is counted and later records written"""
+        path = os.path.join(self.directory, 'missing', 'access.log')
+        writer = AccessLogWriter(path)
+        writer.start()
+
+        writer.log({'n': 0})
+        self.assertTrue(writer.flush())
+        os.mkdir(os.path.dirname(path))
+        writer.log({'n': 1})
+        self.assertTrue(writer.flush())
+
+        self.assertEqual(writer.write_errors, 1)
+        self.assertEqual(read_records(path), [{'n': 1}])
+
+    def test_flush_without_writer_thread(self):
+        """Test that flushing returns when no thread drains the queue"""
+        writer = AccessLogWriter(self.path)
+        writer.log({'n': 0})
+
+        self.assertFalse(writer.flush())
@@ -0,0 +1,94 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.account_deletion import delete_account, delete_in_batches, \
+    request_account_deletion
+from core.models import AccountDeletion, AuthToken, ChangeLog, Ingredient, \
+    Recipe, RecipeReadModel, Tag
+
+
+ME_URL = reverse('user:me')
+
+
+def sample_account(email, recipes=3):
+    """Create a user with tagged recipes and return it"""
+    user = get_user_model().objects.create_user(email, 'testpass')
+    tag = Tag.objects.create(user=user, name='Vegan')
+    ingredient = Ingredient.objects.create(user=user, name='Salt')
+    for i in range(recipes):
+        recipe = Recipe.objects.create(user=user, title='Recipe %d' % i,
+                                       time_minutes=5, price=1.00)
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+    AuthToken.objects.create(user=user)
+    return user
+
+
+class AccountDeletionTests(TestCase):
+
+    def setUp(self):
+        self.user = sample_account('test@admin.com')
+        self.other = sample_account('other@admin.com', recipes=1)
+
+    def assertAccountDeleted(self, user_id):
+        self.assertFalse(get_user_model().objects.filter(pk=user_id)
+                         .exists())
+        for model in (Tag, Ingredient, Recipe, RecipeReadModel, ChangeLog,
+                      AuthToken):
+            self.assertFalse(model.objects.filter(user_id=user_id).exists())
+        self.assertFalse(Recipe.tags.through.objects.filter(
+            recipe__user_id=user_id).exists())
+
+    def test_delete_account(self):
+        """Test that all of the user's rows are deleted in batches"""
+        request_account_deletion(self.user)
+
+        delete_account(self.user.pk, batch_size=2)
+
+        self.assertAccountDeleted(self.user.pk)
+        self.assertEqual(Recipe.objects.filter(user=self.other).count(), 1)
+        self.assertEqual(Recipe.tags.through.objects.count(), 1)
+
+    def test_delete_account_resumes(self):
+        """Test that an interrupted deletion can be finished"""
+        request_account_deletion(self.user)
+        delete_in_batches(Recipe.tags.through.objects.filter(
+            recipe__user=self.user
+        ), 2)
+
+        delete_account(self.user.pk)
+
+        self.assertAccountDeleted(self.user.pk)
+
+    def test_delete_accounts_command(self):
+        """Test that the command finishes queued deletions"""
+        request_account_deletion(self.user)
+        out = StringIO()
+
+        call_command('delete_accounts', '--user', str(self.other.pk),
+                     stdout=out)
+
+        self.assertIn('Deleted 2 accounts', out.getvalue())
+        self.assertAccountDeleted(self.user.pk)
+        self.assertAccountDeleted(self.other.pk)
+
+    def test_delete_me(self):
+        """Test that deleting the account locks it out and queues it"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        res = client.delete(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertFalse(AuthToken.objects.filter(user=self.user).exists())
+        self.assertTrue(AccountDeletion.objects.filter(user=self.user)
+                        .exists())
@@ -2,6 +2,9 @@ from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from core.admin import EstimatedCountPaginator, estimated_count
+from core.models import Recipe, Tag
+
 
 class AdminSiteTest(TestCase):
 
@@ -39,3 +42,41 @@ class AdminSiteTest(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, 200)
+
+    def test_recipe_pages(self):
+        """Test the recipe changelist, search and change page"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(user=self.user, title='Soup',
+                                       time_minutes=5, price=1.00)
+        recipe.tags.add(tag)
+
+        res = self.client.get(reverse('admin:core_recipe_changelist'),
+                              {'q': 'so'})
+        self.assertContains(res, 'Soup')
+        self.assertContains(res, self.user.email)
+
+        res = self.client.get(reverse('admin:core_recipe_change',
+                                      args=[recipe.id]))
+        self.assertEqual(res.status_code, 200)
+        self.assertContains(res, 'admin-autocomplete')
+        self.assertNotContains(res, 'name="popularity"')
+
+    def test_tag_autocomplete(self):
+        """Test that tags are searched by name prefix"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Dessert')
+
+        res = self.client.get(reverse('admin:core_tag_autocomplete'),
+                              {'term': 've'})
+
+        names = [r['text'] for r in res.json()['results']]
+        self.assertEqual(names, ['Vegan'])
+
+    def test_changelist_count_without_estimate(self):
+        """Test that the changelist counts exactly without an estimate"""
+        self.assertIsNone(estimated_count(Tag.objects.all()))
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        paginator = EstimatedCountPaginator(Tag.objects.order_by('pk'), 100)
+
+        self.assertEqual(paginator.count, 1)
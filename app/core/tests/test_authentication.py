@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.authentication import issue_token
+from core.models import AuthToken
+
+
+TOKEN_URL = reverse('user:token')
+ME_URL = reverse('user:me')
+
+
+class ExpiringTokenTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@admin.com',
+            'testpass'
+        )
+        self.client = APIClient()
+
+    def get_me(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        return self.client.get(ME_URL)
+
+    def test_login_issues_token(self):
+        """Test that the token returned on login authenticates requests"""
+        res = self.client.post(TOKEN_URL, {'email': 'test@admin.com',
+                                           'password': 'testpass'})
+        token = AuthToken.objects.get(key=res.data['token'])
+
+        res = self.get_me(token)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        token.refresh_from_db()
+        self.assertIsNotNone(token.last_used)
+
+    def test_expired_token(self):
+        """Test that tokens past their max age or idle timeout fail"""
+        now = timezone.now()
+        old = AuthToken.objects.create(user=self.user,
+                                       created=now - timedelta(days=31))
+        idle = AuthToken.objects.create(user=self.user,
+                                        created=now - timedelta(days=10),
+                                        last_used=now - timedelta(days=8))
+
+        self.assertEqual(self.get_me(old).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.get_me(idle).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+    def test_last_used_writes_coalesced(self):
+        """Test that last_used is not written on every request"""
+        token = AuthToken.objects.create(user=self.user)
+        self.get_me(token)
+
+        # Token with its user, and no UPDATE
+        with self.assertNumQueries(1):
+            self.get_me(token)
+
+    def test_issue_token_reuses_valid_token(self):
+        """Test that logins share a token unless rotation is enabled"""
+        token = issue_token(self.user)
+
+        self.assertEqual(issue_token(self.user), token)
+        with override_settings(TOKEN_ROTATE=True):
+            self.assertNotEqual(issue_token(self.user), token)
+
+    @override_settings(TOKEN_ROTATE=True)
+    def test_rotation_revokes_previous_token(self):
+        """Test that a rotated token can no longer be used"""
+        old = issue_token(self.user)
+        new = issue_token(self.user)
+
+        self.assertEqual(self.get_me(old).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.get_me(new).status_code, status.HTTP_200_OK)
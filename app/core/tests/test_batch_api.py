@@ -0,0 +1,137 @@
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import views
+from core.models import Tag
+
+
+BATCH_URL = reverse('batch')
+ME_URL = reverse('user:me')
+TAGS_URL = reverse('recipe:tag-list')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class PublicBatchApiTests(TestCase):
+    """Test the unauthenticated batch API access"""
+
+    def test_auth_required(self):
+        """Test that authentication is required"""
+        res = APIClient().post(BATCH_URL, {'requests': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(BATCH_MAX_WORKERS=1)
+class PrivateBatchApiTests(TestCase):
+    """Test the authenticated batch API access"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@admin.com',
+            'testpass',
+            name='Test name'
+        )
+        self.client.force_authenticate(self.user)
+
+    def batch(self, *requests):
+        return self.client.post(BATCH_URL, {'requests': list(requests)},
+                                format='json')
+
+    def test_home_screen_batch(self):
+        """Test that several reads are answered in one response"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.batch(
+            {'path': ME_URL},
+            {'path': TAGS_URL},
+            {'path': RECIPES_URL + '?detail=1'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        me, tags, recipes = res.data['responses']
+        self.assertEqual(me['status'], status.HTTP_200_OK)
+        self.assertEqual(me['body']['email'], self.user.email)
+        self.assertEqual([t['name'] for t in tags['body']], ['Vegan'])
+        self.assertEqual(recipes['body'], [])
+
+    def test_write_then_read(self):
+        """Test that reads after a write see its result"""
+        res = self.batch(
+            {'method': 'POST', 'path': TAGS_URL, 'body': {'name': 'Vegan'}},
+            {'path': TAGS_URL},
+        )
+
+        created, listed = res.data['responses']
+        self.assertEqual(created['status'], status.HTTP_201_CREATED)
+        self.assertEqual([t['name'] for t in listed['body']], ['Vegan'])
+
+    def test_sub_request_errors(self):
+        """Test that failing sub-requests report their own status"""
+        res = self.batch(
+            {'path': '/api/missing/'},
+            {'method': 'POST', 'path': TAGS_URL, 'body': {'name': ''}},
+            {'path': BATCH_URL},
+        )
+
+        statuses = [r['status'] for r in res.data['responses']]
+        self.assertEqual(statuses, [404, 400, 400])
+
+    def test_authenticates_once(self):
+        """Test that sub-requests reuse the batch authentication"""
+        with patch('core.authentication.ExpiringTokenAuthentication.'
+                   'authenticate') as authenticate:
+            self.batch({'path': ME_URL}, {'path': TAGS_URL})
+
+        authenticate.assert_not_called()
+
+    @override_settings(BATCH_MAX_REQUESTS=1)
+    def test_max_requests(self):
+        """Test that too many sub-requests are rejected"""
+        res = self.batch({'path': ME_URL}, {'path': TAGS_URL})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_request(self):
+        """Test that malformed sub-requests are rejected"""
+        res = self.batch({'path': 'api/user/me/'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_only_api_paths(self):
+        """Test that views outside the API cannot be reached"""
+        res = self.batch({'path': '/' + settings.ADMIN_URL_PREFIX})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(BATCH_MAX_WORKERS=4)
+class ConcurrentBatchApiTests(TransactionTestCase):
+    """Test read-only sub-requests dispatched on the thread pool"""
+
+    def test_reads_run_on_thread_pool(self):
+        """Test that independent reads run concurrently"""
+        user = get_user_model().objects.create_user('test@admin.com', 'pw')
+        Tag.objects.create(user=user, name='Vegan')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with patch.object(views.BatchView, 'dispatch_threaded',
+                          autospec=True,
+                          side_effect=views.BatchView.dispatch_threaded) \
+                as dispatch_threaded:
+            res = client.post(BATCH_URL, {'requests': [
+                {'path': ME_URL}, {'path': TAGS_URL}
+            ]}, format='json')
+
+        self.assertEqual(dispatch_threaded.call_count, 2)
+        me, tags = res.data['responses']
+        self.assertEqual(me['body']['email'], user.email)
+        self.assertEqual([t['name'] for t in tags['body']], ['Vegan'])
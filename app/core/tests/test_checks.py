@@ -0,0 +1,41 @@
+from django.test import SimpleTestCase, override_settings
+
+from core.checks import check_throttle_cache
+
+
+MEMCACHED = {'default': {
+    'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+    'LOCATION': '127.0.0.1:11211',
+}}
+LOCMEM = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+}}
+
+
+class ThrottleCacheCheckTests(SimpleTestCase):
+
+    @override_settings(
+        THROTTLE_COUNTER_STORE='core.throttling.CacheCounterStore',
+        CACHES=LOCMEM,
+    )
+    def test_process_local_cache_rejected(self):
+        """Test that shared throttling refuses a per-process cache"""
+        errors = check_throttle_cache(None)
+
+        self.assertEqual([error.id for error in errors], ['core.E001'])
+
+    @override_settings(
+        THROTTLE_COUNTER_STORE='core.throttling.CacheCounterStore',
+        CACHES=MEMCACHED,
+    )
+    def test_shared_cache_accepted(self):
+        """Test that a memcached backend passes the check"""
+        self.assertEqual(check_throttle_cache(None), [])
+
+    @override_settings(
+        THROTTLE_COUNTER_STORE='core.throttling.LocalCounterStore',
+        CACHES=LOCMEM,
+    )
+    def test_local_store_not_checked(self):
+        """Test that in-process counters need no shared cache"""
+        self.assertEqual(check_throttle_cache(None), [])
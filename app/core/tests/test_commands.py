@@ -1,8 +1,19 @@
+import multiprocessing
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import skipIf
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
 from django.db.utils import OperationalError
 from django.test import TestCase
+from django.utils import timezone
+
+from core.management.commands import startup_benchmark
+from core.models import AuthToken, UserManager
 
 
 class CommandTests(TestCase):
@@ -21,3 +32,126 @@ class CommandTests(TestCase):
             gi.side_efect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 1)
+
+    def test_benchmark_middleware(self):
+        """Test that the middleware benchmark reports the saved overhead"""
+        out = StringIO()
+        call_command('benchmark_middleware', requests=5, repeat=1, stdout=out)
+
+        self.assertIn('full stack', out.getvalue())
+        self.assertIn('saved', out.getvalue())
+
+    def test_startup_benchmark(self):
+        """Test that the startup benchmark reports setup and first request"""
+        out = StringIO()
+        call_command('startup_benchmark', runs=1, top=3, stdout=out)
+
+        self.assertIn('django.setup()', out.getvalue())
+        self.assertIn('First GET', out.getvalue())
+        self.assertIn('Slowest imports', out.getvalue())
+
+    def test_parse_importtime(self):
+        """Test parsing the -X importtime output"""
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |   json.decoder\n'
+            'import time:       300 |        420 | json\n'
+        )
+
+        rows = startup_benchmark.parse_importtime(output)
+
+        self.assertEqual(rows, [
+            (120, 120, '  json.decoder'),
+            (300, 420, 'json'),
+        ])
+
+    def provision(self, content, *args):
+        """Run provision_users on a CSV file with the given content"""
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        out = StringIO()
+        call_command('provision_users', path, *args, stdout=out,
+                     stderr=StringIO())
+        return out.getvalue()
+
+    def test_provision_users(self):
+        """Test creating users with tokens from a CSV file"""
+        get_user_model().objects.create_user('taken@test.com', 'pass')
+        fd, tokens_path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        self.addCleanup(os.remove, tokens_path)
+
+        out = self.provision(
+            'email,name,password\n'
+            'one@test.com,One,secret1\n'
+            'two@test.com,Two,\n'
+            'TAKEN@test.com,Taken,secret\n'
+            'One@test.com,Duplicate,secret\n'
+            'not-an-email,Bad,secret\n',
+            '--batch-size', '2', '--workers', '1', '--tokens', tokens_path,
+        )
+
+        self.assertIn('Provisioned 2 users, skipped 3 rows', out)
+        one = get_user_model().objects.get(email='one@test.com')
+        self.assertEqual(one.name, 'One')
+        self.assertTrue(one.check_password('secret1'))
+        two = get_user_model().objects.get(email='two@test.com')
+        self.assertFalse(two.has_usable_password())
+        with open(tokens_path) as f:
+            lines = f.read().splitlines()
+        token = AuthToken.objects.get(user=one)
+        self.assertEqual(lines[1], 'one@test.com,%s' % token.key)
+        self.assertEqual(len(lines), 3)
+
+    def test_provision_users_taken_meanwhile(self):
+        """Test that an email taken after the check only skips its row"""
+        get_user_model().objects.create_user('taken@test.com', 'pass')
+
+        with patch.object(UserManager, 'filter_email',
+                          return_value=get_user_model().objects.none()):
+            out = self.provision('email\nnew@test.com\ntaken@test.com\n',
+                                 '--workers', '1')
+
+        self.assertIn('Provisioned 1 users, skipped 1 rows', out)
+        self.assertTrue(AuthToken.objects.filter(
+            user__email='new@test.com'
+        ).exists())
+
+    @skipIf(multiprocessing.current_process().daemon,
+            'Daemonic processes, like parallel test workers, cannot fork')
+    def test_provision_users_process_pool(self):
+        """Test hashing passwords in worker processes"""
+        self.provision('email,password\na@test.com,secret\n'
+                       'b@test.com,secret\n', '--workers', '2')
+
+        for user in get_user_model().objects.all():
+            self.assertTrue(user.check_password('secret'))
+        self.assertEqual(AuthToken.objects.count(), 2)
+
+    def test_benchmark_auth(self):
+        """Test that the auth benchmark compares both token kinds"""
+        out = StringIO()
+        call_command('benchmark_auth', '--requests', '5', '--repeat', '1',
+                     stdout=out)
+
+        self.assertIn('stored token', out.getvalue())
+        self.assertIn('signed token', out.getvalue())
+        self.assertFalse(get_user_model().objects.exists())
+
+    def test_purge_tokens(self):
+        """Test that only expired tokens are purged"""
+        user = get_user_model().objects.create_user('a@test.com', 'pass')
+        now = timezone.now()
+        valid = AuthToken.objects.create(user=user)
+        AuthToken.objects.create(user=user, created=now - timedelta(days=60))
+        AuthToken.objects.create(user=user, created=now - timedelta(days=10))
+        AuthToken.objects.create(user=user, created=now - timedelta(days=20),
+                                 last_used=now - timedelta(days=8))
+
+        out = StringIO()
+        call_command('purge_tokens', '--batch-size', '1', stdout=out)
+
+        self.assertIn('Purged 3 expired tokens', out.getvalue())
+        self.assertQuerysetEqual(AuthToken.objects.all(), [repr(valid)])
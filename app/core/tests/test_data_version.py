@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from core.data_version import get_data_version
+from core.models import Recipe, Tag
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+}})
+class DataVersionTests(TestCase):
+    """Test the data version without any shared cache"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('test@test.com',
+                                                         'testpass')
+
+    def test_changes_move_version_on(self):
+        """Test that every change gives a new version every process sees"""
+        versions = [get_data_version(self.user.pk)]
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        versions.append(get_data_version(self.user.pk))
+        recipe = Recipe.objects.create(user=self.user, title='Salad',
+                                       time_minutes=5, price=2)
+        recipe.tags.add(tag)
+        versions.append(get_data_version(self.user.pk))
+        recipe.delete()
+        versions.append(get_data_version(self.user.pk))
+
+        self.assertEqual(versions, sorted(set(versions)))
@@ -0,0 +1,122 @@
+import gzip
+import json
+from unittest.mock import Mock, patch
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.urls import reverse
+
+from core import middleware
+
+
+def json_response(count=100):
+    """Return a response with a repetitive JSON body"""
+    body = json.dumps([{'id': i, 'title': 'Sample recipe'}
+                       for i in range(count)])
+    return HttpResponse(body, content_type='application/json')
+
+
+@override_settings(COMPRESSION_ENCODINGS=('gzip',))
+class CompressionMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        cache.clear()
+
+    def process(self, response, **headers):
+        mw = middleware.CompressionMiddleware(lambda request: response)
+        return mw(self.factory.get('/', **headers))
+
+    def test_gzip_negotiated(self):
+        """Test that gzip is used when the client accepts it"""
+        raw = json_response().content
+        res = self.process(json_response(), HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(res['Content-Length'], str(len(res.content)))
+        self.assertEqual(gzip.decompress(res.content), raw)
+        self.assertIn('Accept-Encoding', res['Vary'])
+
+    def test_no_accept_encoding(self):
+        """Test that the body is untouched without Accept-Encoding"""
+        raw = json_response().content
+        res = self.process(json_response())
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertEqual(res.content, raw)
+        self.assertIn('Accept-Encoding', res['Vary'])
+
+    def test_rejected_coding(self):
+        """Test that a coding with q=0 is never chosen"""
+        res = self.process(json_response(), HTTP_ACCEPT_ENCODING='gzip;q=0')
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+
+    def test_small_body_skipped(self):
+        """Test that bodies under the threshold are not compressed"""
+        res = self.process(json_response(1), HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+
+    def test_negotiate_prefers_quality_then_server_order(self):
+        """Test the coding negotiation order"""
+        with patch.dict(middleware.CODECS, {'br': middleware._gzip}):
+            self.assertEqual(
+                middleware.negotiate_encoding('gzip, br', ('br', 'gzip')),
+                'br'
+            )
+            self.assertEqual(
+                middleware.negotiate_encoding('gzip, br;q=0.5',
+                                              ('br', 'gzip')),
+                'gzip'
+            )
+        self.assertIsNone(middleware.negotiate_encoding('br', ('br',)))
+
+    def test_compressed_body_cached(self):
+        """Test that a repeated body is only compressed once"""
+        compress = Mock(wraps=middleware._gzip)
+        with patch.dict(middleware.CODECS, {'gzip': compress}):
+            first = self.process(json_response(), HTTP_ACCEPT_ENCODING='gzip')
+            second = self.process(json_response(),
+                                  HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(compress.call_count, 1)
+        self.assertEqual(first.content, second.content)
+
+
+class AdminMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.seen = []
+        self.middleware = middleware.AdminMiddleware(self.get_response)
+
+    def get_response(self, request):
+        self.seen.append(request)
+        return HttpResponse('ok')
+
+    def test_api_request_skips_admin_stack(self):
+        """Test that API requests do not get sessions or CSRF cookies"""
+        res = self.middleware(self.factory.get('/api/recipe/recipes/'))
+
+        request = self.seen[0]
+        self.assertFalse(hasattr(request, 'session'))
+        self.assertFalse(hasattr(request, 'user'))
+        self.assertFalse(res.has_header('X-Frame-Options'))
+
+    def test_admin_request_uses_admin_stack(self):
+        """Test that admin requests run the full middleware stack"""
+        res = self.middleware(self.factory.get('/admin/'))
+
+        request = self.seen[0]
+        self.assertTrue(hasattr(request, 'session'))
+        self.assertTrue(hasattr(request, 'user'))
+        self.assertEqual(res['X-Frame-Options'], 'SAMEORIGIN')
+
+    def test_admin_post_requires_csrf_token(self):
+        """Test that CSRF protection still applies to the admin"""
+        client = Client(enforce_csrf_checks=True)
+        res = client.post(reverse('admin:login'), {})
+
+        self.assertEqual(res.status_code, 403)
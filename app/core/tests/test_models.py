@@ -1,3 +1,4 @@
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from core import models
@@ -28,6 +29,13 @@ class ModelTest(TestCase):
 
         self.assertEqual(user.email, email.lower())
 
+    def test_email_unique_ignoring_case(self):
+        """Test that emails differing only in case cannot both exist"""
+        get_user_model().objects.create_user('admin@test.com', 'test123')
+
+        with self.assertRaises(IntegrityError):
+            get_user_model().objects.create_user('Admin@test.com', 'test123')
+
     def test_create_user_invalid_email(self):
         """Test creating user with no email raises error"""
         """If this clause raises an error, the test will be OK"""
@@ -0,0 +1,109 @@
+import marshal
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.profiling import Sampler, to_collapsed
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def profile_url(profile_id):
+    return reverse('profile', args=[profile_id])
+
+
+class ProfilerTests(TestCase):
+    """Test per-request profiling for staff"""
+
+    def setUp(self):
+        cache.clear()
+        self.staff = get_user_model().objects.create_user(
+            'staff@test.com', 'testpass', is_staff=True
+        )
+        self.user = get_user_model().objects.create_user('user@test.com',
+                                                         'testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_unflagged_request_not_profiled(self):
+        """Test that requests without the flag are left alone"""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(res.has_header('X-Profile-Id'))
+
+    def test_non_staff_not_profiled(self):
+        """Test that the flag is ignored for users who are not staff"""
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(RECIPES_URL, HTTP_X_PROFILE='cprofile')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(res.has_header('X-Profile-Id'))
+
+    def test_cprofile_stored_and_served(self):
+        """Test that a cProfile profile is served as pstats and text"""
+        res = self.client.get(RECIPES_URL, {'profile': 'cprofile'})
+        url = profile_url(res['X-Profile-Id'])
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        stats = marshal.loads(res.content)
+        self.assertTrue(any(name == 'list' for _, _, name in stats))
+
+        res = self.client.get(url, {'output': 'text'})
+        self.assertIn('function calls', res.content.decode())
+
+        res = self.client.get(url, {'output': 'collapsed'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sampled_profile_served_collapsed(self):
+        """Test that a sampled profile is served as collapsed stacks"""
+        res = self.client.get(RECIPES_URL, HTTP_X_PROFILE='sample')
+
+        res = self.client.get(profile_url(res['X-Profile-Id']))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'text/plain')
+
+    def test_profile_requires_staff(self):
+        """Test that profiles are only served to staff"""
+        res = self.client.get(RECIPES_URL, HTTP_X_PROFILE='cprofile')
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(profile_url(res['X-Profile-Id']))
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_unknown_profile(self):
+        """Test that an unknown or expired profile id is not found"""
+        res = self.client.get(profile_url('missing'))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_sampler_collapsed_stacks(self):
+        """Test that sampled stacks are collapsed outermost frame first"""
+        def busy():
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+
+        sampler = Sampler(0.001)
+        sampler.start()
+        busy()
+        sampler.stop()
+
+        lines = to_collapsed({'stacks': sampler.stacks}).splitlines()
+        self.assertTrue(lines)
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertGreater(int(count), 0)
+        self.assertTrue(any(line.split(';')[-1].startswith('busy ')
+                            for line in lines))
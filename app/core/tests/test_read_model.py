@@ -0,0 +1,170 @@
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models.signals import pre_delete
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+
+from core.models import Tag, Ingredient, Recipe, RecipeReadModel, ChangeLog
+
+
+class RecipeReadModelTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@admin.com',
+            'testpass'
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Curry',
+            time_minutes=30,
+            price=5.00
+        )
+
+    def read_model(self):
+        return RecipeReadModel.objects.get(recipe=self.recipe)
+
+    def test_created_with_recipe(self):
+        """Test that saving a recipe creates its read model row"""
+        self.recipe.title = 'Thai curry'
+        self.recipe.save()
+
+        row = self.read_model()
+        self.assertEqual(row.title, 'Thai curry')
+        self.assertEqual(row.user, self.user)
+        self.assertEqual(row.tag_list(), [])
+
+    def test_relations_added_and_removed(self):
+        """Test that M2M changes on the recipe are reflected"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Rice')
+        self.recipe.tags.add(tag)
+        self.recipe.ingredients.add(ingredient)
+
+        self.assertEqual(self.read_model().tag_list(), [[tag.id, 'Vegan']])
+        self.assertEqual(self.read_model().ingredient_list(),
+                         [[ingredient.id, 'Rice']])
+
+        self.recipe.tags.remove(tag)
+        self.recipe.ingredients.clear()
+        self.assertEqual(self.read_model().tag_list(), [])
+        self.assertEqual(self.read_model().ingredient_list(), [])
+
+    def test_reverse_relation_changes(self):
+        """Test that changes made from the tag side are reflected"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        tag.recipe_set.add(self.recipe)
+        self.assertEqual(self.read_model().tag_list(), [[tag.id, 'Vegan']])
+
+        tag.recipe_set.clear()
+        self.assertEqual(self.read_model().tag_list(), [])
+
+    def test_tag_renamed_and_deleted(self):
+        """Test that renaming or deleting a tag updates its recipes"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe.tags.add(tag)
+
+        tag.name = 'Plant based'
+        tag.save()
+        self.assertEqual(self.read_model().tag_list(),
+                         [[tag.id, 'Plant based']])
+
+        tag.delete()
+        self.assertEqual(self.read_model().tag_list(), [])
+
+    def test_refresh_keeps_popularity(self):
+        """Test that refreshing a row keeps its counted popularity"""
+        RecipeReadModel.objects.filter(recipe=self.recipe).update(
+            popularity=5
+        )
+
+        self.recipe.title = 'Thai curry'
+        self.recipe.save()
+
+        row = self.read_model()
+        self.assertEqual(row.title, 'Thai curry')
+        self.assertEqual(row.popularity, 5)
+
+    def test_deleted_with_recipe(self):
+        """Test that deleting a recipe removes its read model row"""
+        self.recipe.delete()
+
+        self.assertFalse(RecipeReadModel.objects.exists())
+
+    def test_rebuild_read_model(self):
+        """Test that the rebuild command backfills missing rows"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe.tags.add(tag)
+        RecipeReadModel.objects.all().delete()
+
+        call_command('rebuild_read_model', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(self.read_model().tag_list(), [[tag.id, 'Vegan']])
+
+    def test_user_deleted(self):
+        """Test that deleting a user leaves no derived rows behind"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe.tags.add(tag)
+
+        self.user.delete()
+
+        self.assertFalse(RecipeReadModel.objects.exists())
+        self.assertFalse(ChangeLog.objects.exists())
+
+    def test_failed_user_delete_keeps_deriving_data(self):
+        """Test that a user whose delete fails is not left marked deleted"""
+        def fail(sender, **kwargs):
+            raise RuntimeError('delete failed')
+
+        pre_delete.connect(fail, sender=get_user_model())
+        try:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.user.delete()
+        finally:
+            pre_delete.disconnect(fail, sender=get_user_model())
+
+        self.recipe.title = 'Thai curry'
+        self.recipe.save()
+
+        self.assertEqual(self.read_model().title, 'Thai curry')
+
+
+class ReadModelMigrationTests(TransactionTestCase):
+    """Test the read model migration against the schema it was written for"""
+
+    def migrate(self, *targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(list(targets))
+        return executor.loader.project_state(list(targets)).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self.migrate(*executor.loader.graph.leaf_nodes())
+
+    def test_backfills_existing_recipes(self):
+        """Test that the read model migration builds rows for old recipes"""
+        old_apps = self.migrate(('core', '0004_recipe'))
+        user = old_apps.get_model('core', 'User').objects.create(
+            email='test@admin.com'
+        )
+        tag = old_apps.get_model('core', 'Tag').objects.create(
+            user_id=user.pk, name='Vegan'
+        )
+        recipe = old_apps.get_model('core', 'Recipe').objects.create(
+            user_id=user.pk, title='Curry', time_minutes=30, price=5
+        )
+        recipe.tags.add(tag)
+
+        new_apps = self.migrate(('core', '0005_recipereadmodel'))
+
+        row = new_apps.get_model('core', 'RecipeReadModel').objects.get(
+            recipe_id=recipe.pk
+        )
+        self.assertEqual(row.title, 'Curry')
+        self.assertEqual(json.loads(row.tags), [[tag.pk, 'Vegan']])
+        self.assertEqual(json.loads(row.ingredients), [])
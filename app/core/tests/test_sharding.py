@@ -0,0 +1,203 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ChangeLog, Recipe, RecipeReadModel, \
+    ShardAssignment, Tag
+from core.management.commands.rebalance_shard import \
+    Command as RebalanceShard
+from core.sharding import ShardDirectory, assign_shard, directory, \
+    for_user, move_user, shard_for
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+SHARDS = ['shard_1', 'shard_2']
+
+
+class Clock:
+    """Timer for directories that only moves when told to"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@override_settings(DATABASE_SHARDS=SHARDS)
+class ShardingTests(TestCase):
+    """Test user sharding over SQLite files added as extra databases"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        for alias in SHARDS:
+            connections.databases[alias] = {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(cls.directory, alias + '.sqlite3'),
+            }
+            connections.ensure_defaults(alias)
+            connections.prepare_test_settings(alias)
+            call_command('migrate', database=alias, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in SHARDS:
+            connections[alias].close()
+            del connections.databases[alias]
+            delattr(connections._connections, alias)
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def setUp(self):
+        directory.clear()
+        self.user = get_user_model().objects.create_user('one@test.com',
+                                                         'testpass')
+        self.other = get_user_model().objects.create_user('two@test.com',
+                                                          'testpass')
+        assign_shard(self.user.pk, 'shard_1')
+        assign_shard(self.other.pk, 'shard_2')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        for alias in SHARDS:
+            call_command('flush', database=alias, interactive=False,
+                         verbosity=0)
+        directory.clear()
+
+    def test_new_user_placed_by_hash(self):
+        """Test that a new user is given a shard and it is recorded"""
+        user = get_user_model().objects.create_user('new@test.com', 'pass')
+
+        alias = shard_for(user.pk)
+
+        self.assertIn(alias, SHARDS)
+        self.assertEqual(ShardAssignment.objects.get(user=user).shard, alias)
+
+    def test_api_uses_user_shard(self):
+        """Test that API requests read and write the user's shard"""
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+        tag_id = res.data['id']
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Salad', 'time_minutes': 5, 'price': 2.00,
+            'tags': [tag_id],
+        })
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        with for_user(self.other.pk):
+            Recipe.objects.create(user=self.other, title='Soup',
+                                  time_minutes=5, price=2.00)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual([r['title'] for r in res.data], ['Salad'])
+        self.assertEqual(res.data[0]['tags'], [tag_id])
+        recipe = Recipe.objects.using('shard_1').get(user=self.user)
+        self.assertEqual(list(recipe.tags.values_list('name', flat=True)),
+                         ['Vegan'])
+        self.assertFalse(Recipe.objects.using('default').exists())
+        self.assertTrue(Recipe.objects.using('shard_2')
+                        .filter(user=self.other).exists())
+
+    def test_save_outside_shard_context(self):
+        """Test that derived data follows a recipe saved outside requests"""
+        # As the admin or a shell would, placed by the router
+        tag = Tag(user=self.user, name='Vegan')
+        tag.save()
+        recipe = Recipe(user=self.user, title='Salad', time_minutes=5,
+                        price=2.00)
+        recipe.save()
+        recipe.tags.add(tag)
+
+        self.assertEqual(recipe._state.db, 'shard_1')
+        row = RecipeReadModel.objects.using('shard_1').get(recipe=recipe)
+        self.assertEqual(row.tag_list(), [[tag.id, 'Vegan']])
+        self.assertEqual(
+            set(ChangeLog.objects.using('shard_1')
+                .values_list('kind', 'object_id')),
+            {(ChangeLog.TAG, tag.id), (ChangeLog.RECIPE, recipe.id)}
+        )
+        for alias in ('default', 'shard_2'):
+            self.assertFalse(ChangeLog.objects.using(alias).exists())
+            self.assertFalse(RecipeReadModel.objects.using(alias).exists())
+
+    def test_rebalance_shard(self):
+        """Test moving a user's data to another shard"""
+        with for_user(self.user.pk):
+            tag = Tag.objects.create(user=self.user, name='Vegan')
+            recipe = Recipe.objects.create(user=self.user, title='Salad',
+                                           time_minutes=5, price=2.00)
+            recipe.tags.add(tag)
+        out = StringIO()
+
+        with patch.object(RebalanceShard, 'sleep') as sleep:
+            call_command('rebalance_shard', str(self.user.pk), 'shard_2',
+                         stdout=out)
+
+        self.assertIn('Moved user', out.getvalue())
+        self.assertEqual([c[0] for c in sleep.call_args_list],
+                         [(30,), (60,)])
+        self.assertEqual(shard_for(self.user.pk), 'shard_2')
+        self.assertFalse(Recipe.objects.using('shard_1').exists())
+        self.assertFalse(ChangeLog.objects.using('shard_1').exists())
+        moved = Recipe.objects.using('shard_2').get(user=self.user)
+        self.assertEqual(list(moved.tags.values_list('name', flat=True)),
+                         ['Vegan'])
+        self.assertEqual(RecipeReadModel.objects.using('shard_2')
+                         .get(recipe_id=moved.id).title, 'Salad')
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_active)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual([r['id'] for r in res.data], [moved.id])
+
+    def test_interrupted_move_rerun(self):
+        """Test that a move can be run again after failing half way"""
+        with for_user(self.user.pk):
+            Recipe.objects.create(user=self.user, title='Salad',
+                                  time_minutes=5, price=2.00)
+
+        with patch('core.sharding.assign_shard',
+                   side_effect=RuntimeError('crashed')):
+            with self.assertRaises(RuntimeError):
+                move_user(self.user.pk, 'shard_2')
+        self.assertEqual(shard_for(self.user.pk), 'shard_1')
+        with patch('core.sharding._delete_leftovers',
+                   side_effect=RuntimeError('crashed')):
+            with self.assertRaises(RuntimeError):
+                move_user(self.user.pk, 'shard_2')
+        self.assertEqual(shard_for(self.user.pk), 'shard_2')
+
+        self.assertFalse(move_user(self.user.pk, 'shard_2'))
+
+        self.assertEqual(Recipe.objects.using('shard_2').count(), 1)
+        self.assertEqual(RecipeReadModel.objects.using('shard_2').count(), 1)
+        self.assertFalse(Recipe.objects.using('shard_1').exists())
+
+    @override_settings(SHARD_DIRECTORY_TIMEOUT=60)
+    def test_moved_user_followed_by_other_processes(self):
+        """Test that a warm directory picks up a move once it times out"""
+        clock = Clock()
+        other_process = ShardDirectory()
+        other_process.timer = clock
+        self.assertEqual(other_process.shard_for(self.user.pk), 'shard_1')
+
+        assign_shard(self.user.pk, 'shard_2')
+
+        self.assertEqual(shard_for(self.user.pk), 'shard_2')
+        self.assertEqual(other_process.shard_for(self.user.pk), 'shard_1')
+        clock.now += 60
+        self.assertEqual(other_process.shard_for(self.user.pk), 'shard_2')
@@ -0,0 +1,129 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.authentication import sign_token, token_versions, unsign_token
+
+
+SIGNED_TOKEN_URL = reverse('user:signed-token')
+REVOKE_URL = reverse('user:revoke-tokens')
+ME_URL = reverse('user:me')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class SignedTokenTests(TestCase):
+
+    def setUp(self):
+        token_versions.reset()
+        self.addCleanup(token_versions.reset)
+        self.user = get_user_model().objects.create_user(
+            'test@admin.com',
+            'testpass',
+            name='Test name'
+        )
+        self.client = APIClient()
+
+    def authenticate(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + token)
+
+    def test_sign_and_unsign(self):
+        """Test that tokens carry the user id and version until expiry"""
+        token, expires = sign_token(self.user, now=1000)
+
+        self.assertEqual(unsign_token(token, now=1000),
+                         (self.user.pk, 0))
+        self.assertIsNone(unsign_token(token, now=expires + 1))
+        self.assertIsNone(unsign_token(token.replace('.0.', '.1.', 1),
+                                       now=1000))
+
+    def test_signed_token_authenticates_without_queries(self):
+        """Test that a request is authenticated without a query"""
+        res = self.client.post(SIGNED_TOKEN_URL, {'email': 'test@admin.com',
+                                                  'password': 'testpass'})
+        self.authenticate(res.data['token'])
+        self.client.get(TAGS_URL)
+
+        # Only the tag list itself is queried
+        with self.assertNumQueries(1):
+            res = self.client.get(TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.data['name'], 'Test name')
+
+    def test_invalid_signed_token(self):
+        """Test that a tampered token is rejected"""
+        self.authenticate(sign_token(self.user)[0] + 'x')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke_tokens(self):
+        """Test that revoking invalidates the user's signed tokens"""
+        token = sign_token(self.user)[0]
+        self.authenticate(token)
+
+        res = self.client.post(REVOKE_URL)
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.user.refresh_from_db()
+        self.authenticate(sign_token(self.user)[0])
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_200_OK)
+
+    def test_revocations_loaded_from_database(self):
+        """Test that versions bumped elsewhere are picked up on refresh"""
+        token = sign_token(self.user)[0]
+        self.user.revoke_tokens()
+        token_versions.reset()
+        self.authenticate(token)
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_tokens_revoked(self):
+        """Test that deactivating a user, saved or updated, revokes tokens"""
+        other = get_user_model().objects.create_user('other@admin.com',
+                                                     'testpass')
+        tokens = [sign_token(user)[0] for user in (self.user, other)]
+
+        self.user.is_active = False
+        self.user.save()
+        get_user_model().objects.filter(pk=other.pk).deactivate()
+        token_versions.reset()
+
+        for token in tokens:
+            self.authenticate(token)
+            res = self.client.get(ME_URL)
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_loads_only_changes(self):
+        """Test that refreshes after the first load only changed users"""
+        token_versions.get(self.user.pk)
+        self.user.revoke_tokens()
+        token_versions.expires = 0
+
+        with CaptureQueriesContext(connection) as queries:
+            version = token_versions.get(self.user.pk)
+
+        self.assertEqual(version, 1)
+        self.assertIn('token_version_changed', queries[0]['sql'])
+
+    def test_refresh_does_not_block_readers(self):
+        """Test that the old versions are served while another refreshes"""
+        self.user.revoke_tokens()
+        token_versions.get(self.user.pk)
+        self.user.revoke_tokens()
+        token_versions.expires = 0
+
+        with token_versions.refresh_lock, self.assertNumQueries(0):
+            self.assertEqual(token_versions.get(self.user.pk), 1)
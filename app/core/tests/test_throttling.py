@@ -0,0 +1,123 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import throttling
+
+
+TOKEN_URL = reverse('user:token')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class SlidingWindowTests(TestCase):
+
+    def test_allows_up_to_limit(self):
+        """Test that requests are allowed until the limit is reached"""
+        store = throttling.LocalCounterStore()
+        results = [store.hit('key', 3, 60, 600 + i)[0] for i in range(4)]
+
+        self.assertEqual(results, [True, True, True, False])
+
+    def test_previous_window_is_weighted(self):
+        """Test that the previous window counts in proportion to overlap"""
+        store = throttling.LocalCounterStore()
+        for i in range(4):
+            store.hit('key', 4, 60, 600 + i)
+
+        # A quarter into the next window 3 of the 4 requests still count
+        self.assertEqual(store.hit('key', 4, 60, 675), (True, 0))
+        allowed, wait = store.hit('key', 4, 60, 676)
+        self.assertFalse(allowed)
+        self.assertGreater(wait, 0)
+        self.assertTrue(store.hit('key', 4, 60, 676 + wait + 1)[0])
+
+    def test_keys_are_independent(self):
+        """Test that each key has its own counter"""
+        store = throttling.LocalCounterStore()
+        store.hit('a', 1, 60, 600)
+
+        self.assertFalse(store.hit('a', 1, 60, 601)[0])
+        self.assertTrue(store.hit('b', 1, 60, 601)[0])
+
+    def test_stale_keys_swept(self):
+        """Test that keys outside the sliding window are dropped"""
+        store = throttling.LocalCounterStore()
+        store.hit('a', 1, 60, 600)
+        store.hit('b', 1, 60, 900)
+
+        self.assertEqual(list(store.counters), ['b'])
+
+    def test_cache_store(self):
+        """Test that the shared cache store gives the same decisions"""
+        cache.clear()
+        store = throttling.CacheCounterStore()
+        results = [store.hit('key', 3, 60, 600 + i)[0] for i in range(4)]
+
+        self.assertEqual(results, [True, True, True, False])
+        self.assertTrue(store.hit('key', 3, 60, 700)[0])
+
+
+@override_settings(REST_FRAMEWORK={
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.ReadRateThrottle',
+        'core.throttling.WriteRateThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'read': '2/min',
+        'write': '1/min',
+        'login': '2/min',
+    },
+})
+class ThrottledApiTests(TestCase):
+
+    def setUp(self):
+        throttling.get_counter_store().reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@admin.com',
+            'password123'
+        )
+
+    def tearDown(self):
+        throttling.get_counter_store().reset()
+
+    def test_login_throttled(self):
+        """Test that the token endpoint is throttled by address"""
+        payload = {'email': 'test@admin.com', 'password': 'wrong'}
+        for _ in range(2):
+            self.client.post(TOKEN_URL, payload)
+        res = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
+
+    def test_reads_and_writes_throttled_separately(self):
+        """Test that read and write scopes have their own limits"""
+        self.client.force_authenticate(self.user)
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+        res = self.client.post(TAGS_URL, {'name': 'Dessert'})
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        for _ in range(2):
+            res = self.client.get(TAGS_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_users_throttled_separately(self):
+        """Test that one user hitting the limit does not affect another"""
+        user2 = get_user_model().objects.create_user(
+            'other@admin.com',
+            'password123'
+        )
+        self.client.force_authenticate(self.user)
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.client.force_authenticate(user2)
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
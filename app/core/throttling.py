@@ -0,0 +1,224 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def sliding_window(previous, current, limit, duration, elapsed):
+    """Return (allowed, wait) for one more request in the current window
+
+    The count for the last `duration` seconds is estimated from the
+    previous and current fixed windows, weighting the previous window by
+    how much of it still overlaps. Only two integers are kept per key.
+    """
+    weight = 1 - elapsed / duration
+    if previous * weight + current + 1 <= limit:
+        return True, 0
+
+    if current + 1 <= limit and previous:
+        # The previous window fades out before this one ends
+        wait = duration * (1 - (limit - current - 1) / previous) - elapsed
+    else:
+        # Wait for the next window, where this one becomes the previous
+        wait = duration - elapsed
+        if current:
+            wait += max(0, duration * (1 - (limit - 1) / current))
+    return False, max(wait, 0)
+
+
+class LocalCounterStore:
+    """Sliding window counters held in this process
+
+    Each key maps to a (window, previous, current, duration) tuple. Keys
+    that have not been hit for two windows are swept out periodically.
+    """
+    sweep_interval = 60
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.next_sweep = 0
+
+    def hit(self, key, limit, duration, now):
+        """Count a request for key and return (allowed, wait)"""
+        window, elapsed = divmod(now, duration)
+        with self.lock:
+            if now >= self.next_sweep:
+                self.sweep(now)
+            last_window, previous, current, _ = self.counters.get(
+                key, (window, 0, 0, duration)
+            )
+            if last_window == window - 1:
+                previous, current = current, 0
+            elif last_window != window:
+                previous, current = 0, 0
+
+            allowed, wait = sliding_window(
+                previous, current, limit, duration, elapsed
+            )
+            if allowed:
+                current += 1
+            self.counters[key] = (window, previous, current, duration)
+        return allowed, wait
+
+    def sweep(self, now):
+        """Drop keys whose windows no longer affect the estimate"""
+        self.next_sweep = now + self.sweep_interval
+        for key, (window, _, _, duration) in list(self.counters.items()):
+            if (window + 2) * duration <= now:
+                del self.counters[key]
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+
+
+class CacheCounterStore:
+    """Sliding window counters shared between processes through a cache
+
+    Uses one atomic `incr` per request on the current window's key and
+    reads the previous window's count, so the cache backend must be shared
+    by every worker and support atomic increments, like memcached or
+    redis. core.checks refuses process-local and non-atomic backends.
+    """
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'THROTTLE_CACHE_ALIAS',
+                                    'default')]
+
+    def hit(self, key, limit, duration, now):
+        """Count a request for key and return (allowed, wait)"""
+        window, elapsed = divmod(now, duration)
+        current_key = '%s:%d' % (key, window)
+        previous_key = '%s:%d' % (key, window - 1)
+
+        self.cache.add(current_key, 0, int(duration * 2))
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # The key expired between add and incr
+            self.cache.add(current_key, 1, int(duration * 2))
+            current = 1
+        previous = self.cache.get(previous_key, 0)
+
+        allowed, wait = sliding_window(
+            previous, current - 1, limit, duration, elapsed
+        )
+        if not allowed:
+            self.cache.decr(current_key)
+        return allowed, wait
+
+
+_counter_store = None
+
+
+def get_counter_store():
+    """Return the counter store configured by THROTTLE_COUNTER_STORE"""
+    global _counter_store
+    if _counter_store is None:
+        _counter_store = import_string(getattr(
+            settings, 'THROTTLE_COUNTER_STORE',
+            'core.throttling.LocalCounterStore'
+        ))()
+    return _counter_store
+
+
+def reset_counter_store(**kwargs):
+    global _counter_store
+    if kwargs.get('setting') in (None, 'THROTTLE_COUNTER_STORE',
+                                 'THROTTLE_CACHE_ALIAS'):
+        _counter_store = None
+
+
+setting_changed.connect(reset_counter_store)
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """Throttle requests per user, or per client address when anonymous
+
+    The rate for `scope` is read from DEFAULT_THROTTLE_RATES, in the same
+    'number/period' format as DRF's throttles.
+    """
+    scope = None
+    methods = None
+    timer = time.time
+
+    def __init__(self):
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self._wait = None
+
+    def get_rate(self):
+        if not self.scope:
+            raise ImproperlyConfigured(
+                "You must set `.scope` for '%s' throttle" %
+                self.__class__.__name__
+            )
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            raise ImproperlyConfigured(
+                "No default throttle rate set for '%s' scope" % self.scope
+            )
+
+    def parse_rate(self, rate):
+        if rate is None:
+            return None, None
+        num, period = rate.split('/')
+        duration = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+        return int(num), duration
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = 'user:%s' % request.user.pk
+        else:
+            ident = 'addr:%s' % self.get_ident(request)
+        return 'throttle:%s:%s' % (self.scope, ident)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        if self.methods is not None and request.method not in self.methods:
+            return True
+
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        allowed, self._wait = get_counter_store().hit(
+            key, self.num_requests, self.duration, self.timer()
+        )
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class ReadRateThrottle(SlidingWindowThrottle):
+    """Throttle safe method requests"""
+    scope = 'read'
+    methods = SAFE_METHODS
+
+
+class WriteRateThrottle(SlidingWindowThrottle):
+    """Throttle requests that change data"""
+    scope = 'write'
+    methods = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+class LoginRateThrottle(SlidingWindowThrottle):
+    """Throttle token requests by client address"""
+    scope = 'login'
+
+    def get_cache_key(self, request, view):
+        return 'throttle:%s:addr:%s' % (self.scope, self.get_ident(request))
@@ -0,0 +1,199 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.handlers.exception import response_for_exception
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+
+from rest_framework import status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.authentication import ExpiringTokenAuthentication, \
+    SignedTokenAuthentication
+from core.profiling import FORMATS, load_profile
+from core.sharding import for_user
+
+
+API_PREFIX = '/api/'
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+METHODS = READ_METHODS + ('POST', 'PUT', 'PATCH', 'DELETE')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the thread pool shared by all batch requests"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BATCH_MAX_WORKERS,
+                thread_name_prefix='batch',
+            )
+    return _executor
+
+
+class BatchView(APIView):
+    """Run several API requests in one round trip
+
+    The batch request is authenticated once and each sub-request is
+    dispatched straight to its view through the URL resolver, skipping the
+    middleware. Only API views are reachable this way, the others rely on
+    the middleware and on CSRF checks. Consecutive read-only sub-requests
+    run concurrently, a write waits for everything before it and blocks
+    everything after it.
+    """
+    authentication_classes = (ExpiringTokenAuthentication,
+                              SignedTokenAuthentication)
+    permission_classes = (IsAuthenticated,)
+
+    def validate(self, data):
+        """Return the list of sub-request specs from the batch body"""
+        specs = data.get('requests') if isinstance(data, dict) else None
+        if not isinstance(specs, list) or not specs:
+            raise ValidationError({'requests': 'A list is required.'})
+        if len(specs) > settings.BATCH_MAX_REQUESTS:
+            msg = 'At most %d requests are allowed.'
+            raise ValidationError(
+                {'requests': msg % settings.BATCH_MAX_REQUESTS}
+            )
+
+        for spec in specs:
+            path = spec.get('path') if isinstance(spec, dict) else None
+            if not isinstance(path, str) or not path.startswith('/'):
+                msg = 'Each request needs an absolute path.'
+                raise ValidationError({'requests': msg})
+            if not path.startswith(API_PREFIX):
+                msg = 'Only paths under %s are allowed.' % API_PREFIX
+                raise ValidationError({'requests': msg})
+            spec['method'] = str(spec.get('method', 'GET')).upper()
+            if spec['method'] not in METHODS:
+                msg = 'Method %s is not allowed.' % spec['method']
+                raise ValidationError({'requests': msg})
+        return specs
+
+    def build_request(self, request, spec):
+        """Return a WSGI request for one sub-request"""
+        path, _, query = spec['path'].partition('?')
+        body = b''
+        if spec.get('body') is not None:
+            body = json.dumps(spec['body']).encode()
+
+        environ = dict(request._request.META)
+        environ.update({
+            'REQUEST_METHOD': spec['method'],
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': BytesIO(body),
+        })
+        sub_request = WSGIRequest(environ)
+        sub_request.user = request.user
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+        sub_request._dont_enforce_csrf_checks = True
+        return sub_request
+
+    def dispatch_one(self, sub_request):
+        """Run one sub-request and return its status and body"""
+        try:
+            match = resolve(sub_request.path_info)
+        except Resolver404:
+            return {'status': status.HTTP_404_NOT_FOUND, 'body': None}
+        view_class = getattr(match.func, 'cls', None)
+        if not isinstance(view_class, type) or \
+                not issubclass(view_class, APIView):
+            return {'status': status.HTTP_400_BAD_REQUEST,
+                    'body': {'detail': 'Only API views can be batched.'}}
+        if issubclass(view_class, type(self)):
+            return {'status': status.HTTP_400_BAD_REQUEST,
+                    'body': {'detail': 'Batches cannot be nested.'}}
+
+        try:
+            response = match.func(sub_request, *match.args, **match.kwargs)
+        except Exception as exc:
+            response = response_for_exception(sub_request, exc)
+        if hasattr(response, 'render'):
+            response.render()
+
+        body = getattr(response, 'data', None)
+        if body is None and response.content:
+            try:
+                body = json.loads(response.content.decode())
+            except ValueError:
+                body = response.content.decode(errors='replace')
+        return {'status': response.status_code, 'body': body}
+
+    def dispatch_threaded(self, sub_request):
+        try:
+            # Worker threads do not see the request's shard selection
+            with for_user(sub_request.user.pk):
+                return self.dispatch_one(sub_request)
+        finally:
+            close_old_connections()
+
+    def post(self, request, format=None):
+        specs = self.validate(request.data)
+        sub_requests = [self.build_request(request, spec) for spec in specs]
+
+        results = [None] * len(specs)
+        pending = []
+        for index, sub_request in enumerate(sub_requests):
+            if sub_request.method in READ_METHODS:
+                pending.append(index)
+                continue
+            self.run_reads(sub_requests, pending, results)
+            pending = []
+            results[index] = self.dispatch_one(sub_request)
+        self.run_reads(sub_requests, pending, results)
+
+        return Response({'responses': results})
+
+    def run_reads(self, sub_requests, indexes, results):
+        """Run independent read-only sub-requests, concurrently if allowed"""
+        if len(indexes) < 2 or settings.BATCH_MAX_WORKERS < 2:
+            for index in indexes:
+                results[index] = self.dispatch_one(sub_requests[index])
+            return
+
+        futures = [
+            (index, get_executor().submit(self.dispatch_threaded,
+                                          sub_requests[index]))
+            for index in indexes
+        ]
+        for index, future in futures:
+            results[index] = future.result()
+
+
+class ProfileView(APIView):
+    """Serve a request profile recorded by core.middleware.ProfilerMiddleware
+
+    ?output=pstats (the default) or text for cProfile profiles, collapsed
+    stacks for flamegraph.pl for sampled ones.
+    """
+    authentication_classes = (ExpiringTokenAuthentication,
+                              SignedTokenAuthentication)
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, profile_id, format=None):
+        profile = load_profile(profile_id)
+        if profile is None:
+            raise NotFound()
+
+        formats = FORMATS[profile['mode']]
+        name = request.query_params.get('output', next(iter(formats)))
+        if name not in formats:
+            raise ValidationError({'output': 'Choose one of %s.' %
+                                   ', '.join(formats)})
+        render, content_type = formats[name]
+        return HttpResponse(render(profile), content_type=content_type)
@@ -0,0 +1,16 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PreconditionFailed(APIException):
+    """Raised when a write is made against an outdated version"""
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The recipe was changed by another request.'
+    default_code = 'precondition_failed'
+
+
+class PreconditionRequired(APIException):
+    """Raised when a write does not say which version it replaces"""
+    status_code = status.HTTP_428_PRECONDITION_REQUIRED
+    default_detail = 'Send the ETag of the recipe in If-Match.'
+    default_code = 'precondition_required'
@@ -0,0 +1,218 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from core.data_version import get_data_version
+from core.models import Recipe
+
+
+# Number of set bits in each byte value
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+class Relation:
+    """Recipe to tag or ingredient membership in both directions
+
+    Both directions are stored as CSR style sorted int32 arrays: the
+    members of recipe i are `members[member_ptr[i]:member_ptr[i + 1]]` and
+    the recipes holding member j are `postings[posting_ptr[j]:...]`, where
+    recipes and members are numbered by their position in the index.
+    """
+
+    def __init__(self, pairs, recipe_count):
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        self.member_ids, member_pos = np.unique(pairs[:, 1],
+                                                return_inverse=True)
+        recipe_pos = pairs[:, 0]
+
+        order = np.lexsort((member_pos, recipe_pos))
+        self.members = member_pos[order].astype(np.int32)
+        self.member_ptr = np.zeros(recipe_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(recipe_pos, minlength=recipe_count),
+                  out=self.member_ptr[1:])
+
+        order = np.lexsort((recipe_pos, member_pos))
+        self.postings = recipe_pos[order].astype(np.int32)
+        self.posting_ptr = np.zeros(len(self.member_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(member_pos, minlength=len(self.member_ids)),
+                  out=self.posting_ptr[1:])
+
+        self.sizes = np.diff(self.member_ptr)
+
+    def members_of(self, position):
+        return self.members[
+            self.member_ptr[position]:self.member_ptr[position + 1]
+        ]
+
+    def jaccard(self, position):
+        """Return the Jaccard similarity of every recipe to one recipe"""
+        members = self.members_of(position)
+        if not len(members):
+            return np.zeros(len(self.sizes))
+        hits = np.concatenate([
+            self.postings[self.posting_ptr[m]:self.posting_ptr[m + 1]]
+            for m in members
+        ])
+        intersection = np.bincount(hits, minlength=len(self.sizes))
+        union = self.sizes + len(members) - intersection
+        return intersection / np.maximum(union, 1)
+
+
+class RecipeIndex:
+    """Inverted tag and ingredient index over one user's recipes"""
+
+    def __init__(self, recipe_ids, ingredient_pairs, tag_pairs):
+        self.recipe_ids = np.asarray(sorted(recipe_ids), dtype=np.int64)
+        self.ingredients = Relation(
+            self.positions(ingredient_pairs), len(self.recipe_ids)
+        )
+        self.tags = Relation(self.positions(tag_pairs), len(self.recipe_ids))
+        self._ingredient_bitsets = None
+
+    @classmethod
+    def for_user(cls, user_id):
+        """Build the index for a user in three queries
+
+        The queries need not see one snapshot, pairs of recipes created
+        after the first one are left out by positions().
+        """
+        recipe_ids = Recipe.objects.filter(
+            user_id=user_id
+        ).values_list('pk', flat=True)
+        ingredient_pairs = Recipe.ingredients.through.objects.filter(
+            recipe__user_id=user_id
+        ).values_list('recipe_id', 'ingredient_id')
+        tag_pairs = Recipe.tags.through.objects.filter(
+            recipe__user_id=user_id
+        ).values_list('recipe_id', 'tag_id')
+        return cls(list(recipe_ids), list(ingredient_pairs), list(tag_pairs))
+
+    def positions(self, pairs):
+        """Replace recipe ids by their position in the index
+
+        Pairs of recipes that are not in the index are dropped.
+        """
+        if not len(pairs):
+            return []
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        pairs = pairs[np.isin(pairs[:, 0], self.recipe_ids)]
+        pairs[:, 0] = np.searchsorted(self.recipe_ids, pairs[:, 0])
+        return pairs
+
+    @property
+    def ingredient_bitsets(self):
+        """Each recipe's ingredients as a packed bit row, built on first use
+
+        Bit j of row i is set when recipe i uses the ingredient at position
+        j of `ingredients.member_ids`, in np.packbits order. The bits are
+        set straight from the CSR arrays, without a dense bool matrix.
+        """
+        if self._ingredient_bitsets is None:
+            relation = self.ingredients
+            bitsets = np.zeros(
+                (len(self.recipe_ids), (len(relation.member_ids) + 7) // 8),
+                dtype=np.uint8
+            )
+            rows = np.repeat(np.arange(len(self.recipe_ids)), relation.sizes)
+            np.bitwise_or.at(
+                bitsets, (rows, relation.members >> 3),
+                (0x80 >> (relation.members & 7)).astype(np.uint8)
+            )
+            self._ingredient_bitsets = bitsets
+        return self._ingredient_bitsets
+
+    def pantry(self, ingredient_ids, max_missing=0, limit=20):
+        """Return recipes cookable from a pantry, best coverage first
+
+        Each result is (recipe_id, coverage, missing_ingredient_ids) for a
+        recipe missing at most max_missing of its ingredients. Matching is
+        an AND and popcount of the recipe bitsets with the pantry bitset.
+        """
+        relation = self.ingredients
+        pantry = np.zeros(len(relation.member_ids), dtype=bool)
+        pantry[np.isin(relation.member_ids, list(ingredient_ids))] = True
+        pantry = np.packbits(pantry)
+
+        bitsets = self.ingredient_bitsets
+        have = POPCOUNT[bitsets & pantry].sum(axis=1, dtype=np.int64)
+        missing = relation.sizes - have
+
+        candidates = np.flatnonzero((relation.sizes > 0) &
+                                    (missing <= max_missing))
+        coverage = have[candidates] / relation.sizes[candidates]
+        ranked = candidates[np.lexsort((
+            self.recipe_ids[candidates], missing[candidates], -coverage
+        ))][:limit]
+
+        results = []
+        for position in ranked:
+            members = relation.member_ids[relation.members_of(position)]
+            results.append((
+                int(self.recipe_ids[position]),
+                float(have[position] / relation.sizes[position]),
+                [int(m) for m in members if m not in ingredient_ids],
+            ))
+        return results
+
+    def position(self, recipe_id):
+        position = np.searchsorted(self.recipe_ids, recipe_id)
+        if position == len(self.recipe_ids) or \
+                self.recipe_ids[position] != recipe_id:
+            raise KeyError(recipe_id)
+        return position
+
+    def similar(self, recipe_id, limit=10, ingredient_weight=0.7,
+                tag_weight=0.3):
+        """Return up to limit (recipe_id, score) pairs, most similar first
+
+        The score is the weighted mean of the Jaccard similarity of the
+        ingredient sets and of the tag sets, leaving out a relation the
+        recipe has no members in.
+        """
+        position = self.position(recipe_id)
+        scores = np.zeros(len(self.recipe_ids))
+        total_weight = 0
+        for relation, weight in ((self.ingredients, ingredient_weight),
+                                 (self.tags, tag_weight)):
+            if len(relation.members_of(position)):
+                scores += weight * relation.jaccard(position)
+                total_weight += weight
+        if total_weight:
+            scores /= total_weight
+        scores[position] = 0
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > limit:
+            candidates = candidates[
+                np.argpartition(-scores[candidates], limit - 1)[:limit]
+            ]
+        ranked = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(int(self.recipe_ids[i]), float(scores[i])) for i in ranked]
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_index(user_id):
+    """Return the user's index, rebuilding it when their data changed
+
+    Indexes are kept per process for the RECIPE_INDEX_CACHE_SIZE most
+    recently used users and checked against the user's data version.
+    """
+    version = get_data_version(user_id)
+    with _indexes_lock:
+        entry = _indexes.get(user_id)
+        if entry is not None and entry[0] == version:
+            _indexes.move_to_end(user_id)
+            return entry[1]
+
+    index = RecipeIndex.for_user(user_id)
+    with _indexes_lock:
+        _indexes[user_id] = (version, index)
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > settings.RECIPE_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,205 @@
+import atexit
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import connections, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from core.models import Recipe, RecipeReadModel
+
+
+def write_counts(using, counts):
+    """Add counts, {recipe id: views}, to the recipes on database using
+
+    Each batch of recipes is updated with one UPDATE on the recipe table
+    and one on the read model, adding a CASE over the recipe ids.
+    """
+    items = sorted(counts.items())
+    size = settings.POPULARITY_FLUSH_BATCH_SIZE
+    with transaction.atomic(using=using):
+        for start in range(0, len(items), size):
+            batch = items[start:start + size]
+            increment = Case(
+                *[When(pk=pk, then=Value(count)) for pk, count in batch],
+                default=Value(0), output_field=IntegerField()
+            )
+            ids = [pk for pk, _ in batch]
+            for model in (Recipe, RecipeReadModel):
+                model._base_manager.using(using).filter(pk__in=ids).update(
+                    popularity=F('popularity') + increment
+                )
+
+
+class PopularityCounter:
+    """Buffer recipe views in memory and write them behind
+
+    Views are summed per recipe and written every
+    POPULARITY_FLUSH_INTERVAL seconds by a background thread, so a
+    popular recipe costs one UPDATE per interval instead of one per view
+    and requests never wait for, or fail with, a flush. Counts that
+    cannot be written are put back for the next flush and counted in
+    flush_errors.
+
+    With POPULARITY_CACHE_ALIAS set, workers publish their counts to that
+    cache instead, one entry per worker and interval. Whichever worker
+    first finds an interval closed sums the entries of every worker and
+    writes them in one batch. Intervals nobody flushes before their
+    entries expire are lost, which only loses a few views.
+    """
+    timer = time.time
+
+    def __init__(self):
+        self.interval = settings.POPULARITY_FLUSH_INTERVAL
+        alias = settings.POPULARITY_CACHE_ALIAS
+        self.cache = caches[alias] if alias else None
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.flush_errors = 0
+        self.stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self.lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, daemon=True,
+                                                name='popularity')
+                self._thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.flush()
+            finally:
+                # The thread's connections would otherwise stay open
+                connections.close_all()
+
+    def increment(self, using, recipe_id, count=1):
+        """Count views of a recipe on database using"""
+        with self.lock:
+            self.counts[using, recipe_id] += count
+
+    def take(self):
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+        return counts
+
+    def restore(self, counts):
+        """Put counts that could not be written back in the buffer"""
+        if not counts:
+            return
+        with self.lock:
+            self.counts.update(counts)
+            self.flush_errors += 1
+
+    def flush(self):
+        """Write or publish the buffered counts"""
+        counts = self.take()
+        if self.cache is None:
+            self.restore(self.write(counts))
+            return
+        try:
+            self.publish(counts)
+        except Exception:
+            self.restore(counts)
+        try:
+            self.flush_shared()
+        except Exception:
+            with self.lock:
+                self.flush_errors += 1
+
+    def write(self, counts):
+        """Write counts, return those of the databases that failed"""
+        by_database = {}
+        for (using, recipe_id), count in counts.items():
+            by_database.setdefault(using, {})[recipe_id] = count
+        failed = Counter()
+        for using, recipe_counts in by_database.items():
+            try:
+                write_counts(using, recipe_counts)
+            except Exception:
+                failed.update({(using, recipe_id): count
+                               for recipe_id, count in recipe_counts.items()})
+        return failed
+
+    def window(self):
+        return int(self.timer() // self.interval)
+
+    def _key(self, window, name):
+        return 'popularity:%d:%s' % (window, name)
+
+    def publish(self, counts):
+        """Add counts to the shared entries of the current interval"""
+        if not counts:
+            return
+        window = self.window()
+        timeout = int(self.interval * 10)
+        slots = self._key(window, 'slots')
+        self.cache.add(slots, 0, timeout)
+        try:
+            slot = self.cache.incr(slots)
+        except ValueError:
+            # The key expired between add and incr
+            self.cache.add(slots, 1, timeout)
+            slot = 1
+        self.cache.set(self._key(window, slot), dict(counts), timeout)
+
+    def flush_shared(self):
+        """Write the intervals that have closed and nobody wrote yet
+
+        An interval is written once the one after it has ended too, so
+        workers that published late in it are included. Counts that
+        cannot be written are published again by this worker.
+        """
+        current = self.window()
+        for window in range(current - 5, current - 1):
+            slots = self.cache.get(self._key(window, 'slots'))
+            if not slots:
+                continue
+            if not self.cache.add(self._key(window, 'flushed'), True,
+                                  int(self.interval * 10)):
+                continue
+            entries = self.cache.get_many([self._key(window, slot)
+                                           for slot in range(1, slots + 1)])
+            total = Counter()
+            for counts in entries.values():
+                total.update(counts)
+            self.restore(self.write(total))
+
+
+_counter = None
+_counter_lock = threading.Lock()
+
+
+def get_counter():
+    """Return the popularity counter of this process"""
+    global _counter
+    with _counter_lock:
+        if _counter is None:
+            _counter = PopularityCounter()
+            _counter.start()
+            atexit.register(_counter.flush)
+    return _counter
+
+
+def reset_counter(**kwargs):
+    global _counter
+    if kwargs.get('setting', 'POPULARITY_').startswith('POPULARITY_'):
+        with _counter_lock:
+            if _counter is not None:
+                _counter.stop()
+            _counter = None
+
+
+setting_changed.connect(reset_counter)
+
+
+def record_view(using, recipe_id):
+    """Count one view of a recipe"""
+    get_counter().increment(using, recipe_id)
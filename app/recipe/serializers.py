@@ -1,5 +1,11 @@
+from django.db import router, transaction
+
 from rest_framework import serializers
-from core.models import Tag, Ingredient, Recipe
+from rest_framework.relations import MANY_RELATION_KWARGS
+from core.models import Tag, Ingredient, Recipe, RecipeReadModel
+from core.signals import recipes_changed
+
+from recipe.exceptions import PreconditionFailed
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -20,26 +26,226 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_Fields = ('id',)
 
 
+class UserOwnedManyRelatedField(serializers.ManyRelatedField):
+    """List of primary keys resolved with a single query
+
+    Every id is looked up at once and all the missing ones are reported
+    together. The objects are returned in the submitted order, without
+    duplicates.
+    """
+    default_error_messages = {
+        'does_not_exist': 'Invalid pks {pk_values} - objects do not exist.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        pks = []
+        for item in data:
+            if isinstance(item, bool):
+                self.child_relation.fail('incorrect_type',
+                                         data_type=type(item).__name__)
+            try:
+                pks.append(int(item))
+            except (TypeError, ValueError):
+                self.child_relation.fail('incorrect_type',
+                                         data_type=type(item).__name__)
+        pks = list(dict.fromkeys(pks))
+
+        objects = self.child_relation.get_queryset().in_bulk(pks)
+        missing = [pk for pk in pks if pk not in objects]
+        if missing:
+            self.fail('does_not_exist', pk_values=missing)
+        return [objects[pk] for pk in pks]
+
+
+class UserOwnedRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key of an object owned by the requesting user"""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return UserOwnedManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        request = self.context.get('request')
+        if request is None:
+            return self.queryset.none()
+        return self.queryset.filter(user=request.user)
+
+
+# Many-to-many recipe fields and the through table column of each
+LINK_FIELDS = {'ingredients': 'ingredient', 'tags': 'tag'}
+
+
+def change_links(recipe, field, add=(), remove=()):
+    """Insert and delete only the through rows of field that change
+
+    Sends no m2m_changed signals, the caller refreshes the recipe once.
+    Returns whether anything changed.
+    """
+    through = getattr(Recipe, field).through
+    related = through._meta.get_field(LINK_FIELDS[field]).attname
+    links = through._base_manager.db_manager(
+        router.db_for_write(Recipe, instance=recipe)
+    ).filter(recipe_id=recipe.pk)
+
+    deleted = 0
+    if remove:
+        deleted, _ = links.filter(**{related + '__in': remove}).delete()
+    if add:
+        existing = set(links.filter(
+            **{related + '__in': add}
+        ).values_list(related, flat=True))
+        add = [pk for pk in add if pk not in existing]
+        links.bulk_create([
+            through(recipe_id=recipe.pk, **{related: pk}) for pk in add
+        ])
+    return bool(deleted or add)
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Serializer for the recipe objects"""
-    ingredients = serializers.PrimaryKeyRelatedField(
+    ingredients = UserOwnedRelatedField(
         many=True,
         queryset=Ingredient.objects.all()
     )
+    ingredients_add = UserOwnedRelatedField(
+        many=True, write_only=True, required=False,
+        queryset=Ingredient.objects.all()
+    )
+    ingredients_remove = UserOwnedRelatedField(
+        many=True, write_only=True, required=False,
+        queryset=Ingredient.objects.all()
+    )
 
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = UserOwnedRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
+    tags_add = UserOwnedRelatedField(
+        many=True, write_only=True, required=False,
+        queryset=Tag.objects.all()
+    )
+    tags_remove = UserOwnedRelatedField(
+        many=True, write_only=True, required=False,
+        queryset=Tag.objects.all()
+    )
 
     class Meta:
         model = Recipe
         fields = ('id', 'title', 'time_minutes', 'price',
-                  'link', 'ingredients', 'tags')
-        read_only_fields = ('id',)
+                  'link', 'ingredients', 'tags', 'version', 'popularity',
+                  'ingredients_add', 'ingredients_remove',
+                  'tags_add', 'tags_remove')
+        read_only_fields = ('id', 'version', 'popularity')
+
+    def validate(self, attrs):
+        """Check that each relation is either replaced or changed by delta
+
+        `<field>_add` and `<field>_remove` are only accepted on updates and
+        are dropped from attrs when empty.
+        """
+        for field in LINK_FIELDS:
+            for key in (field + '_add', field + '_remove'):
+                if not attrs.get(key, True):
+                    del attrs[key]
+            delta = {pk for key in (field + '_add', field + '_remove')
+                     for pk in attrs.get(key, ())}
+            if not delta:
+                continue
+            if self.instance is None:
+                raise serializers.ValidationError(
+                    {field: 'Use %s to set it on create.' % field}
+                )
+            if field in attrs:
+                raise serializers.ValidationError(
+                    {field: 'Send either %s or %s_add/%s_remove.' %
+                     (field, field, field)}
+                )
+            if set(attrs.get(field + '_add', ())) & \
+                    set(attrs.get(field + '_remove', ())):
+                raise serializers.ValidationError(
+                    {field: 'An id cannot be both added and removed.'}
+                )
+        return attrs
+
+    def update(self, instance, validated_data):
+        """Update the recipe unless it changed since expected_version
+
+        expected_version is passed to save() by the view, it defaults to
+        the version the instance was loaded with. Only the changed columns
+        are written, in the same UPDATE that claims the version, and only
+        the through rows that change are inserted or deleted.
+        """
+        expected_version = validated_data.pop('expected_version',
+                                              instance.version)
+        links = {}
+        for field in LINK_FIELDS:
+            add = [o.pk for o in validated_data.pop(field + '_add', ())]
+            remove = [o.pk for o in validated_data.pop(field + '_remove', ())]
+            if field in validated_data:
+                links[field] = {o.pk for o in validated_data.pop(field)}
+            elif add or remove:
+                links[field] = (add, remove)
+
+        update_fields = []
+        for attr, value in validated_data.items():
+            if getattr(instance, attr) != value:
+                setattr(instance, attr, value)
+                update_fields.append(attr)
+
+        using = router.db_for_write(Recipe, instance=instance)
+        with transaction.atomic(using=using):
+            if not instance.claim_version(expected_version, update_fields):
+                raise PreconditionFailed()
+            for field, change in links.items():
+                if isinstance(change, set):
+                    current = set(getattr(instance, field).values_list(
+                        'pk', flat=True
+                    ))
+                    change = (change - current, current - change)
+                change_links(instance, field, *change)
+            recipes_changed(instance.user_id, [instance.pk], using)
+        return instance
 
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for the recipe detail"""
     ingredients = IngredientSerializer(many=True, read_only=True)
     tags = TagSerializer(many=True, read_only=True)
+
+
+class RecipeReadSerializer(serializers.ModelSerializer):
+    """Serializer for recipes served from the read model"""
+    id = serializers.IntegerField(source='recipe_id', read_only=True)
+    ingredients = serializers.SerializerMethodField()
+    tags = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RecipeReadModel
+        fields = ('id', 'title', 'time_minutes', 'price',
+                  'link', 'ingredients', 'tags', 'version', 'popularity')
+        read_only_fields = fields
+
+    def get_ingredients(self, obj):
+        return [pk for pk, name in obj.ingredient_list()]
+
+    def get_tags(self, obj):
+        return [pk for pk, name in obj.tag_list()]
+
+
+class RecipeReadDetailSerializer(RecipeReadSerializer):
+    """Serializer for the recipe detail served from the read model"""
+
+    def get_ingredients(self, obj):
+        return [{'id': pk, 'name': name} for pk, name in obj.ingredient_list()]
+
+    def get_tags(self, obj):
+        return [{'id': pk, 'name': name} for pk, name in obj.tag_list()]
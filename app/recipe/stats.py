@@ -0,0 +1,90 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, Max, Min, Q
+
+from core.data_version import get_data_version
+from core.models import Recipe
+
+
+def _time_buckets(bounds):
+    """Return (label, filter) pairs splitting time_minutes at bounds"""
+    buckets = []
+    lower = 0
+    for upper in bounds:
+        buckets.append(('%d-%d' % (lower, upper - 1),
+                        Q(time_minutes__gte=lower, time_minutes__lt=upper)))
+        lower = upper
+    buckets.append(('%d+' % lower, Q(time_minutes__gte=lower)))
+    return buckets
+
+
+def _price(value):
+    if value is None:
+        return None
+    return str(Decimal(str(value)).quantize(Decimal('0.01')))
+
+
+def _top(relation, field, user_id, limit):
+    """Return the most used tags or ingredients with their recipe counts"""
+    rows = relation.through.objects.filter(
+        recipe__user_id=user_id
+    ).values(
+        '%s_id' % field, '%s__name' % field
+    ).annotate(
+        count=Count('recipe_id')
+    ).order_by('-count', '%s__name' % field)[:limit]
+    return [
+        {'id': row['%s_id' % field], 'name': row['%s__name' % field],
+         'count': row['count']}
+        for row in rows
+    ]
+
+
+def compute_stats(user_id):
+    """Return statistics over the user's recipes in three queries"""
+    buckets = _time_buckets(settings.RECIPE_STATS_TIME_BUCKETS)
+    aggregates = {
+        'count': Count('id'),
+        'average_price': Avg('price'),
+        'min_price': Min('price'),
+        'max_price': Max('price'),
+        'average_time_minutes': Avg('time_minutes'),
+    }
+    for index, (label, condition) in enumerate(buckets):
+        aggregates['bucket_%d' % index] = Count('id', filter=condition)
+    totals = Recipe.objects.filter(user_id=user_id).aggregate(**aggregates)
+
+    average_time = totals['average_time_minutes']
+    limit = settings.RECIPE_STATS_TOP
+    return {
+        'count': totals['count'],
+        'average_price': _price(totals['average_price']),
+        'min_price': _price(totals['min_price']),
+        'max_price': _price(totals['max_price']),
+        'average_time_minutes': (round(average_time, 1)
+                                 if average_time is not None else None),
+        'time_histogram': [
+            {'minutes': label, 'count': totals['bucket_%d' % index]}
+            for index, (label, condition) in enumerate(buckets)
+        ],
+        'top_tags': _top(Recipe.tags, 'tag', user_id, limit),
+        'top_ingredients': _top(Recipe.ingredients, 'ingredient', user_id,
+                                limit),
+    }
+
+
+def get_stats(user_id):
+    """Return the user's statistics, cached until their data changes
+
+    Entries are keyed by the user's data version, which every process
+    reads from the database, so no process serves statistics from before
+    another process's edit. The cache itself can be per process.
+    """
+    key = 'recipe-stats:%s:%s' % (user_id, get_data_version(user_id))
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_stats(user_id)
+        cache.set(key, stats, settings.RECIPE_STATS_CACHE_TIMEOUT)
+    return stats
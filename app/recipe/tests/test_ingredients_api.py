@@ -6,6 +6,7 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Ingredient, Recipe
+from core.tests.factories import create_user
 
 from recipe.serializers import IngredientSerializer
 
@@ -28,12 +29,12 @@ class PublicIngredientsAPITest(TestCase):
 class PrivateIngredientsAPITest(TestCase):
     """Testing the ingredients authorized API"""
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(password='password123')
+
     def setUp(self):
         self.client = APIClient()
-        self.user = get_user_model().objects.create_user(
-            'test@admin.com',
-            'password123'
-        )
         self.client.force_authenticate(self.user)
 
     def test_retrieve_ingredients_list(self):
@@ -135,3 +136,19 @@ class PrivateIngredientsAPITest(TestCase):
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_merge_ingredients(self):
+        """Test merging duplicate ingredients into one"""
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        duplicate = Ingredient.objects.create(user=self.user, name='salt')
+        recipe = Recipe.objects.create(user=self.user, title='Fries',
+                                       time_minutes=5, price=2.00)
+        recipe.ingredients.add(duplicate)
+        url = reverse('recipe:ingredient-merge', args=[salt.id])
+
+        res = self.client.post(url, {'sources': [duplicate.id]},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(recipe.ingredients.all()), [salt])
+        self.assertFalse(Ingredient.objects.filter(id=duplicate.id).exists())
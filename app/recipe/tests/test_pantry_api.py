@@ -0,0 +1,97 @@
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe
+from recipe.index import RecipeIndex
+
+
+PANTRY_URL = reverse('recipe:recipe-pantry')
+
+
+def sample_recipe(user, title, ingredients=()):
+    """Create and return a recipe with the given ingredients"""
+    recipe = Recipe.objects.create(user=user, title=title, time_minutes=10,
+                                   price=5.00)
+    recipe.ingredients.add(*ingredients)
+    return recipe
+
+
+class PantryIndexTests(TestCase):
+
+    def setUp(self):
+        # Recipe 4 has no ingredients and never matches
+        self.index = RecipeIndex(
+            [1, 2, 3, 4],
+            [(1, 10), (1, 11), (2, 10), (3, 10), (3, 11), (3, 12)],
+            [],
+        )
+
+    def test_subset_of_pantry(self):
+        """Test that only fully covered recipes match by default"""
+        self.assertEqual(self.index.pantry({10, 11}),
+                         [(1, 1.0, []), (2, 1.0, [])])
+
+    def test_missing_at_most_k(self):
+        """Test that recipes missing up to K ingredients are ranked last"""
+        matches = self.index.pantry({10, 11}, max_missing=1)
+
+        self.assertEqual(matches[-1][0], 3)
+        self.assertAlmostEqual(matches[-1][1], 2 / 3)
+        self.assertEqual(matches[-1][2], [12])
+
+    def test_many_ingredients(self):
+        """Test bitsets spanning several bytes"""
+        pairs = [(1, i) for i in range(100, 120)]
+        index = RecipeIndex([1], pairs, [])
+
+        self.assertEqual(index.pantry(set(range(100, 119))), [])
+        self.assertEqual(index.pantry(set(range(100, 120)))[0][0], 1)
+
+    def test_bitsets_match_packed_rows(self):
+        """Test that the bitsets are the packed rows of the recipe matrix"""
+        dense = np.zeros((4, 3), dtype=bool)
+        dense[[0, 0, 1, 2, 2, 2], [0, 1, 0, 0, 1, 2]] = True
+
+        np.testing.assert_array_equal(self.index.ingredient_bitsets,
+                                      np.packbits(dense, axis=1))
+
+
+class PantryApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@admin.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_pantry_matching(self):
+        """Test matching recipes against the user's pantry"""
+        rice = Ingredient.objects.create(user=self.user, name='Rice')
+        egg = Ingredient.objects.create(user=self.user, name='Egg')
+        fish = Ingredient.objects.create(user=self.user, name='Fish')
+        fried_rice = sample_recipe(self.user, 'Fried rice', [rice, egg])
+        sushi = sample_recipe(self.user, 'Sushi', [rice, fish])
+
+        res = self.client.get(PANTRY_URL, {
+            'ingredients': f'{rice.id},{egg.id}',
+            'max_missing': 1,
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['recipe']['id'] for r in res.data],
+                         [fried_rice.id, sushi.id])
+        self.assertEqual(res.data[0]['coverage'], 1.0)
+        self.assertEqual(res.data[1]['missing'], [fish.id])
+
+    def test_invalid_pantry(self):
+        """Test that a missing or invalid pantry is rejected"""
+        res = self.client.get(PANTRY_URL, {'ingredients': 'rice'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,150 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, RecipeReadModel
+from core.tests.factories import create_recipes, create_user
+from recipe.popularity import PopularityCounter, get_counter
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class Clock:
+    """Timer for counters that only moves when told to"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+# Keeps the background flush out of the way, the tests flush themselves
+@override_settings(POPULARITY_FLUSH_INTERVAL=3600)
+class PopularityTests(TestCase):
+    """Test write-behind recipe popularity counters"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+        cls.recipes = create_recipes(cls.user, 3)
+
+    def setUp(self):
+        cache.clear()
+        get_counter().take()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def popularity(self):
+        return {
+            model: dict(model.objects.values_list('pk', 'popularity'))
+            for model in (Recipe, RecipeReadModel)
+        }
+
+    def test_views_buffered_then_flushed(self):
+        """Test that views are written behind, both tables at once"""
+        first, second, third = self.recipes
+        for recipe in (second, second, third):
+            res = self.client.get(detail_url(recipe.id))
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(set(Recipe.objects.values_list('popularity',
+                                                        flat=True)), {0})
+
+        get_counter().flush()
+
+        expected = {first.id: 0, second.id: 2, third.id: 1}
+        self.assertEqual(self.popularity(),
+                         {Recipe: expected, RecipeReadModel: expected})
+
+    def test_flush_is_one_update_per_table(self):
+        """Test that a flush writes every recipe with one UPDATE per table"""
+        counter = get_counter()
+        for count, recipe in enumerate(self.recipes, 1):
+            counter.increment(DEFAULT_DB_ALIAS, recipe.id, count)
+
+        with CaptureQueriesContext(connection) as queries:
+            counter.flush()
+
+        updates = [q['sql'] for q in queries.captured_queries
+                   if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        self.assertIn('CASE', updates[0])
+
+    def test_failed_flush_requeued(self):
+        """Test that counts a flush could not write are kept for the next"""
+        first = self.recipes[0]
+        counter = get_counter()
+        counter.increment(DEFAULT_DB_ALIAS, first.id, 2)
+
+        with patch('recipe.popularity.write_counts',
+                   side_effect=DatabaseError):
+            counter.flush()
+        counter.increment(DEFAULT_DB_ALIAS, first.id)
+        counter.flush()
+
+        self.assertEqual(counter.flush_errors, 1)
+        self.assertEqual(self.popularity()[Recipe][first.id], 3)
+
+    def test_order_by_popularity(self):
+        """Test listing recipes from the most to the least opened"""
+        first, second, third = self.recipes
+        counter = get_counter()
+        counter.increment(DEFAULT_DB_ALIAS, second.id, 5)
+        counter.increment(DEFAULT_DB_ALIAS, first.id, 2)
+        counter.flush()
+
+        res = self.client.get(RECIPES_URL, {'ordering': '-popularity'})
+
+        self.assertEqual([r['id'] for r in res.data],
+                         [second.id, first.id, third.id])
+        self.assertEqual(res.data[0]['popularity'], 5)
+
+    def test_invalid_ordering(self):
+        """Test that only popularity orderings are accepted"""
+        res = self.client.get(RECIPES_URL, {'ordering': 'price'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(POPULARITY_CACHE_ALIAS='default',
+                       POPULARITY_FLUSH_INTERVAL=10)
+    def test_shared_cache_tier(self):
+        """Test that counts of several workers are summed in the cache"""
+        first, second, _ = self.recipes
+        clock = Clock()
+        workers = []
+        for _ in range(2):
+            worker = PopularityCounter()
+            worker.timer = clock
+            workers.append(worker)
+
+        for worker in workers:
+            worker.increment(DEFAULT_DB_ALIAS, first.id)
+            worker.flush()
+        workers[0].increment(DEFAULT_DB_ALIAS, second.id)
+        workers[0].flush()
+        self.assertEqual(self.popularity()[Recipe][first.id], 0)
+
+        clock.now += 20
+        with CaptureQueriesContext(connection) as queries:
+            workers[1].flush()
+        workers[0].flush()
+
+        updates = [q for q in queries.captured_queries
+                   if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        popularity = self.popularity()[RecipeReadModel]
+        self.assertEqual((popularity[first.id], popularity[second.id]),
+                         (2, 1))
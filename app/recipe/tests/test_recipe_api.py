@@ -1,4 +1,6 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
@@ -6,6 +8,8 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Recipe, Ingredient, Tag
+from core.tests.factories import create_ingredients, create_recipes, \
+    create_tags, create_user
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 
@@ -56,12 +60,12 @@ class PublicRecipeApiTest(TestCase):
 class PrivateRecipeApiTest(TestCase):
     """Test the authenticated recipe API access """
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+
     def setUp(self):
         self.client = APIClient()
-        self.user = get_user_model().objects.create_user(
-            'test@admin.com',
-            'testpass'
-        )
         self.client.force_authenticate(self.user)
 
     def test_retrieve_recipe(self):
@@ -77,6 +81,19 @@ class PrivateRecipeApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    def test_list_recipes_single_query(self):
+        """Test that listing recipes with relations takes one query"""
+        create_recipes(self.user, 3,
+                       tags=create_tags(self.user, 'Vegan', 'Dinner'),
+                       ingredients=create_ingredients(self.user, 'Rice'))
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL)
+
+        recipes = Recipe.objects.all().order_by('-id')
+        serializer = RecipeSerializer(recipes, many=True)
+        self.assertEqual(res.data, serializer.data)
+
     def test_recipes_limited_to_user(self):
         """Test retriving recipes by user only"""
 
@@ -188,7 +205,7 @@ class PrivateRecipeApiTest(TestCase):
 
         url = detail_url(recipe.id)
 
-        self.client.patch(url, payload)
+        self.client.patch(url, payload, HTTP_IF_MATCH='"1"')
 
         recipe.refresh_from_db()
 
@@ -209,7 +226,7 @@ class PrivateRecipeApiTest(TestCase):
         }
 
         url = detail_url(recipe.id)
-        self.client.put(url, payload)
+        self.client.put(url, payload, HTTP_IF_MATCH='"1"')
 
         recipe.refresh_from_db()
 
@@ -271,3 +288,198 @@ class PrivateRecipeApiTest(TestCase):
         self.assertIn(serializer1.data, res.data)
         self.assertIn(serializer2.data, res.data)
         self.assertNotIn(serializer3.data, res.data)
+
+    def test_multi_get_recipe_details(self):
+        """Test fetching many recipe details in the requested order"""
+        recipe1 = sample_recipe(user=self.user, title='Curry')
+        recipe2 = sample_recipe(user=self.user, title='Rice')
+        recipe1.tags.add(sample_tag(user=self.user))
+        recipe2.ingredients.add(sample_ingredient(user=self.user))
+        sample_recipe(user=self.user, title='Pasta')
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, {
+                'ids': f'{recipe2.id},{recipe1.id}',
+                'detail': 1
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            RecipeDetailSerializer(recipe2).data,
+            RecipeDetailSerializer(recipe1).data,
+        ])
+
+    def test_list_detail_flag_parsing(self):
+        """Test that ?detail accepts boolean words and rejects the rest"""
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(sample_tag(user=self.user))
+
+        res = self.client.get(RECIPES_URL, {'detail': 'true'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['tags'][0]['name'], 'sample tag')
+
+        res = self.client.get(RECIPES_URL, {'detail': 'maybe'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_multi_get_limited_to_user(self):
+        """Test that other users' recipes are not returned by id"""
+        user2 = get_user_model().objects.create_user(
+            'test2@admin.com',
+            'testpass'
+        )
+        recipe = sample_recipe(user=self.user)
+        other = sample_recipe(user=user2)
+
+        res = self.client.get(RECIPES_URL, {'ids': f'{other.id},{recipe.id}'})
+
+        self.assertEqual(res.data, [RecipeSerializer(recipe).data])
+
+    @override_settings(RECIPE_MULTI_GET_MAX=2)
+    def test_multi_get_max_batch_size(self):
+        """Test that too many ids are rejected"""
+        res = self.client.get(RECIPES_URL, {'ids': '1,2,3'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_bumps_version_and_etag(self):
+        """Test that an update returns the new version as its ETag"""
+        recipe = sample_recipe(user=self.user)
+        url = detail_url(recipe.id)
+
+        res = self.client.get(url)
+        self.assertEqual(res['ETag'], '"1"')
+
+        res = self.client.patch(url, {'title': 'Soup'}, HTTP_IF_MATCH='"1"')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['version'], 2)
+        self.assertEqual(res['ETag'], '"2"')
+        self.assertEqual(self.client.get(url).data['version'], 2)
+
+    def test_update_without_if_match_rejected(self):
+        """Test that an update must name the version it replaces"""
+        recipe = sample_recipe(user=self.user)
+
+        res = self.client.patch(detail_url(recipe.id), {'title': 'Soup'})
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_428_PRECONDITION_REQUIRED)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Sample recipe')
+
+    def test_update_stale_if_match_rejected(self):
+        """Test that an update against an old version answers 412"""
+        recipe = sample_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        self.client.patch(url, {'title': 'Soup'}, HTTP_IF_MATCH='"1"')
+
+        res = self.client.patch(url, {'title': 'Stew'},
+                                HTTP_IF_MATCH='W/"1"')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_412_PRECONDITION_FAILED)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Soup')
+        self.assertEqual(recipe.version, 2)
+
+    def test_concurrent_update_loses(self):
+        """Test that the second of two writes to one version fails"""
+        recipe = sample_recipe(user=self.user)
+        first = Recipe.objects.get(pk=recipe.pk)
+        second = Recipe.objects.get(pk=recipe.pk)
+
+        first.title = 'Soup'
+        self.assertTrue(first.claim_version(1, ['title']))
+        second.title = 'Stew'
+        self.assertFalse(second.claim_version(1, ['title']))
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Soup')
+        self.assertEqual(recipe.version, 2)
+
+    def test_partial_update_tag_delta(self):
+        """Test adding and removing tags without resending the others"""
+        recipe = sample_recipe(user=self.user)
+        keep, drop, new = create_tags(self.user, 'Keep', 'Drop', 'New')
+        recipe.tags.add(keep, drop)
+
+        res = self.client.patch(detail_url(recipe.id), {
+            'tags_add': [new.id, keep.id],
+            'tags_remove': [drop.id],
+        }, HTTP_IF_MATCH='"1"')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(res.data['tags']), sorted([keep.id, new.id]))
+        self.assertEqual(set(recipe.tags.all()), {keep, new})
+        self.assertEqual(
+            sorted(self.client.get(detail_url(recipe.id)).data['tags'],
+                   key=lambda tag: tag['id']),
+            [{'id': keep.id, 'name': keep.name},
+             {'id': new.id, 'name': new.name}],
+        )
+
+    def test_partial_update_tags_and_delta_rejected(self):
+        """Test that tags cannot be replaced and changed in one request"""
+        recipe = sample_recipe(user=self.user)
+        tag = sample_tag(user=self.user)
+
+        res = self.client.patch(detail_url(recipe.id), {
+            'tags': [tag.id], 'tags_add': [tag.id],
+        }, HTTP_IF_MATCH='"1"')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_partial_update_writes_changed_columns(self):
+        """Test that a patch writes only its changed columns in one UPDATE"""
+        recipe = sample_recipe(user=self.user)
+        tag = sample_tag(user=self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(detail_url(recipe.id), {
+                'title': 'Soup', 'time_minutes': recipe.time_minutes,
+                'tags_add': [tag.id],
+            }, HTTP_IF_MATCH='"1"')
+
+        updates = [q['sql'] for q in queries.captured_queries
+                   if q['sql'].startswith('UPDATE "core_recipe"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"title"', updates[0])
+        self.assertNotIn('"time_minutes"', updates[0])
+        self.assertNotIn('"price"', updates[0])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Soup')
+        self.assertEqual(list(recipe.tags.all()), [tag])
+
+    def test_create_recipe_other_users_tag_rejected(self):
+        """Test that tags of other users cannot be attached to a recipe"""
+        user2 = get_user_model().objects.create_user('other@admin.com',
+                                                     'testpass')
+        other = sample_tag(user=user2)
+        tag = sample_tag(user=self.user)
+
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Soup', 'time_minutes': 10, 'price': 5.00,
+            'tags': [tag.id, other.id, 0],
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str([other.id, 0]), res.data['tags'][0])
+        self.assertFalse(Recipe.objects.filter(title='Soup').exists())
+
+    def test_related_ids_validated_in_one_query(self):
+        """Test that a list of tag ids is looked up with a single query"""
+        recipe = sample_recipe(user=self.user)
+        tags = create_tags(self.user, 'One', 'Two', 'Three')
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(detail_url(recipe.id), {
+                'tags': [tag.id for tag in tags],
+            }, HTTP_IF_MATCH='"1"')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        lookups = [q['sql'] for q in queries.captured_queries
+                   if q['sql'].startswith('SELECT') and
+                   'FROM "core_tag"' in q['sql'] and
+                   '"core_tag"."id" IN' in q['sql']]
+        self.assertEqual(len(lookups), 1)
+        self.assertIn('"core_tag"."user_id"', lookups[0])
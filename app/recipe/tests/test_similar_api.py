@@ -0,0 +1,114 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+from recipe.index import RecipeIndex
+
+
+def similar_url(recipe_id):
+    """Return the similar recipes URL"""
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
+def sample_recipe(user, title, ingredients=(), tags=()):
+    """Create and return a recipe with the given relations"""
+    recipe = Recipe.objects.create(user=user, title=title, time_minutes=10,
+                                   price=5.00)
+    recipe.ingredients.add(*ingredients)
+    recipe.tags.add(*tags)
+    return recipe
+
+
+class RecipeIndexTests(TestCase):
+
+    def test_weighted_jaccard(self):
+        """Test the ranking of the index scores"""
+        index = RecipeIndex(
+            [1, 2, 3, 4],
+            [(1, 10), (1, 11), (2, 10), (2, 11), (3, 10), (3, 12)],
+            [(1, 20), (3, 20)],
+        )
+
+        ranked = index.similar(1, ingredient_weight=1, tag_weight=1)
+
+        # 2: ingredients 2/2, tags 0/1 -> 0.5; 3: 1/3 and 1/1 -> 0.667
+        self.assertEqual([pk for pk, score in ranked], [3, 2])
+        self.assertAlmostEqual(ranked[0][1], (1 / 3 + 1) / 2)
+        self.assertAlmostEqual(ranked[1][1], 0.5)
+
+    def test_limit(self):
+        """Test that only the best matches are returned"""
+        index = RecipeIndex([1, 2, 3], [(1, 10), (2, 10), (3, 10)], [])
+
+        self.assertEqual(index.similar(1, limit=1), [(2, 1.0)])
+
+    def test_pairs_of_unknown_recipes_ignored(self):
+        """Test that pairs of recipes read after the ids are left out"""
+        index = RecipeIndex([1, 2], [(1, 10), (2, 10), (5, 10), (0, 11)],
+                            [(7, 20)])
+
+        self.assertEqual(index.similar(1), [(2, 1.0)])
+        self.assertEqual(list(index.ingredients.member_ids), [10])
+
+    def test_unknown_recipe(self):
+        """Test that recipes outside the index raise KeyError"""
+        with self.assertRaises(KeyError):
+            RecipeIndex([1], [], []).similar(2)
+
+
+class SimilarRecipesApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@admin.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.rice = Ingredient.objects.create(user=self.user, name='Rice')
+        self.chicken = Ingredient.objects.create(user=self.user,
+                                                 name='Chicken')
+        self.curry = sample_recipe(self.user, 'Curry',
+                                   [self.rice, self.chicken])
+
+    def test_similar_recipes(self):
+        """Test that similar recipes are ranked by score"""
+        close = sample_recipe(self.user, 'Chicken rice',
+                              [self.rice, self.chicken])
+        far = sample_recipe(self.user, 'Rice pudding', [self.rice])
+        sample_recipe(self.user, 'Salad')
+
+        res = self.client.get(similar_url(self.curry.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['recipe']['id'] for r in res.data],
+                         [close.id, far.id])
+        self.assertEqual(res.data[0]['score'], 1.0)
+
+    def test_index_invalidated_on_change(self):
+        """Test that M2M changes are seen by the cached index"""
+        other = sample_recipe(self.user, 'Fried rice', [self.rice])
+        res = self.client.get(similar_url(self.curry.id))
+        self.assertEqual(res.data[0]['score'], 0.5)
+
+        other.ingredients.add(self.chicken)
+        res = self.client.get(similar_url(self.curry.id))
+        self.assertEqual(res.data[0]['score'], 1.0)
+
+        tag = Tag.objects.create(user=self.user, name='Asian')
+        self.curry.tags.add(tag)
+        res = self.client.get(similar_url(self.curry.id))
+        self.assertEqual(res.data[0]['score'], 0.7)
+
+    def test_other_users_recipe(self):
+        """Test that another user's recipe is not found"""
+        user2 = get_user_model().objects.create_user('other@admin.com', 'pw')
+        recipe = sample_recipe(user2, 'Curry', [])
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
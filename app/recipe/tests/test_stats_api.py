@@ -0,0 +1,112 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ChangeLog, Ingredient, Recipe, Tag
+from core.read_model import refresh_recipes
+from core.sync import record_changes
+
+
+STATS_URL = reverse('recipe:recipe-stats')
+
+
+def sample_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': 5.00,
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeStatsApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@admin.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_stats_require_auth(self):
+        """Test that authentication is required"""
+        res = APIClient().get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_empty_stats(self):
+        """Test statistics for a user without recipes"""
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 0)
+        self.assertIsNone(res.data['average_price'])
+        self.assertEqual(res.data['top_tags'], [])
+
+    def test_stats(self):
+        """Test aggregates, histogram and top tags and ingredients"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        dessert = Tag.objects.create(user=self.user, name='Dessert')
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        first = sample_recipe(self.user, time_minutes=10, price=4.00)
+        second = sample_recipe(self.user, time_minutes=45, price=6.00)
+        first.tags.add(vegan, dessert)
+        second.tags.add(vegan)
+        second.ingredients.add(salt)
+        other = get_user_model().objects.create_user('other@admin.com',
+                                                     'testpass')
+        sample_recipe(other, time_minutes=200, price=100.00)
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['count'], 2)
+        self.assertEqual(res.data['average_price'], '5.00')
+        self.assertEqual(res.data['max_price'], '6.00')
+        self.assertEqual(res.data['average_time_minutes'], 27.5)
+        histogram = {b['minutes']: b['count']
+                     for b in res.data['time_histogram']}
+        self.assertEqual(histogram['0-14'], 1)
+        self.assertEqual(histogram['30-59'], 1)
+        self.assertEqual(histogram['120+'], 0)
+        self.assertEqual(res.data['top_tags'], [
+            {'id': vegan.id, 'name': 'Vegan', 'count': 2},
+            {'id': dessert.id, 'name': 'Dessert', 'count': 1},
+        ])
+        self.assertEqual(res.data['top_ingredients'],
+                         [{'id': salt.id, 'name': 'Salt', 'count': 1}])
+
+    def test_stats_cached_until_data_changes(self):
+        """Test that stats are served from the cache until a recipe changes"""
+        sample_recipe(self.user)
+        self.client.get(STATS_URL)
+
+        # Only the user's data version is read
+        with self.assertNumQueries(1):
+            res = self.client.get(STATS_URL)
+        self.assertEqual(res.data['count'], 1)
+
+        sample_recipe(self.user)
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['count'], 2)
+
+    def test_stats_see_changes_made_by_other_processes(self):
+        """Test that a change made without this process's cache is seen"""
+        recipe = sample_recipe(self.user)
+        self.client.get(STATS_URL)
+
+        # As another worker would: the database changes, this cache not
+        Recipe.objects.filter(pk=recipe.pk).update(price=9)
+        refresh_recipes([recipe.pk])
+        record_changes(self.user.pk, ChangeLog.RECIPE, [recipe.pk])
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['max_price'], '9.00')
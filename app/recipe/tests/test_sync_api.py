@@ -0,0 +1,128 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe, ChangeLog
+
+
+SYNC_URL = reverse('recipe:sync')
+
+
+def sample_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {'title': 'Sample recipe', 'time_minutes': 10, 'price': 5.00}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class PublicSyncApiTests(TestCase):
+    """Test the unauthenticated sync API access"""
+
+    def test_auth_required(self):
+        """Test that authentication is required"""
+        res = APIClient().get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateSyncApiTests(TestCase):
+    """Test the authenticated sync API access"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@admin.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def changes(self, since=0, **params):
+        res = self.client.get(SYNC_URL, dict(since=since, **params))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_full_sync(self):
+        """Test that syncing from 0 returns every object"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Rice')
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(tag)
+
+        data = self.changes()
+
+        found = {(c['type'], c['id']): c for c in data['changes']}
+        self.assertEqual(found['tag', tag.id]['data']['name'], 'Vegan')
+        self.assertEqual(found['ingredient', ingredient.id]['data']['name'],
+                         'Rice')
+        self.assertEqual(found['recipe', recipe.id]['data']['tags'],
+                         [tag.id])
+        self.assertEqual(len(data['changes']), 3)
+        self.assertFalse(data['has_more'])
+
+    def test_delta_sync(self):
+        """Test that only changes after the cursor are returned"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        cursor = self.changes()['cursor']
+        tag = Tag.objects.create(user=self.user, name='Dessert')
+
+        data = self.changes(cursor)
+
+        self.assertEqual([(c['type'], c['id']) for c in data['changes']],
+                         [('tag', tag.id)])
+        self.assertEqual(self.changes(data['cursor'])['changes'], [])
+
+    def test_tombstones(self):
+        """Test that deleted objects are returned as tombstones"""
+        recipe = sample_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        cursor = self.changes()['cursor']
+        tag_id = tag.id
+
+        tag.delete()
+        data = self.changes(cursor)
+
+        found = {(c['type'], c['id']): c for c in data['changes']}
+        self.assertTrue(found['tag', tag_id]['deleted'])
+        self.assertIsNone(found['tag', tag_id]['data'])
+        # The recipe lost the tag, so it changed as well
+        self.assertEqual(found['recipe', recipe.id]['data']['tags'], [])
+
+    def test_paginated_by_sequence(self):
+        """Test that changes are paginated in sequence order"""
+        for name in ('a', 'b', 'c'):
+            Tag.objects.create(user=self.user, name=name)
+
+        first = self.changes(limit=2)
+        second = self.changes(first['cursor'], limit=2)
+
+        self.assertTrue(first['has_more'])
+        self.assertFalse(second['has_more'])
+        names = [c['data']['name']
+                 for c in first['changes'] + second['changes']]
+        self.assertEqual(names, ['a', 'b', 'c'])
+
+    def test_limited_to_user(self):
+        """Test that other users' changes are not returned"""
+        user2 = get_user_model().objects.create_user('other@admin.com', 'pw')
+        Tag.objects.create(user=user2, name='Vegan')
+
+        self.assertEqual(self.changes()['changes'], [])
+
+    def test_one_log_entry_per_object(self):
+        """Test that only the latest change of an object is kept"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        tag.name = 'Plant based'
+        tag.save()
+
+        self.assertEqual(ChangeLog.objects.filter(object_id=tag.id).count(),
+                         1)
+
+    def test_invalid_cursor(self):
+        """Test that an invalid cursor is rejected"""
+        res = self.client.get(SYNC_URL, {'since': 'abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -6,6 +6,7 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Tag, Recipe
+from core.tests.factories import create_user
 
 from recipe.serializers import TagSerializer
 
@@ -13,6 +14,11 @@ from recipe.serializers import TagSerializer
 TAGS_URL = reverse('recipe:tag-list')
 
 
+def merge_url(tag_id):
+    """Return the URL merging other tags into a tag"""
+    return reverse('recipe:tag-merge', args=[tag_id])
+
+
 class PublicTagsApiTests(TestCase):
     """Test the public available tags API"""
 
@@ -29,11 +35,11 @@ class PublicTagsApiTests(TestCase):
 class PrivateTagsApiTest(TestCase):
     """Test the authorized user tags API"""
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(password='password123')
+
     def setUp(self):
-        self.user = get_user_model().objects.create_user(
-            'test@admin.com',
-            'password123'
-        )
         self.client = APIClient()
         self.client.force_authenticate(self.user)
 
@@ -134,3 +140,64 @@ class PrivateTagsApiTest(TestCase):
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_merge_tags(self):
+        """Test merging duplicate tags into one"""
+        target = Tag.objects.create(user=self.user, name='Vegan')
+        duplicate = Tag.objects.create(user=self.user, name='vegan')
+        other = Tag.objects.create(user=self.user, name='VEGAN')
+        both = Recipe.objects.create(user=self.user, title='Salad',
+                                     time_minutes=5, price=2.00)
+        both.tags.add(target, duplicate)
+        recipes = []
+        for i in range(5):
+            recipe = Recipe.objects.create(user=self.user, title='Soup %d' % i,
+                                           time_minutes=5, price=2.00)
+            recipe.tags.add(other)
+            recipes.append(recipe)
+
+        res = self.client.post(merge_url(target.id),
+                               {'sources': [duplicate.id, other.id]},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['name'], 'Vegan')
+        self.assertFalse(Tag.objects.filter(
+            id__in=[duplicate.id, other.id]).exists())
+        self.assertEqual(list(both.tags.all()), [target])
+        for recipe in recipes:
+            self.assertEqual(list(recipe.tags.all()), [target])
+        self.assertEqual(both.read_model.tag_list(),
+                         [[target.id, 'Vegan']])
+        both.refresh_from_db()
+        self.assertEqual(both.version, 2)
+
+    def test_delete_tag_bumps_recipe_versions(self):
+        """Test that recipes losing a deleted tag move to a new version"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(user=self.user, title='Salad',
+                                       time_minutes=5, price=2.00)
+        recipe.tags.add(tag)
+
+        tag.delete()
+
+        res = self.client.patch(
+            reverse('recipe:recipe-detail', args=[recipe.id]),
+            {'title': 'Green salad'},
+            HTTP_IF_MATCH='"1"'
+        )
+        self.assertEqual(res.status_code,
+                         status.HTTP_412_PRECONDITION_FAILED)
+
+    def test_merge_tags_of_other_user(self):
+        """Test that tags of another user cannot be merged"""
+        user2 = get_user_model().objects.create_user('other@admin.com',
+                                                     'testpass')
+        target = Tag.objects.create(user=self.user, name='Vegan')
+        foreign = Tag.objects.create(user=user2, name='vegan')
+
+        res = self.client.post(merge_url(target.id),
+                               {'sources': [foreign.id]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Tag.objects.filter(id=foreign.id).exists())
@@ -1,17 +1,55 @@
+from django.conf import settings
+
 from rest_framework import viewsets, mixins
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from core.models import Tag, Ingredient, Recipe
+from core.access_log import AccessLogMixin
+from core.authentication import ExpiringTokenAuthentication, \
+    SignedTokenAuthentication
+from core.merge import merge_into
+from core.models import Tag, Ingredient, Recipe, RecipeReadModel, ChangeLog
 
 from recipe import serializers
+from recipe.exceptions import PreconditionFailed, PreconditionRequired
+from recipe.popularity import record_view
+from recipe.stats import get_stats
+
+
+def version_etag(version):
+    return '"%d"' % version
+
+
+def parse_if_match(header):
+    """Return the versions listed in an If-Match header
+
+    None means any version ('*'). Weak tags are compared like strong ones,
+    tags that are not recipe versions never match.
+    """
+    versions = set()
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return None
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        try:
+            versions.add(int(tag.strip('"')))
+        except ValueError:
+            continue
+    return versions
 
 
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
+class BaseRecipeAttrViewSet(AccessLogMixin,
+                            viewsets.GenericViewSet,
                             mixins.ListModelMixin,
                             mixins.CreateModelMixin):
     """Base viewset for user owned recipe attributes"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,
+                              SignedTokenAuthentication)
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
@@ -30,6 +68,31 @@ class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
         """Create a new object"""
         serializer.save(user=self.request.user)
 
+    @action(detail=True, methods=['post'])
+    def merge(self, request, pk=None):
+        """Merge the tags or ingredients listed in `sources` into this one
+
+        The recipes using a source are moved to this object, then the
+        sources are deleted.
+        """
+        target = self.get_object()
+        sources = request.data.get('sources')
+        if not isinstance(sources, list) or not sources or \
+                not all(isinstance(i, int) for i in sources):
+            raise ValidationError({'sources': 'A list of ids is required.'})
+
+        owned = set(self.queryset.filter(
+            user=request.user, pk__in=sources
+        ).values_list('pk', flat=True))
+        missing = sorted(set(sources) - owned)
+        if missing:
+            raise ValidationError({'sources': 'Unknown ids: %s.' % ', '.join(
+                map(str, missing)
+            )})
+
+        merge_into(target, owned)
+        return Response(self.get_serializer(target).data)
+
 
 class TagViewSet(BaseRecipeAttrViewSet):
     """Manage tags in the database"""
@@ -43,38 +106,268 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     serializer_class = serializers.IngredientSerializer
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AccessLogMixin, viewsets.ModelViewSet):
     """Manage recipes in the DB"""
     serializer_class = serializers.RecipeSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,
+                              SignedTokenAuthentication)
     permission_classes = (IsAuthenticated,)
+    orderings = ('popularity', '-popularity')
 
     def _params_to_int(self, qs):
         """Convert a list of string IDs to a list of integers"""
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _param_to_bool(self, name):
+        """Read a 0/1, true/false or yes/no query parameter"""
+        value = self.request.query_params.get(name, '0').lower()
+        if value in ('1', 'true', 'yes'):
+            return True
+        if value in ('0', 'false', 'no', ''):
+            return False
+        raise ValidationError({name: 'A boolean is required.'})
+
     def get_queryset(self):
-        """Retrieve the recipes for the authenticated user"""
+        """Retrieve the recipes for the authenticated user
+
+        Reads are served from the denormalized read model, so listing
+        does not join the tag and ingredient tables.
+        """
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
 
-        queryset = self.queryset
+        if self.action in ('list', 'retrieve'):
+            queryset = RecipeReadModel.objects.order_by('-pk')
+        else:
+            queryset = self.queryset
         if tags:
             tag_ids = self._params_to_int(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = queryset.filter(pk__in=Recipe.tags.through.objects
+                                       .filter(tag_id__in=tag_ids)
+                                       .values('recipe_id'))
         if ingredients:
             ingredient_ids = self._params_to_int(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = queryset.filter(
+                pk__in=Recipe.ingredients.through.objects
+                .filter(ingredient_id__in=ingredient_ids)
+                .values('recipe_id')
+            )
+
+        if self.action == 'list':
+            ordering = self.request.query_params.get('ordering')
+            if ordering:
+                if ordering not in self.orderings:
+                    raise ValidationError({'ordering': 'Choose one of %s.' %
+                                           ', '.join(self.orderings)})
+                queryset = queryset.order_by(ordering, '-pk')
 
         return queryset.filter(user=self.request.user)
 
     def get_serializer_class(self):
         """Return the appropriated serializer class"""
         if self.action == 'retrieve':
-            return serializers.RecipeDetailSerializer
+            return serializers.RecipeReadDetailSerializer
+        if self.action == 'list':
+            if self._param_to_bool('detail'):
+                return serializers.RecipeReadDetailSerializer
+            return serializers.RecipeReadSerializer
         return self.serializer_class
 
+    def list(self, request, *args, **kwargs):
+        """List the recipes, or fetch many by id with ?ids=1,2,3
+
+        Recipes are returned in the requested order in a single query,
+        ids that do not exist or belong to another user are left out.
+        """
+        ids = request.query_params.get('ids')
+        if not ids:
+            return super().list(request, *args, **kwargs)
+
+        try:
+            recipe_ids = list(dict.fromkeys(self._params_to_int(ids)))
+        except ValueError:
+            raise ValidationError({'ids': 'A list of integers is required.'})
+        if len(recipe_ids) > settings.RECIPE_MULTI_GET_MAX:
+            raise ValidationError({'ids': 'At most %d ids are allowed.' %
+                                   settings.RECIPE_MULTI_GET_MAX})
+
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes], many=True
+        )
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Return a recipe and count the view towards its popularity"""
+        recipe = self.get_object()
+        response = Response(self.get_serializer(recipe).data)
+        record_view(recipe._state.db, recipe.pk)
+        response['ETag'] = version_etag(recipe.version)
+        return response
+
+    def update(self, request, *args, **kwargs):
+        """Update a recipe, answering 412 if If-Match names an old version
+
+        If-Match is required, 428 answers an update without it. The update
+        still fails if another request changed the recipe after it was
+        loaded for this one.
+        """
+        if 'HTTP_IF_MATCH' not in request.META:
+            raise PreconditionRequired()
+        response = super().update(request, *args, **kwargs)
+        response['ETag'] = version_etag(response.data['version'])
+        return response
+
     def perform_create(self, serializer):
         """Create a new recipe"""
         serializer.save(user=self.request.user)
+
+    def perform_update(self, serializer):
+        expected_version = serializer.instance.version
+        versions = parse_if_match(self.request.META['HTTP_IF_MATCH'])
+        if versions is not None and expected_version not in versions:
+            raise PreconditionFailed()
+        serializer.save(expected_version=expected_version)
+
+    @action(detail=False)
+    def pantry(self, request):
+        """Return recipes the user can cook from the given ingredients
+
+        ?ingredients=1,2,3 lists the pantry, ?max_missing=K also returns
+        recipes missing up to K ingredients, ranked by coverage.
+        """
+        from recipe.index import get_index
+
+        try:
+            pantry = set(self._params_to_int(
+                request.query_params.get('ingredients', '')
+            ))
+            max_missing = int(request.query_params.get('max_missing', 0))
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            raise ValidationError('ingredients, max_missing and limit must '
+                                  'be integers.')
+        limit = max(1, min(limit, settings.PANTRY_RESULTS_MAX))
+
+        matches = get_index(request.user.pk).pantry(
+            pantry, max(max_missing, 0), limit
+        )
+        recipes = RecipeReadModel.objects.filter(
+            user=request.user
+        ).in_bulk([recipe_id for recipe_id, _, _ in matches])
+        return Response([
+            {
+                'coverage': round(coverage, 4),
+                'missing': missing,
+                'recipe': serializers.RecipeReadSerializer(
+                    recipes[recipe_id]
+                ).data,
+            }
+            for recipe_id, coverage, missing in matches
+            if recipe_id in recipes
+        ])
+
+    @action(detail=False)
+    def stats(self, request):
+        """Return price, time and tag/ingredient statistics for the user"""
+        return Response(get_stats(request.user.pk))
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """Return the user's recipes ranked by similarity to this one"""
+        # NumPy is only imported once a worker is asked for similar recipes
+        from recipe.index import get_index
+
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            raise ValidationError({'limit': 'A valid integer is required.'})
+        limit = max(1, min(limit, settings.SIMILAR_RECIPES_MAX))
+
+        try:
+            ranked = get_index(request.user.pk).similar(
+                int(pk), limit, **settings.SIMILAR_RECIPES_WEIGHTS
+            )
+        except (KeyError, ValueError):
+            raise NotFound()
+
+        recipes = RecipeReadModel.objects.filter(
+            user=request.user
+        ).in_bulk([recipe_id for recipe_id, score in ranked])
+        return Response([
+            {
+                'score': round(score, 4),
+                'recipe': serializers.RecipeReadSerializer(
+                    recipes[recipe_id]
+                ).data,
+            }
+            for recipe_id, score in ranked if recipe_id in recipes
+        ])
+
+
+class SyncView(AccessLogMixin, APIView):
+    """Return the tags, ingredients and recipes changed since a cursor
+
+    The cursor is the user's change sequence number of the last change a
+    client has seen. Deleted objects are returned with `deleted` set and
+    no data.
+    """
+    authentication_classes = (ExpiringTokenAuthentication,
+                              SignedTokenAuthentication)
+    permission_classes = (IsAuthenticated,)
+
+    sources = {
+        ChangeLog.TAG: (Tag.objects.all(), serializers.TagSerializer),
+        ChangeLog.INGREDIENT: (Ingredient.objects.all(),
+                               serializers.IngredientSerializer),
+        ChangeLog.RECIPE: (RecipeReadModel.objects.all(),
+                           serializers.RecipeReadSerializer),
+    }
+
+    def _param_to_int(self, name, default):
+        try:
+            return int(self.request.query_params.get(name, default))
+        except ValueError:
+            raise ValidationError({name: 'A valid integer is required.'})
+
+    def get(self, request, format=None):
+        since = self._param_to_int('since', 0)
+        limit = min(
+            self._param_to_int('limit', settings.SYNC_PAGE_SIZE),
+            settings.SYNC_MAX_PAGE_SIZE
+        )
+        if since < 0 or limit < 1:
+            raise ValidationError('since and limit must be positive.')
+
+        entries = list(ChangeLog.objects.filter(
+            user=request.user, seq__gt=since
+        ).order_by('seq')[:limit + 1])
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        data = {}
+        for kind, (queryset, serializer_class) in self.sources.items():
+            ids = [e.object_id for e in entries
+                   if e.kind == kind and not e.deleted]
+            if ids:
+                objects = queryset.filter(user=request.user, pk__in=ids)
+                for item in serializer_class(objects, many=True).data:
+                    data[kind, item['id']] = item
+
+        changes = []
+        for entry in entries:
+            item = data.get((entry.kind, entry.object_id))
+            changes.append({
+                'type': entry.kind,
+                'id': entry.object_id,
+                'seq': entry.seq,
+                'deleted': entry.deleted or item is None,
+                'data': item,
+            })
+
+        return Response({
+            'changes': changes,
+            'cursor': entries[-1].seq if entries else since,
+            'has_more': has_more,
+        })
@@ -11,19 +11,36 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('email', 'password', 'name')
         extra_kwargs = {'password': {'write_only': True, 'min_length': 5}}
 
+    def validate_email(self, value):
+        """Reject emails already taken in any letter case"""
+        users = get_user_model().objects.filter_email(value)
+        if self.instance is not None:
+            users = users.exclude(pk=self.instance.pk)
+        if users.exists():
+            raise serializers.ValidationError(
+                'A user with this email already exists.'
+            )
+        return value
+
     def create(self, validated_data):
         """Create a new user with encrypted password and return it"""
         return get_user_model().objects.create_user(**validated_data)
 
     def update(self, instance, validated_data):
-        """Updating the user's password"""
+        """Update the user, saving only the changed columns once"""
         password = validated_data.pop('password', None)
-        user = super().update(instance, validated_data)
+        update_fields = []
+        for attr, value in validated_data.items():
+            if getattr(instance, attr) != value:
+                setattr(instance, attr, value)
+                update_fields.append(attr)
 
         if password:
-            user.set_password(password)
-            user.save()
-        return user
+            instance.set_password(password)
+            update_fields.append('password')
+        if update_fields:
+            instance.save(update_fields=update_fields)
+        return instance
 
 
 class AuthTokenSerializer(serializers.Serializer):
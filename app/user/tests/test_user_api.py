@@ -1,4 +1,6 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
@@ -76,6 +78,28 @@ class PublicUserAPITest(TestCase):
         self.assertIn('token', res.data)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def test_create_token_email_case_insensitive(self):
+        """Test that the email is matched ignoring letter case"""
+        create_user(email='test@testing.com', password='testpass')
+
+        res = self.client.post(TOKEN_URL, {'email': 'Test@Testing.com',
+                                           'password': 'testpass'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('token', res.data)
+
+    def test_user_exists_other_case(self):
+        """Test that an email taken in another letter case is rejected"""
+        create_user(email='test@testing.com', password='testpass')
+
+        res = self.client.post(CREATE_USER_URL, {
+            'email': 'TEST@testing.com',
+            'password': 'testpass',
+            'name': 'Test name',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_create_token_invalid_creation(self):
         """Test that token is not created is invalid credentials are given"""
         payload = {
@@ -159,3 +183,15 @@ class PrivateUserAPITests(TestCase):
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_update_user_profile_single_write(self):
+        """Test that a name and password change is saved in one UPDATE"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(ME_URL, {'name': 'new name',
+                                             'password': 'newpass'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        updates = [q['sql'] for q in queries.captured_queries
+                   if q['sql'].startswith('UPDATE "core_user"')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('"email"', updates[0])
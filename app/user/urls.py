@@ -8,5 +8,9 @@ app_name = 'user'
 urlpatterns = [
     path('create/', views.CreateUserView.as_view(), name='create'),
     path('token/', views.CreateTokenView.as_view(), name='token'),
+    path('signed-token/', views.CreateSignedTokenView.as_view(),
+         name='signed-token'),
+    path('revoke-tokens/', views.RevokeTokensView.as_view(),
+         name='revoke-tokens'),
     path('me/', views.ManageUserView.as_view(), name='me'),
 ]
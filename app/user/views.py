@@ -1,27 +1,80 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.settings import api_settings
 
+from core.access_log import AccessLogMixin
+from core.account_deletion import start_account_deletion
+from core.authentication import ExpiringTokenAuthentication, \
+    SignedTokenAuthentication, issue_token, revoke_tokens, sign_token
+from core.throttling import LoginRateThrottle
 from user.serializers import UserSerializer, AuthTokenSerializer
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(AccessLogMixin, generics.CreateAPIView):
     """Create a new user in the system"""
     serializer_class = UserSerializer
 
 
-class CreateTokenView(ObtainAuthToken):
+class CreateTokenView(AccessLogMixin, ObtainAuthToken):
     """Create a new auth token for user"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = (LoginRateThrottle,)
 
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data,
+                                           context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        self.log_user_id = serializer.validated_data['user'].pk
+        token = issue_token(serializer.validated_data['user'])
+        return Response({'token': token.key})
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
-    """Manage the authenticated user"""
+
+class CreateSignedTokenView(CreateTokenView):
+    """Create a short lived signed token for user"""
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data,
+                                           context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        self.log_user_id = serializer.validated_data['user'].pk
+        token, expires = sign_token(serializer.validated_data['user'])
+        return Response({'token': token, 'expires': expires})
+
+
+class RevokeTokensView(AccessLogMixin, APIView):
+    """Revoke every token of the authenticated user"""
+    authentication_classes = (ExpiringTokenAuthentication,
+                              SignedTokenAuthentication)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, format=None):
+        revoke_tokens(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ManageUserView(AccessLogMixin, generics.RetrieveUpdateAPIView):
+    """Manage the authenticated user
+
+    DELETE locks the account out at once and removes its data in the
+    background, answering 202 Accepted.
+    """
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,
+                              SignedTokenAuthentication)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):
         """Retrieve and return authentication user """
-        return self.request.user
+        user = self.request.user
+        deferred = user.get_deferred_fields()
+        if deferred:
+            # Signed token users only carry their id and token version
+            user.refresh_from_db(fields=deferred)
+        return user
+
+    def delete(self, request, *args, **kwargs):
+        start_account_deletion(request.user)
+        return Response(status=status.HTTP_202_ACCEPTED)